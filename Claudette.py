@@ -8,43 +8,124 @@
 import sublime
 import sublime_plugin
 
-from .chat.chat_view import ClaudetteChatViewListener
-from .chat.ask_question import ClaudetteAskQuestionCommand, ClaudetteAskNewQuestionCommand
-from .chat.chat_history import ClaudetteClearChatHistoryCommand, ClaudetteExportChatHistoryCommand, ClaudetteImportChatHistoryCommand
-from .settings.select_model_panel import ClaudetteSelectModelPanelCommand
-from .settings.select_system_message_panel import ClaudetteSelectSystemMessagePanelCommand
-from .statusbar.spinner import Spinner
+# Command classes are thin shells that import their implementation on first use,
+# keeping the cost of loading the plugin at startup to a minimum.
+from .commands import lazy
+from .chat.registry import registry
+from .constants import SETTINGS_FILE
+from .dispatcher import configure_dispatcher
 
 def plugin_loaded():
-    spinner = Spinner()
-    spinner.start("Claudette", 1000)
+    configure_dispatcher()
+
+    # Budgets are checked when a question is asked, read the ledger before that.
+    # Checked on the raw settings, so nothing is imported when no budget is set.
+    usage = sublime.load_settings(SETTINGS_FILE).get('usage', {})
+    if (usage.get('ledger', True) and usage.get('downgrade_model') and
+            (usage.get('daily_budget') or usage.get('project_daily_budget'))):
+        sublime.set_timeout_async(preload_usage_ledger)
+
+def preload_usage_ledger():
+    from .api.usage import preload_usage_ledger
+    preload_usage_ledger()
+
+class ClaudetteAskQuestionCommand(lazy.LazyTextCommand):
+    implementation = ('.chat.ask_question', 'ClaudetteAskQuestionCommand')
+
+class ClaudetteAskNewQuestionCommand(lazy.LazyTextCommand):
+    implementation = ('.chat.ask_question', 'ClaudetteAskNewQuestionCommand')
+
+class ClaudetteAskModelsCommand(lazy.LazyTextCommand):
+    implementation = ('.chat.ask_models', 'ClaudetteAskModelsCommand')
+
+class ClaudetteAskInPlaceCommand(lazy.LazyTextCommand):
+    implementation = ('.chat.in_place', 'ClaudetteAskInPlaceCommand')
+
+class ClaudetteRevertInPlaceCommand(lazy.LazyTextCommand):
+    implementation = ('.chat.in_place', 'ClaudetteRevertInPlaceCommand')
+
+class ClaudetteInPlaceEditCommand(lazy.LazyTextCommand):
+    implementation = ('.chat.in_place', 'ClaudetteInPlaceEditCommand')
+
+class ClaudetteBatchAskCommand(lazy.LazyTextCommand):
+    implementation = ('.chat.batch_ask', 'ClaudetteBatchAskCommand')
+
+class ClaudetteReplaceRegionCommand(lazy.LazyTextCommand):
+    implementation = ('.chat.batch_ask', 'ClaudetteReplaceRegionCommand')
+
+class ClaudetteApplyCodeCommand(lazy.LazyTextCommand):
+    implementation = ('.chat.apply_code', 'ClaudetteApplyCodeCommand')
+
+class ClaudetteClearChatHistoryCommand(lazy.LazyTextCommand):
+    implementation = ('.chat.chat_history', 'ClaudetteClearChatHistoryCommand')
+
+class ClaudetteCompactChatHistoryCommand(lazy.LazyTextCommand):
+    implementation = ('.chat.compaction', 'ClaudetteCompactChatHistoryCommand')
+
+class ClaudetteExportChatHistoryCommand(lazy.LazyWindowCommand):
+    implementation = ('.chat.chat_history', 'ClaudetteExportChatHistoryCommand')
+
+class ClaudetteImportChatHistoryCommand(lazy.LazyWindowCommand):
+    implementation = ('.chat.chat_history', 'ClaudetteImportChatHistoryCommand')
+
+class ClaudetteSelectModelPanelCommand(lazy.LazyWindowCommand):
+    implementation = ('.settings.select_model_panel', 'ClaudetteSelectModelPanelCommand')
+
+class ClaudetteSelectSystemMessagePanelCommand(lazy.LazyWindowCommand):
+    implementation = ('.settings.select_system_message_panel', 'ClaudetteSelectSystemMessagePanelCommand')
+
+class ClaudetteShowRateLimitsCommand(lazy.LazyWindowCommand):
+    implementation = ('.api.show_rate_limits', 'ClaudetteShowRateLimitsCommand')
+
+class ClaudetteUsageReportCommand(lazy.LazyWindowCommand):
+    implementation = ('.api.usage_report', 'ClaudetteUsageReportCommand')
+
+class ClaudetteSearchChatsCommand(lazy.LazyWindowCommand):
+    implementation = ('.chat.search', 'ClaudetteSearchChatsCommand')
+
+class ClaudetteToggleProfilingCommand(lazy.LazyWindowCommand):
+    implementation = ('.profiling.toggle_profiling', 'ClaudetteToggleProfilingCommand')
+
+class ClaudetteChatViewListener(sublime_plugin.ViewEventListener):
+    """Event listener specifically for chat views."""
+
+    @classmethod
+    def is_applicable(cls, settings):
+        """Only attach this listener to chat views."""
+        return settings.get('claudette_is_chat_view', False)
+
+    def on_text_command(self, command_name, args):
+        """Handle text commands for chat views."""
+        if command_name == "insert" and args.get("characters") == "\n":
+            try:
+                window = self.view.window()
+                if window:
+                    window.run_command('claudette_ask_question')
+                    return ('noop', None)
+            except Exception as e:
+                sublime.status_message(f"Claudette error: {str(e)}")
+        return None
 
 class ClaudetteFocusListener(sublime_plugin.EventListener):
     def on_activated(self, view):
-        if view.settings().get('claudette_is_chat_view', False):
-            self._update_current_chat_status(view)
+        registry.activate(view)
 
     def on_load(self, view):
         if view.settings().get('claudette_is_chat_view', False):
-            self._update_current_chat_status(view)
+            registry.register(view)
 
     def on_new(self, view):
         if view.settings().get('claudette_is_chat_view', False):
-            self._update_current_chat_status(view)
+            registry.register(view)
 
     def on_clone(self, view):
         if view.settings().get('claudette_is_chat_view', False):
-            self._update_current_chat_status(view)
-
-    def _update_current_chat_status(self, view):
-        window = view.window()
-        if not window:
-            print(f"No window found for view: {view.id()}")
-            return
+            registry.register(view)
 
-        view.settings().set('claudette_is_current_chat', True)
+    def on_pre_close(self, view):
+        if registry.unregister(view):
+            lazy.load_class('.chat.chat_view', 'ClaudetteChatView').release_view(view.id())
 
-        for other_view in window.views():
-            if (other_view.id() != view.id() and
-                other_view.settings().get('claudette_is_chat_view', False)):
-                other_view.settings().set('claudette_is_current_chat', False)
+    def on_pre_close_window(self, window):
+        registry.forget_window(window)
+        lazy.load_class('.chat.chat_view', 'ClaudetteChatView').release_window(window.id())
@@ -1,167 +1,206 @@
 import sublime
-import json
-import urllib.request
-import urllib.parse
 import urllib.error
-from ..constants import ANTHROPIC_VERSION, DEFAULT_MODEL, MAX_TOKENS, SETTINGS_FILE
-from ..statusbar.spinner import Spinner
+from ..constants import MAX_TOKENS
+from ..dispatcher import dispatcher
+from ..settings.snapshot import get_settings
+from ..statusbar.status import status_bar
+from ..core.async_transport import async_transport
+from ..core.client import MessagesClient, StreamCallbacks
+from ..core.connection import connection_pool
+from .rate_limit import rate_limiter
+from .usage import record_usage
 
 class ClaudeAPI:
-    BASE_URL = 'https://api.anthropic.com/v1/'
-
-    def __init__(self):
-        self.settings = sublime.load_settings(SETTINGS_FILE)
-        self.api_key = self.settings.get('api_key')
-        self.max_tokens = self.settings.get('max_tokens', MAX_TOKENS)
-        self.model = self.settings.get('model', DEFAULT_MODEL)
-        self.spinner = Spinner()
-        self.temperature = self.settings.get('temperature', '1.0')
-
-    @staticmethod
-    def get_valid_temperature(temp):
-        try:
-            temp = float(temp)
-            if 0.0 <= temp <= 1.0:
-                return temp
-            return 1.0
-        except (TypeError, ValueError):
-            return 1.0
-
-    def stream_response(self, chunk_callback, messages):
-        """Stream API response for the given messages."""
-        if not messages or not any(msg.get('content', '').strip() for msg in messages):
+    """
+    Runs the MessagesClient of the core package in the editor.
+
+    Takes the client options from the settings, picks the transport, and
+    passes the events of a stream to the main thread, the status bar and
+    the usage ledger.
+    """
+
+    def __init__(self, model=None, thinking_budget=0, system=None):
+        self.settings = get_settings()
+        self.client = MessagesClient(
+            self.settings.api_key,
+            model or self.settings.model,
+            base_url=self.settings.base_url,
+            max_tokens=self.settings.max_tokens,
+            temperature=self.settings.temperature,
+            system=system or self.settings.system,
+            thinking_budget=thinking_budget,
+            prompt_cache=self.settings.warm_up_prompt_cache,
+            resume_attempts=self.settings.resume_attempts,
+            rate_limiter=rate_limiter
+        )
+        # Where the request was made, for the usage ledger
+        self.chat_id = None
+        self.project = None
+
+    @property
+    def model(self):
+        return self.client.model
+
+    @property
+    def state(self):
+        return self.client.state
+
+    @property
+    def stats(self):
+        return self.client.stats
+
+    def build_request_data(self, messages, stream=True):
+        """Build the Messages API request body for the given messages."""
+        return self.client.build_request_data(messages, stream)
+
+    def get_transport(self, url):
+        """Return the transport for requests to the URL: the asyncio one if it is enabled and can send them, else the threaded one."""
+        if self.settings.transport == 'asyncio' and async_transport.supports(url):
+            return async_transport
+        return connection_pool
+
+    def warm_up(self, conversation=None):
+        """
+        Prepare a request while the question is being typed. Blocks, so call it from a worker thread.
+
+        Opens a connection to the API, and with prompt caching enabled, writes
+        the conversation so far to the prompt cache with a request for a single
+        token. The request for the question then only pays for its new tokens.
+        Both go through the transport the question will be sent on, so it
+        reuses the connection.
+
+        Args:
+            conversation (Conversation, optional): A copy of the conversation so far
+        """
+        url = self.client.get_url('messages')
+        transport = self.get_transport(url)
+
+        # Thinking does not allow a request for a single token
+        if (not self.settings.warm_up_prompt_cache or self.client.thinking_budget or
+                conversation is None or not conversation.has_content()):
+            transport.warm(url)
             return
 
-        def handle_error(error_msg):
-            sublime.set_timeout(
-                lambda msg=error_msg: chunk_callback(msg),
-                0
-            )
+        transport.run(self.client.write_prompt_cache(transport, conversation))
+
+    def start_stream(self, chunk_callback, conversation, on_done=None, thinking_callback=None):
+        """
+        Stream the answer to a conversation in the background.
+
+        With the asyncio transport the stream runs on its event loop, otherwise
+        on a worker thread of its own. All callbacks are dispatched to the
+        main thread. Text chunks that arrive before the main thread gets to
+        them are joined.
+
+        Args:
+            chunk_callback (callable): Called on the main thread with each text chunk,
+                and with the error message if the stream fails
+            conversation (Conversation): The conversation to send
+            on_done (callable, optional): Called on the main thread with the request stats
+                once the stream has ended
+            thinking_callback (callable, optional): Called on the main thread with each
+                chunk of extended thinking
+        """
+        if not conversation.has_content():
+            return
 
-        try:
-            self.spinner.start('Fetching response')
-            headers = {
-                'x-api-key': self.api_key,
-                'anthropic-version': ANTHROPIC_VERSION,
-                'content-type': 'application/json',
-            }
-
-            # Filter out empty messages
-            filtered_messages = [
-                msg for msg in messages
-                if msg.get('content', '').strip()
-            ]
-
-            data = {
-                'messages': filtered_messages,
-                'max_tokens': MAX_TOKENS,
-                'model': self.model,
-                'stream': True,
-                "system": [
-                    {
-                        "type": "text",
-                        "text": 'Please wrap all code examples in a markdown code block and ensure each code block is complete and self-contained.',
-                    }
-                ],
-                'temperature': self.get_valid_temperature(self.temperature)
-            }
-
-            system_messages = self.settings.get('system_messages', [])
-            default_index = self.settings.get('default_system_message_index', 0)
-
-            if (system_messages and
-                isinstance(system_messages, list) and
-                isinstance(default_index, int) and
-                0 <= default_index < len(system_messages)):
-
-                selected_message = system_messages[default_index]
-                if selected_message and selected_message.strip():
-                    data['system'].append({
-                        "type": "text",
-                        "text": selected_message.strip()
-                    })
-
-            req = urllib.request.Request(
-                urllib.parse.urljoin(self.BASE_URL, 'messages'),
-                data=json.dumps(data).encode('utf-8'),
-                headers=headers,
-                method='POST'
-            )
-
-            try:
-                with urllib.request.urlopen(req) as response:
-                    for line in response:
-                        if not line or line.isspace():
-                            continue
-
-                        try:
-                            chunk = line.decode('utf-8')
-                            if not chunk.startswith('data: '):
-                                continue
-
-                            chunk = chunk[6:] # Remove 'data: ' prefix
-                            if chunk.strip() == '[DONE]':
-                                break
-
-                            data = json.loads(chunk)
-                            if 'delta' in data and 'text' in data['delta']:
-                                sublime.set_timeout(
-                                    lambda text=data['delta']['text']: chunk_callback(text),
-                                    0
-                                )
-                        except Exception:
-                            continue # Skip invalid chunks without error messages
-
-            except urllib.error.HTTPError as e:
-                error_content = e.read().decode('utf-8')
-                print("Claude API Error Content:", error_content)
-                if e.code == 401:
-                    handle_error("[Error] {0}".format(str(e)))
-                else:
-                    handle_error("[Error] {0}".format(str(e)))
-            except urllib.error.URLError as e:
-                handle_error("[Error] {0}".format(str(e)))
-            finally:
-                self.spinner.stop()
+        task_id = status_bar.begin(self.model)
 
-        except Exception as e:
-            sublime.error_message(str(e))
-            self.spinner.stop()
+        def on_text(text):
+            status_bar.add_output(task_id, text)
+            dispatcher.dispatch_text(chunk_callback, text)
+
+        def on_thinking(text):
+            status_bar.add_output(task_id, text)
+            if thinking_callback:
+                dispatcher.dispatch_text(thinking_callback, text)
+
+        def on_stream_done(stats):
+            status_bar.end(task_id)
+            if on_done:
+                dispatcher.dispatch(on_done, stats)
+            # Runs off the event loop, the ledger does file I/O
+            record_usage(stats, self.chat_id, self.project)
+
+        callbacks = StreamCallbacks(
+            text=on_text,
+            thinking=on_thinking,
+            status=lambda message: dispatcher.dispatch(sublime.status_message, "Claude: {0}".format(message)),
+            error=lambda message: dispatcher.dispatch(chunk_callback, message),
+            failure=lambda e: dispatcher.dispatch(sublime.error_message, str(e)),
+            done=on_stream_done
+        )
+
+        transport = self.get_transport(self.client.get_url('messages'))
+        transport.submit(self.client.stream(transport, conversation, callbacks))
 
     def fetch_models(self):
+        """Fetch the available model ids. Blocks, so call it from a worker thread."""
+        task_id = status_bar.begin('Fetching models')
         try:
-            sublime.status_message('Fetching models')
-            headers = {
-                'x-api-key': self.api_key,
-                'anthropic-version': ANTHROPIC_VERSION,
-            }
-
-            req = urllib.request.Request(
-                urllib.parse.urljoin(self.BASE_URL, 'models'),
-                headers=headers,
-                method='GET'
-            )
-
-            with urllib.request.urlopen(req) as response:
-                data = json.loads(response.read().decode('utf-8'))
-                model_ids = [item['id'] for item in data['data']]
-                sublime.status_message('')
-                return model_ids
+            data = self.request_json('models')
+            model_ids = [item['id'] for item in data['data']]
+            return model_ids
 
         except urllib.error.HTTPError as e:
             if e.code == 401:
                 print("Claude API: {0}".format(str(e)))
-                sublime.error_message("Authentication invalid when fetching the available models from the Claude API.")
+                dispatcher.dispatch(sublime.error_message, "Authentication invalid when fetching the available models from the Claude API.")
             else:
                 print("Claude API: {0}".format(str(e)))
-                sublime.error_message("An error occurred fetching the available models from the Claude API.")
+                dispatcher.dispatch(sublime.error_message, "An error occurred fetching the available models from the Claude API.")
         except urllib.error.URLError as e:
             print("Claude API: {0}".format(str(e)))
-            sublime.error_message("An error occurred fetching the available models from the Claude API.")
+            dispatcher.dispatch(sublime.error_message, "An error occurred fetching the available models from the Claude API.")
         except Exception as e:
             print("Claude API: {0}".format(str(e)))
-            sublime.error_message("An error occurred fetching the available models from the Claude API.")
+            dispatcher.dispatch(sublime.error_message, "An error occurred fetching the available models from the Claude API.")
         finally:
-            sublime.status_message('')
+            status_bar.end(task_id)
 
         return []
+
+    def request_json(self, path, data=None, method='GET'):
+        """Send a non-streaming request and return the decoded JSON response. Blocks, so call it from a worker thread."""
+        transport = self.get_transport(self.client.get_url(path))
+        return transport.run(self.client.request_json(transport, path, data, method))
+
+    def complete(self, messages, system=None, max_tokens=MAX_TOKENS):
+        """
+        Send a non-streaming request and return the text of the response. Blocks, so call it from a worker thread.
+
+        Args:
+            messages (list): The conversation messages
+            system (str, optional): A system prompt replacing the configured ones
+            max_tokens (int, optional): The maximum number of tokens to generate
+        """
+        transport = self.get_transport(self.client.get_url('messages'))
+        text = transport.run(self.client.complete(transport, messages, system, max_tokens))
+        record_usage(self.stats, self.chat_id, self.project)
+        return text
+
+    def create_message_batch(self, requests):
+        """
+        Submit a list of Message Batch requests.
+
+        Args:
+            requests (list): Dicts with a 'custom_id' and the request 'params'
+
+        Returns:
+            dict: The created message batch
+        """
+        return self.request_json('messages/batches', {'requests': requests}, method='POST')
+
+    def get_message_batch(self, batch_id):
+        """Retrieve the current state of a message batch."""
+        return self.request_json('messages/batches/{0}'.format(batch_id))
+
+    def fetch_message_batch_results(self, results_url):
+        """
+        Fetch the results of an ended message batch. Blocks, so call it from a worker thread.
+
+        Returns:
+            dict: Result objects keyed by their custom_id
+        """
+        transport = self.get_transport(results_url)
+        return transport.run(self.client.fetch_batch_results(transport, results_url))
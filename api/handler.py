@@ -1,31 +1,107 @@
+import sublime
+import time
+from ..constants import PLUGIN_NAME
+from ..core.stream import ResponseBuffer
+from ..dispatcher import dispatcher
+from ..profiling.profiler import profiled
+from ..settings.snapshot import get_settings
+
 class StreamingResponseHandler:
+    """
+    Appends a streamed response to the chat view.
+
+    The chunks are collected in a ResponseBuffer and joined once when the
+    stream has ended, and finish() then adds the response to the
+    conversation history exactly once.
+    """
+
     def __init__(self, view, chat_view, on_complete=None):
         self.view = view
         self.chat_view = chat_view
-        self.current_response = ""
+        self.response = ResponseBuffer()
         self.on_complete = on_complete
+        self.render_count = 0
+        self.render_time = 0.0
+        self.render_max = 0.0
+        self.thinking_start = None
+        self.thinking_started_at = None
+        self.answer_started = False
 
-    def append_chunk(self, chunk, is_done=False):
-        self.current_response += chunk
+    def append(self, text):
         self.view.set_read_only(False)
         self.view.run_command('append', {
-            'characters': chunk,
+            'characters': text,
             'force': True,
             'scroll_to_end': True
         })
         self.view.set_read_only(True)
 
+    @profiled('StreamingResponseHandler.append_thinking')
+    def append_thinking(self, chunk):
+        """Append extended thinking to a folded region above the answer."""
+        dispatcher.assert_main_thread('StreamingResponseHandler.append_thinking')
+        if self.answer_started:
+            return
+
+        if self.thinking_start is None:
+            self.append("#### Thinking\n\n")
+            self.thinking_start = self.view.size()
+            self.thinking_started_at = time.time()
+
+        self.append(chunk)
+        self.view.fold(sublime.Region(self.thinking_start, self.view.size()))
+
+    def end_thinking(self):
+        self.chat_view.add_thinking_region(sublime.Region(self.thinking_start, self.view.size()))
+        self.append("\n\n")
+        sublime.status_message("Claude thought for {0:.1f}s".format(time.time() - self.thinking_started_at))
+
+    @profiled('StreamingResponseHandler.append_chunk')
+    def append_chunk(self, chunk, is_done=False):
+        dispatcher.assert_main_thread('StreamingResponseHandler.append_chunk')
+        if not self.answer_started:
+            self.answer_started = True
+            if self.thinking_start is not None:
+                self.end_thinking()
+
+        self.response.append(chunk)
+        start = time.perf_counter()
+        self.append(chunk)
+
+        elapsed = time.perf_counter() - start
+        self.render_count += 1
+        self.render_time += elapsed
+        self.render_max = max(self.render_max, elapsed)
+
         if is_done:
-            # Add complete response to conversation history
-            self.chat_view.handle_response(self.current_response)
-            if self.on_complete:
-                self.on_complete()
-
-    def __del__(self):
-        try:
-            if hasattr(self, 'current_response') and self.current_response:
-                self.chat_view.handle_response(self.current_response)
-                if self.on_complete:
-                    self.on_complete()
-        except:
-            pass
+            self.finish()
+
+    def log_render_stats(self):
+        """Print the time spent appending the response to the view, with the syntax used while streaming."""
+        if not self.render_count:
+            return
+
+        syntax = self.view.settings().get('syntax', '')
+        print(f"{PLUGIN_NAME} Render: {self.render_count} appends, "
+              f"{self.render_time * 1000:.1f} ms total, "
+              f"{self.render_time * 1000 / self.render_count:.2f} ms mean, "
+              f"{self.render_max * 1000:.2f} ms max ({syntax.rpartition('/')[2]})")
+
+    def finish(self):
+        """Add the response to the conversation history once the stream has ended. Only the first call has an effect."""
+        response = self.response.finish()
+        if response is None:
+            return
+
+        if self.thinking_start is not None and not self.answer_started:
+            # The stream ended while Claude was still thinking
+            self.chat_view.add_thinking_region(sublime.Region(self.thinking_start, self.view.size()))
+
+        if get_settings().chat_log_render_stats:
+            self.log_render_stats()
+
+        if response:
+            self.chat_view.handle_response(response)
+
+        if self.on_complete:
+            self.on_complete()
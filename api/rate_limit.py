@@ -0,0 +1,4 @@
+from ..core.rate_limit import RateLimiter
+from ..statusbar.status import status_bar
+
+rate_limiter = RateLimiter(on_waiting=status_bar.set_queued)
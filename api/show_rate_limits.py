@@ -0,0 +1,12 @@
+import sublime_plugin
+from .rate_limit import rate_limiter
+
+class ClaudetteShowRateLimitsCommand(sublime_plugin.WindowCommand):
+    """Show the estimated headroom of each rate limit in an output panel."""
+
+    def run(self):
+        lines = ["Claude API rate limits", ""] + rate_limiter.get_headroom()
+
+        panel = self.window.create_output_panel('claudette_rate_limits')
+        panel.run_command('append', {'characters': '\n'.join(lines) + '\n'})
+        self.window.run_command('show_panel', {'panel': 'output.claudette_rate_limits'})
@@ -0,0 +1,130 @@
+import sublime
+import os
+import time
+from ..constants import PLUGIN_NAME
+from ..core.usage import UsageLedger, get_day
+from ..settings.snapshot import get_settings
+
+_ledger = None
+_loading = False
+
+def get_usage_ledger():
+    """Return the usage ledger in the Sublime Text cache directory."""
+    global _ledger
+    if _ledger is None:
+        usage_dir = os.path.join(sublime.cache_path(), PLUGIN_NAME)
+        if not os.path.exists(usage_dir):
+            os.makedirs(usage_dir)
+        _ledger = UsageLedger(os.path.join(usage_dir, 'usage.jsonl'))
+    return _ledger
+
+def checks_budgets(settings):
+    """Return whether routine questions are downgraded when a budget is used up."""
+    return bool(settings.usage_ledger and settings.usage_downgrade_model and
+                (settings.usage_daily_budget or settings.usage_project_daily_budget))
+
+def preload_usage_ledger():
+    """Read the ledger if questions check budgets. Blocks, so call it from a worker thread."""
+    settings = get_settings()
+    if not checks_budgets(settings):
+        return
+    try:
+        get_usage_ledger().load()
+    except OSError as e:
+        print(f"{PLUGIN_NAME} Error reading the usage ledger: {str(e)}")
+
+def load_usage_ledger_async():
+    """Read the ledger in the background, unless that is already happening."""
+    global _loading
+    if _loading:
+        return
+    _loading = True
+
+    def load():
+        global _loading
+        try:
+            preload_usage_ledger()
+        finally:
+            _loading = False
+
+    sublime.set_timeout_async(load)
+
+def get_project(window):
+    """Return the name of the project or first folder open in the window, or None."""
+    if not window:
+        return None
+    project_file = window.project_file_name()
+    if project_file:
+        return os.path.splitext(os.path.basename(project_file))[0]
+    folders = window.folders()
+    return os.path.basename(folders[0]) if folders else None
+
+def record_usage(stats, chat=None, project=None):
+    """
+    Add the token usage of a request to the ledger. Blocks on file I/O, so call it from a worker thread.
+
+    Args:
+        stats (dict): The request stats, with the model, token counts and start and end time
+        chat (str, optional): The id of the chat the request was made in
+        project (str, optional): The name of the project the request was made in
+    """
+    if not get_settings().usage_ledger or not (stats.get('input_tokens') or stats.get('output_tokens')):
+        return
+
+    duration = (stats.get('end_time') or time.time()) - stats.get('start_time', time.time())
+    try:
+        get_usage_ledger().record(
+            stats['model'],
+            stats.get('input_tokens', 0),
+            stats.get('output_tokens', 0),
+            duration,
+            chat,
+            project,
+            stats.get('start_time')
+        )
+    except OSError as e:
+        print(f"{PLUGIN_NAME} Error updating the usage ledger: {str(e)}")
+
+def get_budget_status(project=None):
+    """
+    Describe how much of each token budget is used today.
+
+    Returns:
+        list: (label, used tokens, budget) tuples for the budgets that are set
+    """
+    settings = get_settings()
+    ledger = get_usage_ledger()
+    today = get_day(time.time())
+
+    status = []
+    if settings.usage_daily_budget:
+        status.append(("Daily", ledger.get_tokens(today), settings.usage_daily_budget))
+    if settings.usage_project_daily_budget and project:
+        status.append(("Project {0}".format(project), ledger.get_tokens(today, project), settings.usage_project_daily_budget))
+    return status
+
+def get_routine_model(project=None):
+    """
+    Return the model for a routine question: the configured model, or the
+    downgrade model once a budget has reached its downgrade threshold.
+
+    Called on the main thread, so budgets are only checked once the ledger
+    has been read in the background. Until then the configured model is used.
+    """
+    settings = get_settings()
+    if not checks_budgets(settings):
+        return settings.model
+
+    if not get_usage_ledger().loaded:
+        load_usage_ledger_async()
+        return settings.model
+
+    try:
+        for label, used, budget in get_budget_status(project):
+            if used >= budget * settings.usage_downgrade_at:
+                sublime.status_message("{0} budget used, asking {1}".format(label, settings.usage_downgrade_model))
+                return settings.usage_downgrade_model
+    except OSError as e:
+        print(f"{PLUGIN_NAME} Error reading the usage ledger: {str(e)}")
+
+    return settings.model
@@ -0,0 +1,114 @@
+import sublime
+import sublime_plugin
+import threading
+from ..constants import CHAT_SYNTAX, PLUGIN_NAME
+from ..dispatcher import dispatcher
+from ..settings.snapshot import get_settings
+from .usage import get_budget_status, get_project, get_usage_ledger
+
+REPORT_DAYS = 14
+TOP_PROJECTS = 10
+
+def format_tokens(tokens):
+    if tokens >= 1000000:
+        return "{0:.1f}M".format(tokens / 1000000)
+    if tokens >= 1000:
+        return "{0:.1f}k".format(tokens / 1000)
+    return str(tokens)
+
+def format_throughput(output_tokens, seconds):
+    return "{0:.0f}".format(output_tokens / seconds) if seconds else "-"
+
+
+class ClaudetteUsageReportCommand(sublime_plugin.WindowCommand):
+    """Show the tokens spent per day, model and project, with the state of the budgets."""
+
+    def run(self, days=REPORT_DAYS):
+        project = get_project(self.window)
+        chat_id = None
+        view = self.window.active_view()
+        if view:
+            chat_id = view.settings().get('claudette_chat_id')
+
+        def build():
+            try:
+                report = self.build_report(days, project, chat_id)
+            except OSError as e:
+                print(f"{PLUGIN_NAME} Error reading the usage ledger: {str(e)}")
+                dispatcher.dispatch(sublime.error_message, f"{PLUGIN_NAME} Error: Could not read the usage ledger")
+                return
+            dispatcher.dispatch(self.show_report, report)
+
+        # Reading the ledger for the first time may take a moment
+        threading.Thread(target=build).start()
+
+    def build_report(self, days, project, chat_id):
+        ledger = get_usage_ledger()
+        recent = ledger.get_recent_days(days)
+
+        lines = ["# Claude usage", ""]
+        if not get_settings().usage_ledger:
+            lines += ["The usage ledger is turned off in the settings.", ""]
+
+        budgets = get_budget_status(project)
+        if budgets:
+            lines += ["## Budgets today", ""]
+            for label, used, budget in budgets:
+                lines.append("- {0}: {1} of {2} tokens ({3:.0%})".format(
+                    label, format_tokens(used), format_tokens(budget), used / budget
+                ))
+            lines.append("")
+
+        if chat_id:
+            lines += ["This chat: {0} tokens".format(format_tokens(ledger.get_chat_tokens(chat_id))), ""]
+
+        lines += [
+            "## Last {0} days".format(days),
+            "",
+            "| Day        | Requests | Input    | Output   | Output tokens/s |",
+            "|------------|---------:|---------:|---------:|----------------:|",
+        ]
+        models = {}
+        projects = {}
+        for day, usage in recent:
+            requests, input_tokens, output_tokens, seconds = usage.get_totals()
+            lines.append("| {0} | {1:>8} | {2:>8} | {3:>8} | {4:>15} |".format(
+                day, requests, format_tokens(input_tokens), format_tokens(output_tokens),
+                format_throughput(output_tokens, seconds)
+            ))
+            for model, model_totals in usage.models.items():
+                totals = models.setdefault(model, [0, 0, 0, 0.0])
+                for index, value in enumerate(model_totals):
+                    totals[index] += value
+            for name, tokens in usage.projects.items():
+                projects[name] = projects.get(name, 0) + tokens
+
+        lines += [
+            "",
+            "## Models",
+            "",
+            "| Model | Requests | Input | Output | Output tokens/s |",
+            "|-------|---------:|------:|-------:|----------------:|",
+        ]
+        for model, (requests, input_tokens, output_tokens, seconds) in sorted(
+                models.items(), key=lambda item: item[1][1] + item[1][2], reverse=True):
+            lines.append("| {0} | {1} | {2} | {3} | {4} |".format(
+                model, requests, format_tokens(input_tokens), format_tokens(output_tokens),
+                format_throughput(output_tokens, seconds)
+            ))
+
+        if projects:
+            lines += ["", "## Projects", ""]
+            for name, tokens in sorted(projects.items(), key=lambda item: item[1], reverse=True)[:TOP_PROJECTS]:
+                lines.append("- {0}: {1} tokens".format(name, format_tokens(tokens)))
+
+        lines += ["", "Ledger: {0}".format(ledger.path)]
+        return '\n'.join(lines) + '\n'
+
+    def show_report(self, report):
+        view = self.window.new_file()
+        view.set_scratch(True)
+        view.set_name("Claude Usage")
+        view.assign_syntax(CHAT_SYNTAX)
+        view.run_command('append', {'characters': report})
+        view.set_read_only(True)
@@ -0,0 +1,98 @@
+import sublime
+import sublime_plugin
+import difflib
+from ..constants import PLUGIN_NAME
+
+def get_line_edits(old, new):
+    """
+    Compute the line based edits that turn the old text into the new text.
+
+    The common leading and trailing lines are skipped before diffing, so the
+    usual case of a few changed lines in a large file stays fast.
+
+    Args:
+        old (str): The current text
+        new (str): The text to change it into
+
+    Returns:
+        list: (begin, end, text) tuples with character offsets into the old
+        text, in ascending order and not overlapping
+    """
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+
+    prefix = 0
+    limit = min(len(old_lines), len(new_lines))
+    while prefix < limit and old_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and old_lines[-1 - suffix] == new_lines[-1 - suffix]:
+        suffix += 1
+
+    offsets = [0]
+    for line in old_lines:
+        offsets.append(offsets[-1] + len(line))
+
+    old_middle = old_lines[prefix:len(old_lines) - suffix]
+    new_middle = new_lines[prefix:len(new_lines) - suffix]
+
+    edits = []
+    matcher = difflib.SequenceMatcher(None, old_middle, new_middle, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        edits.append((
+            offsets[prefix + i1],
+            offsets[prefix + i2],
+            ''.join(new_middle[j1:j2])
+        ))
+
+    return edits
+
+
+class ClaudetteApplyCodeCommand(sublime_plugin.TextCommand):
+    """
+    Apply a code block to a region of the view, or to the whole view.
+
+    Only the changed lines are replaced, as a single undoable edit, so
+    undo, bookmarks and the rest of the file are left alone.
+    """
+
+    def run(self, edit, text, region_key=None):
+        if region_key:
+            regions = self.view.get_regions(region_key)
+            if not regions:
+                sublime.status_message("The code this answer is about can no longer be found")
+                return
+            region = regions[0]
+        else:
+            region = sublime.Region(0, self.view.size())
+
+        old = self.view.substr(region)
+
+        # Code blocks are stripped, keep the trailing newline of the original
+        if old.endswith('\n') and not text.endswith('\n'):
+            text += '\n'
+
+        try:
+            edits = get_line_edits(old, text)
+        except Exception as e:
+            print(f"{PLUGIN_NAME} Error computing changes: {str(e)}")
+            sublime.error_message(f"{PLUGIN_NAME} Error: Could not apply code")
+            return
+
+        if not edits:
+            sublime.status_message("Code is already up to date")
+            return
+
+        # Apply from the end so earlier offsets stay valid
+        for begin, end, replacement in reversed(edits):
+            self.view.replace(
+                edit,
+                sublime.Region(region.begin() + begin, region.begin() + end),
+                replacement
+            )
+
+        sublime.status_message("Applied {0} change{1}".format(len(edits), '' if len(edits) == 1 else 's'))
@@ -0,0 +1,184 @@
+import sublime
+import sublime_plugin
+import threading
+from ..constants import PLUGIN_NAME
+from ..api.api import ClaudeAPI
+from ..dispatcher import dispatcher
+from ..settings.snapshot import get_settings
+from .ask_question import ClaudetteAskQuestionCommand
+
+class ClaudetteAskModelsCommand(sublime_plugin.TextCommand):
+    """
+    Ask the same question to several models at the same time.
+
+    Each model streams its answer into its own chat view. Once every model
+    has answered, the latency and throughput of each model is written to the
+    "Claudette Model Comparison" output panel.
+    """
+
+    def is_visible(self):
+        return True
+
+    def get_window(self):
+        return self.view.window() or sublime.active_window()
+
+    def run(self, edit, models=None, question=None):
+        try:
+            settings = get_settings()
+            if not settings.api_key:
+                sublime.error_message("A Claude API key is required. Please add your API key via Package Settings > Claudette.")
+                return
+
+            sel = self.view.sel()
+            code = self.view.substr(sel[0]) if sel else ''
+
+            if models is None:
+                models = list(settings.compare_models)
+
+            if models:
+                self.ask_question(models, code, question)
+            else:
+                self.select_models(code, question)
+
+        except Exception as e:
+            print(f"{PLUGIN_NAME} Error in compare command: {str(e)}")
+            sublime.error_message(f"{PLUGIN_NAME} Error: Could not process request")
+
+    def select_models(self, code, question, available=None, selected=None):
+        """Show a quick panel that toggles models on and off until the selection is confirmed."""
+        if available is None:
+            # Fetching the models blocks, keep it off the main thread
+            def fetch():
+                models = ClaudeAPI().fetch_models()
+                if models:
+                    dispatcher.dispatch(self.select_models, code, question, models, selected)
+
+            threading.Thread(target=fetch).start()
+            return
+        if selected is None:
+            selected = []
+
+        items = ["Ask {0} selected models".format(len(selected))]
+        for model in available:
+            items.append(("☑ " if model in selected else "☐ ") + model)
+
+        def on_select(index):
+            if index == -1:
+                return
+            if index == 0:
+                if selected:
+                    self.ask_question(selected, code, question)
+                return
+
+            model = available[index - 1]
+            if model in selected:
+                selected.remove(model)
+            else:
+                selected.append(model)
+
+            sublime.set_timeout(lambda: self.select_models(code, question, available, selected), 0)
+
+        self.get_window().show_quick_panel(items, on_select, 0, 0)
+
+    def ask_question(self, models, code, question):
+        if question:
+            self.send_to_models(models, code, question.strip())
+            return
+
+        self.get_window().show_input_panel(
+            "Ask {0} models:".format(len(models)),
+            "",
+            lambda q: self.send_to_models(models, code, q.strip()),
+            None,
+            None
+        )
+
+    def send_to_models(self, models, code, question):
+        if not question:
+            return
+
+        window = self.get_window()
+        split_layout = get_settings().compare_split_layout
+
+        if split_layout:
+            columns = len(models)
+            window.set_layout({
+                'cols': [i / columns for i in range(columns)] + [1.0],
+                'rows': [0.0, 1.0],
+                'cells': [[i, 0, i + 1, 1] for i in range(columns)]
+            })
+
+        comparison = ModelComparison(window, question, models)
+
+        for index, model in enumerate(models):
+            ask_command = ClaudetteAskQuestionCommand(self.view)
+            ask_command.load_settings()
+
+            chat_view = ask_command.create_chat_panel(force_new=True)
+            if not chat_view:
+                return
+
+            chat_view.set_name("Claude Chat ({0})".format(model))
+            if split_layout:
+                window.set_view_index(chat_view, index, 0)
+
+            ask_command.send_to_claude(
+                code,
+                question,
+                model=model,
+                on_done=comparison.on_done
+            )
+
+
+class ModelComparison:
+    """Collects the stats of concurrent requests to several models."""
+
+    def __init__(self, window, question, models):
+        self.window = window
+        self.question = question
+        self.models = models
+        self.results = []
+
+    def on_done(self, stats):
+        self.results.append(stats)
+        if len(self.results) == len(self.models):
+            self.show_results()
+
+    @staticmethod
+    def format_stats(stats):
+        first_token = stats.get('first_token_time')
+        end = stats.get('end_time')
+        start = stats.get('start_time')
+        output_tokens = stats.get('output_tokens', 0)
+
+        if first_token is None:
+            return "{0:<40} failed".format(stats['model'])
+
+        generation_time = end - first_token
+        tokens_per_second = output_tokens / generation_time if generation_time > 0 else 0.0
+
+        return "{0:<40} {1:>8.2f}s {2:>8.2f}s {3:>8.2f}s {4:>8} {5:>8} {6:>10.1f}".format(
+            stats['model'],
+            first_token - start,
+            stats.get('thinking_time', 0.0),
+            end - start,
+            stats.get('input_tokens', 0),
+            output_tokens,
+            tokens_per_second
+        )
+
+    def show_results(self):
+        lines = [
+            "Question: {0}".format(self.question),
+            "",
+            "{0:<40} {1:>9} {2:>9} {3:>9} {4:>8} {5:>8} {6:>10}".format(
+                "Model", "Latency", "Thinking", "Total", "Input", "Output", "Tokens/s"
+            )
+        ]
+
+        for stats in sorted(self.results, key=lambda s: s.get('end_time') or 0):
+            lines.append(self.format_stats(stats))
+
+        panel = self.window.create_output_panel('claudette_compare')
+        panel.run_command('append', {'characters': '\n'.join(lines) + '\n'})
+        self.window.run_command('show_panel', {'panel': 'output.claudette_compare'})
@@ -1,10 +1,15 @@
 import sublime
 import sublime_plugin
 import threading
-from ..constants import PLUGIN_NAME, SETTINGS_FILE
+from ..constants import CHAT_SYNTAX, PLUGIN_NAME
+from ..settings.snapshot import get_settings
 from ..api.api import ClaudeAPI
 from ..api.handler import StreamingResponseHandler
+from ..api.usage import get_project, get_routine_model
+from .attachments import CodeAttachments
 from .chat_view import ClaudetteChatView
+from .registry import registry
+from .compaction import compact_if_needed
 
 class ClaudetteAskQuestionCommand(sublime_plugin.TextCommand):
     def __init__(self, view):
@@ -14,8 +19,7 @@ class ClaudetteAskQuestionCommand(sublime_plugin.TextCommand):
         self._view = view
 
     def load_settings(self):
-        if not self.settings:
-            self.settings = sublime.load_settings(SETTINGS_FILE)
+        self.settings = get_settings()
 
     def get_window(self):
         return self._view.window() or sublime.active_window()
@@ -50,13 +54,9 @@ class ClaudetteAskQuestionCommand(sublime_plugin.TextCommand):
 
                 new_view.set_scratch(True)
                 new_view.set_name("Claude Chat")
-                new_view.assign_syntax('Packages/Markdown/Markdown.sublime-syntax')
+                new_view.assign_syntax(CHAT_SYNTAX)
                 new_view.settings().set('claudette_is_chat_view', True)
-                new_view.settings().set('claudette_is_current_chat', True)
-
-                for view in window.views():
-                    if view != new_view and view.settings().get('claudette_is_chat_view', False):
-                        view.settings().set('claudette_is_current_chat', False)
+                registry.register(new_view)
 
                 # Create a new chat view instance for this view
                 self.chat_view = ClaudetteChatView(window, self.settings)
@@ -75,22 +75,22 @@ class ClaudetteAskQuestionCommand(sublime_plugin.TextCommand):
             sublime.error_message(f"{PLUGIN_NAME} Error: Could not create or get chat panel")
             return None
 
-    def handle_input(self, code, question):
+    def handle_input(self, code, question, thinking=None):
         if not question or question.strip() == '':
             return None
 
         if not self.create_chat_panel():
             return
 
-        if not self.settings.get('api_key'):
+        if not self.settings.api_key:
             self.chat_view.append_text(
                 "A Claude API key is required. Please add your API key via Package Settings > Claudette.\n"
             )
             return
 
-        self.send_to_claude(code, question.strip())
+        self.send_to_claude(code, question.strip(), thinking=thinking)
 
-    def run(self, edit, code=None, question=None):
+    def run(self, edit, code=None, question=None, thinking=None):
         try:
             self.load_settings()
 
@@ -103,16 +103,18 @@ class ClaudetteAskQuestionCommand(sublime_plugin.TextCommand):
             if code is not None and question is not None:
                 if not self.create_chat_panel():
                     return
-                self.send_to_claude(code, question)
+                self.send_to_claude(code, question, thinking=thinking)
                 return
 
             sel = self.view.sel()
             selected_text = self.view.substr(sel[0]) if sel else ''
 
+            self.warm_up(registry.get_current_chat_view(window), thinking)
+
             view = window.show_input_panel(
                 "Ask Claude:",
                 "",
-                lambda q: self.handle_input(selected_text, q),
+                lambda q: self.handle_input(selected_text, q, thinking),
                 None,
                 None
             )
@@ -126,7 +128,47 @@ class ClaudetteAskQuestionCommand(sublime_plugin.TextCommand):
             print(f"{PLUGIN_NAME} Error in run command: {str(e)}")
             sublime.error_message(f"{PLUGIN_NAME} Error: Could not process request")
 
-    def send_to_claude(self, code, question):
+    def warm_up(self, chat_view, thinking=None):
+        """Open the connection, and write the history of the chat view to the prompt cache, while the question is typed."""
+        if not self.settings.api_key or not (self.settings.warm_up_connection or self.settings.warm_up_prompt_cache):
+            return
+
+        conversation = None
+        if chat_view and self.settings.warm_up_prompt_cache:
+            # Copied here, the worker thread must not see the question being added
+            conversation = ClaudetteChatView.get_view_conversation(chat_view).copy()
+
+        # The prompt cache is per model, so warm up the model the question will go to
+        model = get_routine_model(get_project(self._view.window())) if thinking is None else None
+        api = ClaudeAPI(model=model, thinking_budget=self.settings.get_thinking_budget(thinking))
+        threading.Thread(target=api.warm_up, args=(conversation,)).start()
+
+    def add_apply_target(self, code, response_start):
+        """
+        Let the code blocks of the response be applied to the selection it is about.
+
+        Without a selection nothing can be applied, replacing the whole file
+        with a snippet from the answer would throw the rest of it away.
+        """
+        if code.strip() and not registry.is_chat_view(self._view):
+            for region in self._view.sel():
+                if self._view.substr(region) == code:
+                    self.chat_view.add_apply_target(response_start, self._view, region)
+                    return
+
+        self.chat_view.add_apply_target(response_start)
+
+    def send_to_claude(self, code, question, model=None, on_done=None, thinking=None):
+        """
+        Ask a question in the chat view and stream the answer into it.
+
+        Args:
+            code (str): The selected code the question is about
+            question (str): The question
+            model (str, optional): The model to ask instead of the configured one
+            on_done (callable, optional): Called with the request stats when the answer is complete
+            thinking (str, optional): The thinking tier, "fast", "normal" or "deep", instead of the default tier
+        """
         try:
             if not self.chat_view:
                 return
@@ -139,28 +181,43 @@ class ClaudetteAskQuestionCommand(sublime_plugin.TextCommand):
 
             message += "### Claude's Response\n\n"
 
-            user_message = question
-            if code.strip():
-                user_message = f"{question}\n\nCode:\n{code}"
+            # Repeated or slightly changed code is sent as a reference or diff
+            attachments = CodeAttachments(self.chat_view.view)
+            user_message = attachments.build_message(
+                question,
+                code,
+                self._view.file_name() or "view:{0}".format(self._view.id()),
+                self.chat_view.get_conversation().messages
+            )
 
-            conversation = self.chat_view.handle_question(user_message)
+            # Copied here, the stream reads it off the main thread while the chat goes on
+            conversation = self.chat_view.handle_question(user_message).copy()
 
+            # The selected code echoed in the question is not part of a response, so it has no target
+            self.chat_view.add_apply_target(self.chat_view.get_size())
             self.chat_view.append_text(message)
+            self.chat_view.on_streaming_start()
 
             if self.chat_view.get_size() > 0:
                 self.chat_view.focus()
 
-            api = ClaudeAPI()
+            project = get_project(self._view.window() or self.chat_view.view.window())
+            thinking_budget = self.settings.get_thinking_budget(thinking)
+            if model is None and thinking is None and not thinking_budget:
+                # Routine questions move to the downgrade model once a usage budget is used up,
+                # questions that think by default are not routine, the downgrade model may not think
+                model = get_routine_model(project)
+
+            api = ClaudeAPI(model=model, thinking_budget=thinking_budget)
+            api.chat_id = self.chat_view.view.settings().get('claudette_chat_id')
+            api.project = project
 
-            message_start = self.chat_view.view.size()
+            self.add_apply_target(code, self.chat_view.view.size())
 
             def on_complete():
-                # Add the response to conversation history after streaming is complete
-                response_start = self.chat_view.view.size()
-                response_region = sublime.Region(response_start - message_start)
-                response_text = self.chat_view.view.substr(response_region)
-                self.chat_view.handle_response(response_text)
+                # The handler has added the response to the conversation history
                 self.chat_view.on_streaming_complete()
+                compact_if_needed(self.chat_view.view)
 
             handler = StreamingResponseHandler(
                 view=self.chat_view.view,
@@ -168,11 +225,12 @@ class ClaudetteAskQuestionCommand(sublime_plugin.TextCommand):
                 on_complete=on_complete
             )
 
-            thread = threading.Thread(
-                target=api.stream_response,
-                args=(handler.append_chunk, conversation)
-            )
-            thread.start()
+            def on_stream_done(stats):
+                handler.finish()
+                if on_done:
+                    on_done(stats)
+
+            api.start_stream(handler.append_chunk, conversation, on_stream_done, handler.append_thinking)
 
         except Exception as e:
             print(f"{PLUGIN_NAME} Error sending to Claude: {str(e)}")
@@ -194,6 +252,8 @@ class ClaudetteAskNewQuestionCommand(sublime_plugin.TextCommand):
             if not ask_command.create_chat_panel(force_new=True):
                 return
 
+            ask_command.warm_up(None)
+
             view = window.show_input_panel(
                 "Ask Claude (New Chat):",
                 "",
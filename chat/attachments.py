@@ -0,0 +1,235 @@
+import difflib
+import hashlib
+
+# A diff is only sent if it is at most this fraction of the size of the code
+MAX_DIFF_RATIO = 0.5
+
+def code_hash(code: str) -> str:
+    return hashlib.sha256(code.encode('utf-8')).hexdigest()
+
+def short_ref(digest: str) -> str:
+    return digest[:8]
+
+
+class CodeAttachments:
+    """
+    Content-addressed index of the code attached to the user messages of a chat view.
+
+    Code is inlined in full the first time it is sent. When the same code is
+    selected again, the message refers to the earlier message by hash instead.
+    When a changed version of previously sent code is selected, a unified diff
+    against the earlier version is sent if that is considerably smaller.
+
+    The index is stored in the 'claudette_code_attachments' view setting and
+    maps each hash to the index of the message that introduced it. When older
+    messages are compacted into a summary, the code that kept messages refer
+    to is carried over into the summary message.
+    """
+
+    SETTING = 'claudette_code_attachments'
+
+    def __init__(self, view):
+        self.view = view
+        data = view.settings().get(self.SETTING, {}) if view else {}
+        self.entries = data.get('entries', {})
+        self.sources = data.get('sources', {})
+
+    def save(self):
+        if self.view:
+            self.view.settings().set(self.SETTING, {
+                'entries': self.entries,
+                'sources': self.sources
+            })
+
+    def get_code(self, digest, messages):
+        """Return the full code of an inlined attachment, or None if it is no longer available."""
+        entry = self.entries.get(digest)
+        if not entry or 'offset' not in entry or entry['message'] >= len(messages):
+            return None
+
+        content = messages[entry['message']].get('content', '')
+        end = entry['offset'] + entry['length'] if 'length' in entry else len(content)
+        code = content[entry['offset']:end]
+        return code if code_hash(code) == digest else None
+
+    def get_diff_text(self, digest, messages):
+        """Return the text of a message that attaches code as a diff, from its ref on, or None if it is no longer available."""
+        entry = self.entries.get(digest)
+        if not entry or 'base' not in entry or entry['message'] >= len(messages):
+            return None
+
+        content = messages[entry['message']].get('content', '')
+        start = content.rfind("Code (ref {0}): the code of ref {1} ".format(short_ref(digest), short_ref(entry['base'])))
+        if start < 0:
+            return None
+        # Diff lines never start with a fence, so the first one after the diff closes it
+        end = content.find("\n```", content.find("```diff\n", start))
+        return content[start:end + 4] if end >= 0 else None
+
+    def touch(self, digest, message_index):
+        entry = self.entries.get(digest)
+        if entry:
+            entry['last_used'] = message_index
+            if entry.get('base'):
+                self.touch(entry['base'], message_index)
+
+    def build_message(self, question, code, source, messages):
+        """
+        Build the content of a user message with the given code attached.
+
+        Args:
+            question (str): The question
+            code (str): The selected code
+            source (str): Identifies where the code was selected, e.g. the file name
+            messages (list): The conversation history the message will be appended to
+
+        Returns:
+            str: The message content
+        """
+        if not code.strip():
+            return question
+
+        message_index = len(messages)
+        digest = code_hash(code)
+        ref = short_ref(digest)
+
+        entry = self.entries.get(digest)
+        if entry and entry['message'] < message_index and (
+            'base' in entry or self.get_code(digest, messages) is not None
+        ):
+            self.touch(digest, message_index)
+            self.save()
+            return f"{question}\n\nCode: identical to the code of ref {ref} earlier in this conversation."
+
+        base_digest = self.sources.get(source) if source else None
+        base_code = self.get_code(base_digest, messages) if base_digest else None
+        if base_code is not None:
+            diff = ''.join(difflib.unified_diff(
+                base_code.splitlines(True),
+                code.splitlines(True),
+                'ref-{0}'.format(short_ref(base_digest)),
+                'ref-{0}'.format(ref)
+            ))
+            if diff and len(diff) <= len(code) * MAX_DIFF_RATIO:
+                self.entries[digest] = {
+                    'message': message_index,
+                    'base': base_digest,
+                    'last_used': message_index
+                }
+                self.touch(base_digest, message_index)
+                self.save()
+                return (
+                    f"{question}\n\nCode (ref {ref}): the code of ref {short_ref(base_digest)} "
+                    f"with the following diff applied:\n```diff\n{diff.rstrip()}\n```"
+                )
+
+        prefix = f"{question}\n\nCode (ref {ref}):\n"
+        self.entries[digest] = {
+            'message': message_index,
+            'offset': len(prefix),
+            'last_used': message_index
+        }
+        if source:
+            self.sources[source] = digest
+        self.save()
+        return prefix + code
+
+    def get_carried_over(self, index):
+        """Return the digests of code in the messages before the index that later messages refer to, with the code their diffs are based on."""
+        carried = set()
+        for digest, entry in self.entries.items():
+            if entry['message'] < index <= entry.get('last_used', entry['message']):
+                carried.add(digest)
+                if entry.get('base'):
+                    carried.add(entry['base'])
+        return carried
+
+    def get_safe_compaction_index(self, index, messages):
+        """
+        Move a compaction index back so that no kept message refers to code that cannot be carried over.
+
+        Code that is still available is carried over into the summary by
+        carry_over(), so this only moves for code whose message was changed.
+        """
+        moved = True
+        while moved:
+            moved = False
+            for digest in self.get_carried_over(index):
+                entry = self.entries[digest]
+                if entry['message'] >= index:
+                    continue
+                if 'base' in entry:
+                    available = self.get_diff_text(digest, messages) is not None
+                else:
+                    available = self.get_code(digest, messages) is not None
+                if not available:
+                    index = entry['message']
+                    moved = True
+                    break
+        return index
+
+    def carry_over(self, summary, messages, removed):
+        """
+        Add the code of compacted messages that kept messages refer to to the summary message.
+
+        Args:
+            summary (str): The content of the summary message
+            messages (list): The conversation history before compaction
+            removed (int): The number of messages replaced by the summary
+
+        Returns:
+            tuple: The summary message content, and the index entries of the
+                carried over code, to pass to on_compacted()
+        """
+        parts = [summary]
+        size = len(summary)
+        carried = {}
+
+        digests = sorted(self.get_carried_over(removed), key=lambda digest: self.entries[digest]['message'])
+        for digest in digests:
+            entry = self.entries[digest]
+            if entry['message'] >= removed:
+                continue
+
+            if 'base' in entry:
+                text = self.get_diff_text(digest, messages)
+                if text is None:
+                    continue
+                prefix = "\n\n"
+                carried[digest] = dict(entry, message=0)
+            else:
+                text = self.get_code(digest, messages)
+                if text is None:
+                    continue
+                prefix = "\n\nCode (ref {0}):\n".format(short_ref(digest))
+                carried[digest] = dict(entry, message=0, offset=size + len(prefix), length=len(text))
+
+            parts += [prefix, text]
+            size += len(prefix) + len(text)
+
+        return ''.join(parts), carried
+
+    def on_compacted(self, removed, added, carried=None):
+        """
+        Update the index after the first `removed` messages were replaced by `added` messages.
+
+        Args:
+            removed (int): The number of compacted messages
+            added (int): The number of messages of the summary
+            carried (dict, optional): The index entries of the code carried over into the summary
+        """
+        shift = added - removed
+        entries = {
+            digest: dict(entry, message=entry['message'] + shift,
+                         last_used=entry.get('last_used', entry['message']) + shift)
+            for digest, entry in self.entries.items()
+            if entry['message'] >= removed
+        }
+        for digest, entry in (carried or {}).items():
+            entries[digest] = dict(entry, last_used=max(entry.get('last_used', 0) + shift, 0))
+        self.entries = entries
+        self.sources = {
+            source: digest for source, digest in self.sources.items()
+            if digest in self.entries
+        }
+        self.save()
@@ -0,0 +1,257 @@
+import sublime
+import sublime_plugin
+import itertools
+import threading
+import time
+import urllib.error
+from ..constants import CHAT_SYNTAX, PLUGIN_NAME
+from ..api.api import ClaudeAPI
+from ..core.code_blocks import find_code_blocks
+from ..dispatcher import dispatcher
+from ..settings.snapshot import get_settings
+
+# Numbers the batches, so the tracked regions of batches on the same view do not collide
+_batch_ids = itertools.count(1)
+
+class ClaudetteBatchAskCommand(sublime_plugin.TextCommand):
+    """
+    Ask the same question about many selections or files in one Message Batch.
+
+    Every non-empty selection in the current view becomes a batch item. Without
+    a selection, every open file in the window becomes a batch item instead.
+    The batch is polled in the background and the results are written to a
+    results view, and optionally back into the original selections or files.
+    """
+
+    def is_visible(self):
+        return True
+
+    def collect_targets(self):
+        """Return a list of (view, region) tuples to include in the batch."""
+        targets = [(self.view, region) for region in self.view.sel() if not region.empty()]
+        if targets:
+            return targets
+
+        window = self.view.window()
+        if not window:
+            return []
+
+        for view in window.views():
+            if view.settings().get('claudette_is_chat_view', False):
+                continue
+            if view.settings().get('claudette_is_batch_view', False):
+                continue
+            if view.size() > 0:
+                targets.append((view, sublime.Region(0, view.size())))
+
+        return targets
+
+    def run(self, edit, question=None, write_back=None):
+        try:
+            settings = get_settings()
+            if not settings.api_key:
+                sublime.error_message("A Claude API key is required. Please add your API key via Package Settings > Claudette.")
+                return
+
+            if write_back is None:
+                write_back = settings.batch_write_back
+
+            targets = self.collect_targets()
+            if not targets:
+                sublime.status_message("Nothing to send: select some text or open a file")
+                return
+
+            if question:
+                self.submit(targets, question.strip(), write_back)
+                return
+
+            window = self.view.window() or sublime.active_window()
+            window.show_input_panel(
+                "Ask Claude (batch of {0}):".format(len(targets)),
+                "",
+                lambda q: self.submit(targets, q.strip(), write_back),
+                None,
+                None
+            )
+
+        except Exception as e:
+            print(f"{PLUGIN_NAME} Error in batch command: {str(e)}")
+            sublime.error_message(f"{PLUGIN_NAME} Error: Could not create batch")
+
+    def submit(self, targets, question, write_back):
+        if not question:
+            return
+
+        batch_number = next(_batch_ids)
+        items = []
+        for index, (view, region) in enumerate(targets):
+            key = "claudette_batch_{0}_{1}".format(batch_number, index)
+            # Track the region so write back survives edits made while the batch runs
+            view.add_regions(key, [region], '', '', sublime.HIDDEN)
+            items.append({
+                'custom_id': "item-{0}".format(index),
+                'view': view,
+                'region_key': key,
+                'label': self.describe_target(view, region),
+                'code': view.substr(region)
+            })
+
+        results_view = self.create_results_view(question, items)
+        batch = ClaudetteBatch(question, items, results_view, write_back)
+
+        thread = threading.Thread(target=batch.run)
+        thread.start()
+
+    @staticmethod
+    def describe_target(view, region):
+        name = view.file_name() or view.name() or "untitled"
+        start_row = view.rowcol(region.begin())[0] + 1
+        end_row = view.rowcol(region.end())[0] + 1
+        return "{0}:{1}-{2}".format(name, start_row, end_row)
+
+    def create_results_view(self, question, items):
+        window = self.view.window() or sublime.active_window()
+        view = window.new_file()
+        view.set_scratch(True)
+        view.set_name("Claude Batch")
+        view.assign_syntax(CHAT_SYNTAX)
+        view.settings().set('claudette_is_batch_view', True)
+        view.set_read_only(True)
+
+        append_to_view(view, "# Batch Question\n\n{0}\n\nSubmitting {1} items...\n".format(question, len(items)))
+
+        return view
+
+
+class ClaudetteBatch:
+    """Submits a Message Batch, polls it until it has ended and writes out the results."""
+
+    def __init__(self, question, items, results_view, write_back=False):
+        self.question = question
+        self.items = items
+        self.results_view = results_view
+        self.write_back = write_back
+        self.api = ClaudeAPI()
+        self.poll_interval = self.api.settings.batch_poll_interval
+
+    def build_requests(self):
+        requests = []
+        for item in self.items:
+            content = self.question
+            if item['code'].strip():
+                content = f"{self.question}\n\nCode:\n{item['code']}"
+
+            requests.append({
+                'custom_id': item['custom_id'],
+                'params': self.api.build_request_data(
+                    [{'role': 'user', 'content': content}],
+                    stream=False
+                )
+            })
+        return requests
+
+    def run(self):
+        try:
+            batch = self.api.create_message_batch(self.build_requests())
+            batch_id = batch['id']
+            self.report("Batch `{0}` submitted, waiting for results...\n".format(batch_id))
+
+            while batch.get('processing_status') != 'ended':
+                counts = batch.get('request_counts', {})
+                dispatcher.dispatch(sublime.status_message, "Claude batch: {0} processing, {1} succeeded, {2} errored".format(
+                    counts.get('processing', 0), counts.get('succeeded', 0), counts.get('errored', 0)
+                ))
+                time.sleep(self.poll_interval)
+                batch = self.api.get_message_batch(batch_id)
+
+            results = self.api.fetch_message_batch_results(batch['results_url'])
+            dispatcher.dispatch(self.write_results, results)
+
+        except urllib.error.HTTPError as e:
+            print("Claude API Error Content:", e.read().decode('utf-8'))
+            self.report("\n[Error] {0}\n".format(str(e)))
+            dispatcher.dispatch(self.erase_regions)
+        except Exception as e:
+            print(f"{PLUGIN_NAME} Error processing batch: {str(e)}")
+            self.report("\n[Error] {0}\n".format(str(e)))
+            dispatcher.dispatch(self.erase_regions)
+
+    def report(self, text):
+        dispatcher.dispatch(append_to_view, self.results_view, text)
+
+    def erase_regions(self):
+        for item in self.items:
+            if item['view'].is_valid():
+                item['view'].erase_regions(item['region_key'])
+
+    def write_results(self, results):
+        output = []
+        succeeded = 0
+
+        for item in self.items:
+            result = results.get(item['custom_id'], {})
+            text = self.get_result_text(result)
+
+            output.append("\n## {0}\n\n".format(item['label']))
+            if text is None:
+                output.append("[Error] {0}\n".format(result.get('type', 'missing result')))
+                item['view'].erase_regions(item['region_key'])
+                continue
+
+            succeeded += 1
+            output.append("{0}\n".format(text))
+
+            if self.write_back:
+                self.apply_result(item, text)
+            else:
+                item['view'].erase_regions(item['region_key'])
+
+        append_to_view(self.results_view, ''.join(output))
+        sublime.status_message("Claude batch: {0} of {1} items succeeded".format(succeeded, len(self.items)))
+
+    @staticmethod
+    def get_result_text(result):
+        if result.get('type') != 'succeeded':
+            return None
+
+        content = result.get('message', {}).get('content', [])
+        return ''.join(block.get('text', '') for block in content if block.get('type') == 'text')
+
+    @staticmethod
+    def apply_result(item, text):
+        view = item['view']
+        regions = view.get_regions(item['region_key'])
+        view.erase_regions(item['region_key'])
+
+        if not regions or not view.is_valid():
+            return
+
+        # Prefer the first code block, the rest of the answer is usually commentary
+        code_blocks = find_code_blocks(text)
+        replacement = code_blocks[0].raw_content if code_blocks else text.strip()
+
+        view.run_command('claudette_replace_region', {
+            'begin': regions[0].begin(),
+            'end': regions[0].end(),
+            'text': replacement
+        })
+
+
+class ClaudetteReplaceRegionCommand(sublime_plugin.TextCommand):
+    """Replace a region of the view as a single undoable edit."""
+
+    def run(self, edit, begin, end, text):
+        self.view.replace(edit, sublime.Region(begin, end), text)
+
+
+def append_to_view(view, text):
+    if not view or not view.is_valid():
+        return
+
+    view.set_read_only(False)
+    view.run_command('append', {
+        'characters': text,
+        'force': True,
+        'scroll_to_end': True
+    })
+    view.set_read_only(True)
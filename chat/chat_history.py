@@ -3,9 +3,12 @@ import sublime_plugin
 import json
 import os
 from ..constants import PLUGIN_NAME
+from ..core.messages import validate_and_sanitize_message
 from ..utils import claudette_chat_status_message
 from .ask_question import ClaudetteAskQuestionCommand
 from .chat_view import ClaudetteChatView
+from .registry import registry
+from .search import search_index
 
 def get_cache_path():
     """Get the path to the cache file"""
@@ -44,29 +47,68 @@ def get_current_directory(window):
         return os.path.dirname(view.file_name())
     return last_dir
 
-def validate_and_sanitize_message(message):
-    """Validate a single message object and remove disallowed items"""
-    if not isinstance(message, dict):
-        return False
-
-    if 'role' not in message or 'content' not in message:
-        return False
+def open_chat(window, messages, index=True):
+    """
+    Open a conversation in a new chat view.
+
+    Args:
+        window (sublime.Window): The window to open the chat view in
+        messages (list): The validated messages of the conversation
+        index (bool, optional): Whether to add the messages to the search index as a new chat
+
+    Returns:
+        tuple: The chat view, or None, and the position of each message in it
+    """
+    ask_cmd = ClaudetteAskQuestionCommand(window.active_view())
+    ask_cmd.load_settings()
+
+    sublime_view = ask_cmd.create_chat_panel(force_new=True)
+    if not sublime_view:
+        return None, []
+
+    chat_view = ClaudetteChatView.get_instance(window, ask_cmd.settings)
+    if not chat_view:
+        return None, []
+
+    sublime_view.set_read_only(False)
+    sublime_view.run_command('select_all')
+    sublime_view.run_command('right_delete')
+
+    sublime_view.settings().set("line_numbers", ask_cmd.settings.chat_line_numbers)
+
+    positions = []
+    first_message = True
+    for message in messages:
+        positions.append(sublime_view.size())
+        if message['role'] == 'user':
+            prefix = "" if first_message else "\n\n"
+            chat_view.append_text(
+                f"{prefix}## Question\n\n{message['content']}\n\n### Claude's Response\n\n",
+                scroll_to_end=False
+            )
+            first_message = False
+        elif message['role'] == 'assistant':
+            chat_view.append_text(
+                f"{message['content']}\n",
+                scroll_to_end=False
+            )
 
-    if message['role'] not in {'system', 'user', 'assistant'}:
-        return False
+    # Store the conversation history in the view's settings
+    ClaudetteChatView.store_conversation(sublime_view, json.dumps(messages))
 
-    if not isinstance(message['content'], str):
-        return False
+    if index:
+        for message in messages:
+            search_index.add_message(sublime_view, message['role'], message['content'])
 
-    cleaned_message = {
-        'role': message['role'],
-        'content': message['content']
-    }
+    end_point = sublime_view.size()
+    sublime_view.sel().clear()
+    sublime_view.sel().add(sublime.Region(end_point))
+    sublime_view.show(end_point)
 
-    message.clear()
-    message.update(cleaned_message)
+    # Update buttons for code blocks
+    chat_view.on_streaming_complete()
 
-    return True
+    return sublime_view, positions
 
 class ClaudetteImportChatHistoryCommand(sublime_plugin.WindowCommand):
     def run(self):
@@ -107,51 +149,10 @@ class ClaudetteImportChatHistoryCommand(sublime_plugin.WindowCommand):
             if not valid_messages:
                 raise ValueError("No valid messages found in import file")
 
-            ask_cmd = ClaudetteAskQuestionCommand(self.window.active_view())
-            ask_cmd.load_settings()
-
-            sublime_view = ask_cmd.create_chat_panel(force_new=True)
+            sublime_view, _ = open_chat(self.window, valid_messages)
             if not sublime_view:
                 return
 
-            chat_view = ClaudetteChatView.get_instance(self.window, ask_cmd.settings)
-            if not chat_view:
-                return
-
-            sublime_view.set_read_only(False)
-            sublime_view.run_command('select_all')
-            sublime_view.run_command('right_delete')
-
-            chat_settings = ask_cmd.settings.get('chat', {})
-            show_line_numbers = chat_settings.get('line_numbers', False)
-            sublime_view.settings().set("line_numbers", show_line_numbers)
-
-            first_message = True
-            for message in valid_messages:
-                if message['role'] == 'user':
-                    prefix = "" if first_message else "\n\n"
-                    chat_view.append_text(
-                        f"{prefix}## Question\n\n{message['content']}\n\n### Claude's Response\n\n",
-                        scroll_to_end=False
-                    )
-                    first_message = False
-                elif message['role'] == 'assistant':
-                    chat_view.append_text(
-                        f"{message['content']}\n",
-                        scroll_to_end=False
-                    )
-
-            # Store the conversation history in the view's settings
-            sublime_view.settings().set('claudette_conversation_json', json.dumps(valid_messages))
-
-            end_point = sublime_view.size()
-            sublime_view.sel().clear()
-            sublime_view.sel().add(sublime.Region(end_point))
-            sublime_view.show(end_point)
-
-            # Update buttons for code blocks
-            chat_view.on_streaming_complete()
-
             sublime.status_message(f"{PLUGIN_NAME}: Chat history imported successfully")
 
         except Exception as e:
@@ -204,6 +205,10 @@ class ClaudetteExportChatHistoryCommand(sublime_plugin.WindowCommand):
             with open(path, 'w', encoding='utf-8') as f:
                 json.dump(export_data, f, indent=2, ensure_ascii=False)
 
+            view = self.window.active_view()
+            if view:
+                search_index.set_export_path(view, path)
+
             sublime.status_message(f"{PLUGIN_NAME}: Chat history exported successfully")
 
         except Exception as e:
@@ -216,17 +221,14 @@ class ClaudetteClearChatHistoryCommand(sublime_plugin.TextCommand):
         if not window:
             return
 
-        current_chat_view = None
-        for view in window.views():
-            if (view.settings().get('claudette_is_chat_view', False) and
-                view.settings().get('claudette_is_current_chat', False)):
-                current_chat_view = view
-                break
+        current_chat_view = registry.get_current_chat_view(window)
 
         if current_chat_view:
-            current_chat_view.settings().set('claudette_conversation_json', '[]')
+            ClaudetteChatView.store_conversation(current_chat_view, '[]')
             current_chat_view.settings().erase('claudette_repomix')
             current_chat_view.settings().erase('claudette_repomix_tokens')
+            current_chat_view.settings().erase('claudette_code_attachments')
+            search_index.forget_view(current_chat_view)
 
             claudette_chat_status_message(window, "Chat history cleared", prefix="✅")
             sublime.status_message("Chat history cleared")
@@ -1,43 +1,28 @@
-import json
 import sublime
-import sublime_plugin
+import itertools
 import re
-from typing import List, Set
-from dataclasses import dataclass
-from ..constants import PLUGIN_NAME
-
-@dataclass
-class CodeBlock:
-    """Represents a code block found in the chat content."""
-    content: str
-    start_pos: int
-    end_pos: int
-    language: str
-
-class ClaudetteChatViewListener(sublime_plugin.ViewEventListener):
-    """Event listener specifically for chat views."""
-
-    @classmethod
-    def is_applicable(cls, settings):
-        """Only attach this listener to chat views."""
-        return settings.get('claudette_is_chat_view', False)
-
-    def on_text_command(self, command_name, args):
-        """Handle text commands for chat views."""
-        if command_name == "insert" and args.get("characters") == "\n":
-            try:
-                window = self.view.window()
-                if window:
-                    window.run_command('claudette_ask_question')
-                    return ('noop', None)
-            except Exception as e:
-                sublime.status_message(f"Claudette error: {str(e)}")
-        return None
+from bisect import bisect_right
+from typing import Set
+from ..constants import CHAT_SYNTAX, PLUGIN_NAME, STREAMING_SYNTAX
+from ..core.code_blocks import find_code_blocks, find_unclosed_code_blocks
+from ..core.conversation import Conversation
+from ..dispatcher import dispatcher
+from ..profiling.profiler import profiled
+from ..settings.snapshot import get_settings
+from .registry import registry
+from .search import search_index
+
+THINKING_REGION_KEY = 'claudette_thinking'
+NOT_NEWLINE = re.compile(r'[^\n]')
 
 class ClaudetteChatView:
     """Manages chat views for the Claudette plugin."""
 
     _instances = {}
+    _conversations = {}  # view id -> (version of the stored history, Conversation)
+    _versions = itertools.count(1)
+    _streaming = {}  # view id -> number of responses streaming into the view
+    _apply_targets = {}  # view id -> ([response starts], [(source view, region key) or None])
 
     @classmethod
     def get_instance(cls, window=None, settings=None):
@@ -54,6 +39,23 @@ class ClaudetteChatView:
 
         return cls._instances[window_id]
 
+    @classmethod
+    def release_view(cls, view_id):
+        """Free the state kept for a closed view."""
+        cls._conversations.pop(view_id, None)
+        cls._streaming.pop(view_id, None)
+        cls._apply_targets.pop(view_id, None)
+        for instance in cls._instances.values():
+            instance.phantom_sets.pop(view_id, None)
+            instance.existing_button_positions.pop(view_id, None)
+            if instance.view and instance.view.id() == view_id:
+                instance.view = None
+
+    @classmethod
+    def release_window(cls, window_id):
+        """Free the instance kept for a closed window."""
+        cls._instances.pop(window_id, None)
+
     def __init__(self, window, settings):
         """Initialize the chat view manager."""
         self.window = window
@@ -66,19 +68,18 @@ class ClaudetteChatView:
         """Create a new chat view or return an existing one."""
         try:
             # First check for current chat view in this window
-            for view in self.window.views():
-                if (view.settings().get('claudette_is_chat_view', False) and
-                    view.settings().get('claudette_is_current_chat', False)):
-                    self.view = view
-                    return self.view
-
-            # If no current chat view found, use the first chat view
-            for view in self.window.views():
-                if view.settings().get('claudette_is_chat_view', False):
-                    self.view = view
-                    # Set this view as current since none was marked as current
-                    view.settings().set('claudette_is_current_chat', True)
-                    return self.view
+            current_chat_view = registry.get_current_chat_view(self.window)
+            if current_chat_view:
+                self.view = current_chat_view
+                return self.view
+
+            # If no current chat view found, use the most recent chat view
+            chat_views = registry.get_chat_views(self.window)
+            if chat_views:
+                self.view = chat_views[-1]
+                # Set this view as current since none was marked as current
+                registry.set_current(self.view)
+                return self.view
 
             # Create new chat view if none exists in this window
             self.view = self.window.new_file()
@@ -87,20 +88,20 @@ class ClaudetteChatView:
                 sublime.error_message(f"{PLUGIN_NAME} Error: Could not create new file")
                 return None
 
-            chat_settings = self.settings.get('chat', {})
-            line_numbers = chat_settings.get('line_numbers', False)
-            rulers = chat_settings.get('rulers', False)
-            set_scratch = chat_settings.get('set_scratch', True)
+            settings = get_settings()
+            line_numbers = settings.chat_line_numbers
+            rulers = settings.chat_rulers
+            set_scratch = settings.chat_set_scratch
 
             self.view.set_name("Claude Chat")
             self.view.set_scratch(set_scratch)
-            self.view.assign_syntax('Packages/Markdown/Markdown.sublime-syntax')
+            self.view.assign_syntax(CHAT_SYNTAX)
             self.view.set_read_only(True)
             self.view.settings().set("line_numbers", line_numbers)
             self.view.settings().set("rulers", rulers)
             self.view.settings().set("claudette_is_chat_view", True)
-            self.view.settings().set("claudette_is_current_chat", True)
             self.view.settings().set("claudette_conversation", [])
+            registry.register(self.view)
 
             return self.view
 
@@ -123,39 +124,77 @@ class ClaudetteChatView:
             self.existing_button_positions[view_id] = set()
         return self.existing_button_positions[view_id]
 
-    def get_conversation_history(self):
-        """Get the conversation history from the current view's settings."""
+    def get_conversation(self):
+        """
+        Get the conversation of the current view.
+
+        The decoded conversation is cached per view and only decoded again
+        when the stored history was replaced, e.g. by clearing or compacting it.
+        """
         if not self.view:
-            return []
+            return Conversation()
+        return self.get_view_conversation(self.view)
 
-        conversation_json = self.view.settings().get('claudette_conversation_json', '[]')
-        try:
-            return json.loads(conversation_json)
-        except json.JSONDecodeError:
-            print(f"{PLUGIN_NAME} Error: Could not decode conversation history")
-            return []
+    @classmethod
+    @profiled('ClaudetteChatView.get_conversation')
+    def get_view_conversation(cls, view):
+        """Get the conversation of a chat view, see get_conversation()."""
+        view_id = view.id()
+        settings = view.settings()
+        version = settings.get('claudette_conversation_version')
+
+        # Only the version is read, the stored history is fetched when it changed
+        cached = cls._conversations.get(view_id)
+        if cached and cached[0] == version:
+            return cached[1]
 
+        conversation = Conversation.from_json(settings.get('claudette_conversation_json', '[]'))
+        cls._conversations[view_id] = (version, conversation)
+        return conversation
+
+    @classmethod
+    def store_conversation(cls, view, conversation_json, conversation=None):
+        """
+        Store the conversation history of a chat view.
+
+        Every write goes through here and sets a new version, so readers can
+        tell whether their cached conversation is current from the version alone.
+
+        Args:
+            view (sublime.View): The chat view
+            conversation_json (str): The JSON encoded messages
+            conversation (Conversation, optional): The conversation the JSON encodes, cached for readers
+        """
+        version = next(cls._versions)
+        settings = view.settings()
+        settings.set('claudette_conversation_json', conversation_json)
+        settings.set('claudette_conversation_version', version)
+
+        if conversation is None:
+            cls._conversations.pop(view.id(), None)
+        else:
+            cls._conversations[view.id()] = (version, conversation)
+
+    def get_conversation_history(self):
+        """Get the conversation history from the current view's settings."""
+        return list(self.get_conversation().messages)
+
+    @profiled('ClaudetteChatView.add_to_conversation')
     def add_to_conversation(self, role: str, content: str):
         """Add a new message to the conversation history."""
         if not self.view:
             return
 
-        conversation = self.get_conversation_history()
-        conversation.append({
-            "role": role,
-            "content": content
-        })
+        conversation = self.get_conversation()
+        conversation.append(role, content)
+        search_index.add_message(self.view, role, content)
 
-        try:
-            conversation_json = json.dumps(conversation)
-            self.view.settings().set('claudette_conversation_json', conversation_json)
-        except json.JSONEncodeError:
-            print(f"{PLUGIN_NAME} Error: Could not encode conversation history")
+        self.store_conversation(self.view, conversation.to_json(), conversation)
 
     def handle_question(self, question: str):
-        """Handle a new question and return the complete conversation context."""
+        """Handle a new question and return the complete conversation."""
         self.add_to_conversation("user", question)
-        return self.get_conversation_history()
+        return self.get_conversation()
 
     def handle_response(self, response: str):
         """Handle the Claude response by adding it to the conversation history."""
@@ -163,6 +202,7 @@ class ClaudetteChatView:
 
     def append_text(self, text, scroll_to_end=True):
         """Append text to the chat view."""
+        dispatcher.assert_main_thread('ClaudetteChatView.append_text')
         if not self.view:
             return
 
@@ -190,7 +230,11 @@ class ClaudetteChatView:
             self.view.run_command('select_all')
             self.view.run_command('right_delete')
             self.view.set_read_only(True)
-            self.view.settings().set('claudette_conversation_json', '[]')
+            self.store_conversation(self.view, '[]', Conversation())
+            self.view.settings().erase('claudette_code_attachments')
+            search_index.forget_view(self.view)
+            self._apply_targets.pop(self.view.id(), None)
+            self.view.erase_regions(THINKING_REGION_KEY)
             self.clear_buttons()
 
     def clear_buttons(self):
@@ -202,18 +246,102 @@ class ClaudetteChatView:
             if view_id in self.existing_button_positions:
                 self.existing_button_positions[view_id].clear()
 
+    def add_apply_target(self, response_start, source_view=None, region=None):
+        """
+        Remember the code a response is about, so its code blocks can be applied to it.
+
+        Called for every response, so the code blocks of a response without a
+        target are never applied to the target of an earlier one.
+
+        Args:
+            response_start (int): Position of the response in the chat view
+            source_view (sublime.View, optional): The view the question was asked from
+            region (sublime.Region, optional): The selection the question was about, None if there is no target
+        """
+        if not self.view:
+            return
+
+        target = None
+        if source_view is not None and region is not None:
+            region_key = "claudette_apply_{0}_{1}".format(self.view.id(), response_start)
+            source_view.add_regions(region_key, [region], '', '', sublime.HIDDEN)
+            target = (source_view, region_key)
+
+        starts, targets = self._apply_targets.setdefault(self.view.id(), ([], []))
+        starts.append(response_start)
+        targets.append(target)
+
+    def get_apply_target(self, position):
+        """Return the (source view, region key) of the response at the position in the chat view, or None."""
+        starts, targets = self._apply_targets.get(self.view.id(), ([], []))
+        index = bisect_right(starts, position) - 1
+        return targets[index] if index >= 0 else None
+
+    def add_thinking_region(self, region):
+        """Mark extended thinking in the view, so code in it does not get buttons or closing fences."""
+        if not self.view:
+            return
+
+        regions = self.view.get_regions(THINKING_REGION_KEY)
+        regions.append(region)
+        self.view.add_regions(THINKING_REGION_KEY, regions, '', '', sublime.HIDDEN)
+
+    def get_answer_content(self):
+        """
+        Return the content of the view with the extended thinking blanked out.
+
+        The thinking is replaced by spaces, keeping its newlines, so the
+        positions of the code blocks in the answers stay the same.
+        """
+        content = self.view.substr(sublime.Region(0, self.view.size()))
+        regions = self.view.get_regions(THINKING_REGION_KEY)
+        if not regions:
+            return content
+
+        parts = []
+        position = 0
+        for region in regions:
+            parts.append(content[position:region.begin()])
+            parts.append(NOT_NEWLINE.sub(' ', content[region.begin():region.end()]))
+            position = region.end()
+        parts.append(content[position:])
+        return ''.join(parts)
+
+    def on_streaming_start(self) -> None:
+        """Switch to the lightweight streaming syntax while a response is streaming in, if enabled."""
+        if not self.view:
+            return
+
+        view_id = self.view.id()
+        self._streaming[view_id] = self._streaming.get(view_id, 0) + 1
+
+        if self._streaming[view_id] == 1 and get_settings().chat_streaming_syntax:
+            self.view.assign_syntax(STREAMING_SYNTAX)
+
+    def restore_syntax(self) -> None:
+        """Switch back to Markdown once no more responses are streaming into the view."""
+        view_id = self.view.id()
+        count = max(self._streaming.get(view_id, 0) - 1, 0)
+        self._streaming[view_id] = count
+
+        if count == 0 and self.view.settings().get('syntax') == STREAMING_SYNTAX:
+            self.view.assign_syntax(CHAT_SYNTAX)
+
+    @profiled('ClaudetteChatView.on_streaming_complete')
     def on_streaming_complete(self) -> None:
         """Handle code blocks and phantom buttons when streaming is complete."""
+        dispatcher.assert_main_thread('ClaudetteChatView.on_streaming_complete')
         if not self.view:
             return
 
+        self.restore_syntax()
+
         self.validate_and_fix_code_blocks()
 
         phantom_set = self.get_phantom_set(self.view)
         button_positions = self.get_button_positions(self.view)
 
-        content = self.view.substr(sublime.Region(0, self.view.size()))
-        code_blocks = self.find_code_blocks(content)
+        code_blocks = find_code_blocks(self.get_answer_content())
 
         phantoms = []
         new_positions: Set[int] = set()
@@ -229,14 +357,15 @@ class ClaudetteChatView:
             if block.end_pos not in new_positions:
                 region = sublime.Region(block.end_pos, block.end_pos)
                 escaped_code = self.escape_html(block.content)
+                target = self.get_apply_target(block.start_pos)
 
-                button_html = self.create_button_html(escaped_code)
+                button_html = self.create_button_html(escaped_code, can_apply=target is not None)
 
                 phantom = sublime.Phantom(
                     region,
                     button_html,
                     sublime.LAYOUT_BLOCK,
-                    lambda href, code=block.content: self.handle_copy(code)
+                    lambda href, block=block, target=target: self.handle_button(href, block, target)
                 )
                 phantoms.append(phantom)
                 new_positions.add(block.end_pos)
@@ -246,6 +375,26 @@ class ClaudetteChatView:
         if phantoms:
             phantom_set.update(phantoms)
 
+    def handle_button(self, href, block, target):
+        if href == 'apply':
+            self.handle_apply(block.raw_content, target)
+        else:
+            self.handle_copy(block.content)
+
+    def handle_apply(self, code, target):
+        """Apply the code to the selection the question was asked about."""
+        source_view, region_key = target
+        if not source_view.is_valid():
+            sublime.status_message("The file this answer is about has been closed")
+            return
+
+        source_view.run_command('claudette_apply_code', {
+            'text': code,
+            'region_key': region_key
+        })
+        if source_view.window():
+            source_view.window().focus_view(source_view)
+
     def handle_copy(self, code):
         """Copy code to clipboard when button is clicked."""
         try:
@@ -255,48 +404,16 @@ class ClaudetteChatView:
             print(f"{PLUGIN_NAME} Error copying to clipboard: {str(e)}")
             sublime.status_message("Error copying code to clipboard")
 
-    def find_code_blocks(self, content: str) -> List[CodeBlock]:
-        """Find all code blocks in the content."""
-        blocks = []
-        pattern = r"```([\w+]*)\n(.*?)\n```"
-
-        for match in re.finditer(pattern, content, re.DOTALL):
-            language = match.group(1).strip()
-            content = match.group(2).strip()
-            blocks.append(CodeBlock(
-                content=content,
-                start_pos=match.start(),
-                end_pos=match.end(),
-                language=language
-            ))
-        return blocks
-
+    @profiled('ClaudetteChatView.validate_and_fix_code_blocks')
     def validate_and_fix_code_blocks(self) -> None:
         """Validate and fix unclosed code blocks."""
         if not self.view:
             return
 
-        content = self.view.substr(sublime.Region(0, self.view.size()))
-        lines = content.split('\n')
-        stack = []
-        fixes_needed = []
-
-        for i, line in enumerate(lines):
-            stripped = line.strip()
-
-            if stripped.startswith('```'):
-                if len(stripped) > 3:  # Opening block with language
-                    stack.append((i, stripped[3:].strip()))
-                elif stripped == '```':
-                    if stack:  # Proper closing
-                        stack.pop()
-                    else:  # Orphaned closing marker
-                        fixes_needed.append((i, 'remove'))
-
-        # Handle unclosed blocks
-        if stack:
+        unclosed = find_unclosed_code_blocks(self.get_answer_content())
+        if unclosed:
             self.view.set_read_only(False)
-            for _, language in stack:
+            for _ in unclosed:
                 self.view.run_command('append', {
                     'characters': '\n```',
                     'force': True,
@@ -313,9 +430,10 @@ class ClaudetteChatView:
                 .replace('<', '&lt;')
                 .replace('>', '&gt;'))
 
-    def create_button_html(self, code: str) -> str:
-        """Create HTML for the copy button with optional language indicator."""
-        return f'''<div class="code-block-button"><a class="copy-button" href="copy:{code}">Copy</a></div>'''
+    def create_button_html(self, code: str, can_apply: bool = False) -> str:
+        """Create HTML for the copy button, and the apply button if the code has a target."""
+        apply_button = ' <a class="apply-button" href="apply">Apply</a>' if can_apply else ''
+        return f'''<div class="code-block-button"><a class="copy-button" href="copy:{code}">Copy</a>{apply_button}</div>'''
 
     def destroy(self):
         """Clean up the chat view and associated resources."""
@@ -0,0 +1,165 @@
+import sublime
+import sublime_plugin
+import json
+import os
+import threading
+import time
+from ..constants import PLUGIN_NAME
+from ..api.api import ClaudeAPI
+from ..core.conversation import Conversation
+from ..core.tokens import estimate_tokens, find_compaction_index
+from ..dispatcher import dispatcher
+from ..settings.snapshot import get_settings
+from ..utils import claudette_chat_status_message
+from .attachments import CodeAttachments
+from .chat_view import ClaudetteChatView
+from .registry import registry
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You summarize conversations between a user and an AI programming assistant. "
+    "Write a concise summary that preserves all facts, decisions, requirements, file names, "
+    "identifiers and code that later questions may refer to. Only output the summary."
+)
+SUMMARY_PREFIX = "Summary of our conversation so far:\n\n"
+SUMMARY_ACKNOWLEDGEMENT = "Understood. I will use this summary as the context of our conversation."
+
+def get_archive_path(view):
+    """Get the path of the file the original messages are archived in."""
+    archive_dir = os.path.join(sublime.cache_path(), PLUGIN_NAME, 'compacted')
+    if not os.path.exists(archive_dir):
+        os.makedirs(archive_dir)
+    filename = "{0}-{1}.json".format(time.strftime('%Y%m%d-%H%M%S'), view.id())
+    return os.path.join(archive_dir, filename)
+
+def format_transcript(messages):
+    parts = []
+    for msg in messages:
+        role = "User" if msg['role'] == 'user' else "Assistant"
+        parts.append("{0}:\n{1}".format(role, msg['content']))
+    return '\n\n'.join(parts)
+
+
+class ConversationCompactor:
+    """Replaces the older messages of a chat view's conversation with a summary."""
+
+    _in_progress = set()
+
+    def __init__(self, view):
+        self.view = view
+        self.settings = get_settings()
+
+    def get_messages(self):
+        return list(ClaudetteChatView.get_view_conversation(self.view).messages)
+
+    def needs_compaction(self):
+        return estimate_tokens(self.get_messages()) > self.settings.compaction_threshold_tokens
+
+    def compact(self, on_done=None):
+        """
+        Start summarizing the older messages in the background.
+
+        Args:
+            on_done (callable, optional): Called on the main thread with a status message
+        """
+        if self.view.id() in self._in_progress:
+            return False
+
+        messages = self.get_messages()
+        index = find_compaction_index(messages, self.settings.compaction_keep_recent)
+        # Code that later messages refer to is carried over into the summary, unless it is no longer available
+        index = CodeAttachments(self.view).get_safe_compaction_index(index, messages)
+        if index < 2:
+            return False
+
+        self._in_progress.add(self.view.id())
+        thread = threading.Thread(
+            target=self.summarize,
+            args=(messages[:index], on_done)
+        )
+        thread.start()
+        return True
+
+    def summarize(self, old_messages, on_done):
+        try:
+            api = ClaudeAPI(model=self.settings.compaction_model)
+            summary = api.complete(
+                [{'role': 'user', 'content': format_transcript(old_messages)}],
+                system=SUMMARY_SYSTEM_PROMPT
+            )
+            dispatcher.dispatch(self.apply, old_messages, summary, on_done)
+        except Exception as e:
+            print(f"{PLUGIN_NAME} Error compacting chat history: {str(e)}")
+            self._in_progress.discard(self.view.id())
+            if on_done:
+                dispatcher.dispatch(on_done, "Could not compact chat history")
+
+    def apply(self, old_messages, summary, on_done):
+        self._in_progress.discard(self.view.id())
+
+        if not self.view.is_valid() or not summary.strip():
+            return
+
+        messages = self.get_messages()
+        count = len(old_messages)
+
+        # The history may have been cleared or replaced while the summary was generated
+        if messages[:count] != old_messages:
+            if on_done:
+                on_done("Chat history changed, compaction skipped")
+            return
+
+        archive_path = get_archive_path(self.view)
+        try:
+            with open(archive_path, 'w', encoding='utf-8') as f:
+                json.dump({'messages': old_messages}, f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            print(f"{PLUGIN_NAME} Error archiving chat history: {str(e)}")
+            return
+
+        attachments = CodeAttachments(self.view)
+        summary, carried = attachments.carry_over(SUMMARY_PREFIX + summary.strip(), messages, count)
+        compacted = [
+            {'role': 'user', 'content': summary},
+            {'role': 'assistant', 'content': SUMMARY_ACKNOWLEDGEMENT}
+        ] + messages[count:]
+
+        archives = self.view.settings().get('claudette_compacted_archives', [])
+        self.view.settings().set('claudette_compacted_archives', archives + [archive_path])
+        conversation = Conversation(compacted)
+        ClaudetteChatView.store_conversation(self.view, conversation.to_json(), conversation)
+        attachments.on_compacted(count, 2, carried)
+
+        print(f"{PLUGIN_NAME}: Compacted {count} messages, originals saved to {archive_path}")
+        if on_done:
+            on_done("Compacted {0} messages into a summary".format(count))
+
+
+def compact_if_needed(view):
+    """Compact the conversation of the view in the background if automatic compaction is enabled."""
+    if not view or not view.is_valid():
+        return
+
+    compactor = ConversationCompactor(view)
+    if compactor.settings.compaction_auto and compactor.needs_compaction():
+        compactor.compact(on_done=lambda message: sublime.status_message(message))
+
+
+class ClaudetteCompactChatHistoryCommand(sublime_plugin.TextCommand):
+    def run(self, edit):
+        window = sublime.active_window()
+        if not window:
+            return
+
+        current_chat_view = registry.get_current_chat_view(window)
+
+        if not current_chat_view:
+            sublime.status_message("No active chat view found")
+            return
+
+        def on_done(message):
+            claudette_chat_status_message(window, message, prefix="✅")
+
+        if ConversationCompactor(current_chat_view).compact(on_done=on_done):
+            sublime.status_message("Compacting chat history")
+        else:
+            sublime.status_message("Chat history is too short to compact")
@@ -0,0 +1,291 @@
+import sublime
+import sublime_plugin
+import os
+from ..constants import PLUGIN_NAME
+from ..api.api import ClaudeAPI
+from ..api.usage import get_project, get_routine_model
+from ..core.conversation import Conversation
+from ..core.request_state import RequestState
+
+REGION_KEY = 'claudette_in_place'
+CONTEXT_CHARS = 4000
+SYSTEM_PROMPT = (
+    "You edit code in place in the user's editor. Reply with only the code, "
+    "without explanations and without a markdown code block."
+)
+
+def build_prompt(view, region, question):
+    """Build the user message for a question about the selection, or the cursor position if nothing is selected."""
+    name = os.path.basename(view.file_name() or view.name() or 'untitled')
+
+    if not region.empty():
+        return (
+            f"{question}\n\nFile: {name}\n\nSelection:\n{view.substr(region)}\n\n"
+            "Reply with only the code that replaces the selection."
+        )
+
+    before = view.substr(sublime.Region(max(0, region.begin() - CONTEXT_CHARS), region.begin()))
+    after = view.substr(sublime.Region(region.end(), min(view.size(), region.end() + CONTEXT_CHARS)))
+    return (
+        f"{question}\n\nFile: {name}\n\nCode before the cursor:\n{before}\n\n"
+        f"Code after the cursor:\n{after}\n\n"
+        "Reply with only the code to insert at the cursor."
+    )
+
+def is_fence(line):
+    return line.strip().startswith('```')
+
+
+class FenceStripper:
+    """
+    Removes the markdown code block around streamed code as it arrives.
+
+    Text is passed through as soon as it cannot be part of a code fence
+    line. Anything after the closing fence, usually an explanation, is
+    dropped.
+    """
+
+    def __init__(self):
+        self.pending = ''
+        self.state = 'start'  # start, code (in a fence), plain (no fence) or done
+        self.continued = False  # whether the start of the pending line was already passed through
+
+    def feed(self, text):
+        self.pending += text
+        output = []
+
+        while '\n' in self.pending:
+            line, self.pending = self.pending.split('\n', 1)
+            if self.continued:
+                self.continued = False
+                output.append(line + '\n' if self.state != 'done' else '')
+            else:
+                output.append(self.process_line(line + '\n'))
+
+        # Hold back a partial line only while it could still become a fence
+        stripped = self.pending.lstrip()
+        if (self.pending and self.state != 'done' and
+                (self.continued or stripped[:3] != '```'[:len(stripped[:3])])):
+            if self.state == 'start':
+                self.state = 'plain'
+            output.append(self.pending)
+            self.pending = ''
+            self.continued = True
+
+        return ''.join(output)
+
+    def finish(self):
+        line, self.pending = self.pending, ''
+        if not line:
+            return ''
+        if self.continued:
+            return line if self.state != 'done' else ''
+        return self.process_line(line)
+
+    def process_line(self, line):
+        if self.state == 'done':
+            return ''
+
+        if self.state == 'start':
+            if not line.strip():
+                return ''
+            if is_fence(line):
+                self.state = 'code'
+                return ''
+            self.state = 'plain'
+
+        if is_fence(line):
+            if self.state == 'code':
+                self.state = 'done'
+            return ''
+
+        return line
+
+
+class InPlaceSession:
+    """
+    Streams an answer into the source view, replacing the selection.
+
+    The answer is inserted with one edit per batch of chunks, and collapsed
+    into a single undoable edit when it is complete. Until then, revert()
+    cancels the request and restores the original text.
+    """
+
+    _sessions = {}  # view id -> InPlaceSession
+
+    @classmethod
+    def get(cls, view):
+        return cls._sessions.get(view.id())
+
+    def __init__(self, view, region, question):
+        self.view = view
+        self.question = question
+        self.original = view.substr(region)
+        self.stripper = FenceStripper()
+        self.inserted = []
+        self.length = 0
+        self.edits = 0
+        self.done = False
+        self.api = None
+
+        view.add_regions(REGION_KEY, [region], 'region.bluish', '', sublime.DRAW_NO_FILL)
+
+    def get_region(self):
+        regions = self.view.get_regions(REGION_KEY)
+        return regions[0] if regions else None
+
+    def start(self):
+        region = self.get_region()
+        conversation = Conversation()
+        conversation.append('user', build_prompt(self.view, region, self.question))
+
+        self._sessions[self.view.id()] = self
+        project = get_project(self.view.window())
+        self.api = ClaudeAPI(model=get_routine_model(project), system=({"type": "text", "text": SYSTEM_PROMPT},))
+        self.api.project = project
+        self.api.start_stream(self.on_text, conversation, self.on_done)
+
+    def on_text(self, text):
+        if self.done:
+            return
+        if not self.view.is_valid():
+            # The view was closed, nothing to stream into
+            self.api.state.cancel()
+            self.close()
+            return
+
+        if self.api.state.status == RequestState.ERROR:
+            if text.startswith('[Error]'):
+                self.revert()
+                print(f"{PLUGIN_NAME} {text}")
+                sublime.status_message(text)
+            return
+
+        self.insert(self.stripper.feed(text))
+
+    def insert(self, text):
+        region = self.get_region()
+        if region is None or (not text and self.edits):
+            return
+
+        # The first edit replaces the selection, the following ones append to the answer
+        begin = region.begin() if not self.edits else region.begin() + self.length
+        end = region.end() if not self.edits else begin
+        self.view.run_command('claudette_in_place_edit', {'begin': begin, 'end': end, 'text': text})
+
+        self.edits += 1
+        self.length += len(text)
+        self.inserted.append(text)
+        self.view.add_regions(
+            REGION_KEY,
+            [sublime.Region(region.begin(), region.begin() + self.length)],
+            'region.bluish', '', sublime.DRAW_NO_FILL
+        )
+
+    def on_done(self, stats):
+        if self.done:
+            return
+        if not self.view.is_valid():
+            self.close()
+            return
+
+        if self.api.state.status != RequestState.DONE:
+            self.revert()
+            return
+
+        self.insert(self.stripper.finish())
+        answer = ''.join(self.inserted)
+
+        # Keep the original ending, the last line of a code block always ends with a newline
+        if answer.endswith('\n') and not self.original.endswith('\n'):
+            answer = answer[:-1]
+
+        region = self.get_region()
+        if region is not None and self.undo_edits():
+            self.view.run_command('claudette_in_place_edit', {
+                'begin': region.begin(),
+                'end': region.begin() + len(self.original),
+                'text': answer
+            })
+
+        self.close()
+
+    def undo_edits(self):
+        """
+        Undo the streamed edits, if nothing else was edited in between.
+
+        Returns:
+            bool: Whether the view is back to its original state
+        """
+        while self.edits and self.view.command_history(0, True)[0] == 'claudette_in_place_edit':
+            self.view.run_command('undo')
+            self.edits -= 1
+            self.length -= len(self.inserted.pop())
+        return self.edits == 0
+
+    def revert(self):
+        """Cancel the request and restore the original text."""
+        if self.api:
+            self.api.state.cancel()
+
+        region = self.get_region()
+        if region is not None and not self.undo_edits():
+            self.view.run_command('claudette_in_place_edit', {
+                'begin': region.begin(),
+                'end': region.begin() + self.length,
+                'text': self.original
+            })
+
+        self.close()
+        sublime.status_message("Claude edit reverted")
+
+    def close(self):
+        self.done = True
+        self.view.erase_regions(REGION_KEY)
+        if self._sessions.get(self.view.id()) is self:
+            del self._sessions[self.view.id()]
+
+
+class ClaudetteAskInPlaceCommand(sublime_plugin.TextCommand):
+    """Ask a question about the selection and stream the answer into the view in its place."""
+
+    def run(self, edit, question=None):
+        if InPlaceSession.get(self.view):
+            sublime.status_message("Claude is already editing this view")
+            return
+
+        if question:
+            self.ask(question)
+            return
+
+        window = self.view.window() or sublime.active_window()
+        window.show_input_panel("Ask Claude (in place):", "", self.ask, None, None)
+
+    def ask(self, question):
+        if not question.strip():
+            return
+
+        sel = self.view.sel()
+        if not sel:
+            return
+
+        InPlaceSession(self.view, sel[0], question.strip()).start()
+
+
+class ClaudetteRevertInPlaceCommand(sublime_plugin.TextCommand):
+    """Stop an in-place answer and restore the original text."""
+
+    def run(self, edit):
+        session = InPlaceSession.get(self.view)
+        if session:
+            session.revert()
+        elif self.view.command_history(0, True)[0] == 'claudette_in_place_edit':
+            self.view.run_command('undo')
+            sublime.status_message("Claude edit reverted")
+
+
+class ClaudetteInPlaceEditCommand(sublime_plugin.TextCommand):
+    """Replace a region with part of an in-place answer."""
+
+    def run(self, edit, begin, end, text):
+        self.view.replace(edit, sublime.Region(begin, end), text)
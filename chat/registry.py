@@ -0,0 +1,138 @@
+class ChatViewRegistry:
+    """
+    Index of the chat views in each window.
+
+    Keeps track of the chat views and the current chat view per window, so
+    finding the current chat view does not require looping over every view
+    in the window. The index is updated by the view event listeners and by
+    the code that creates chat views. Windows that were open before the
+    plugin was (re)loaded are indexed on first use.
+    """
+
+    def __init__(self):
+        self._chat_views = {}  # window id -> {view id: view}
+        self._current = {}  # window id -> view id
+        self._view_windows = {}  # view id -> window id
+
+    def _ensure_indexed(self, window):
+        window_id = window.id()
+        if window_id in self._chat_views:
+            return self._chat_views[window_id]
+
+        chat_views = {}
+        current = None
+        for view in window.views():
+            if view.settings().get('claudette_is_chat_view', False):
+                chat_views[view.id()] = view
+                self._view_windows[view.id()] = window_id
+                if current is None and view.settings().get('claudette_is_current_chat', False):
+                    current = view.id()
+
+        self._chat_views[window_id] = chat_views
+        if current is not None:
+            self._current[window_id] = current
+
+        return chat_views
+
+    def is_chat_view(self, view):
+        window = view.window()
+        if not window:
+            return view.id() in self._view_windows
+        return view.id() in self._ensure_indexed(window)
+
+    def register(self, view, make_current=True):
+        """Add a chat view to the index, by default as the current chat view of its window."""
+        window = view.window()
+        if not window:
+            return
+
+        self._ensure_indexed(window)[view.id()] = view
+        self._view_windows[view.id()] = window.id()
+
+        if make_current:
+            self.set_current(view)
+
+    def set_current(self, view):
+        """Mark the chat view as the current chat view of its window."""
+        window = view.window()
+        if not window:
+            return
+
+        window_id = window.id()
+        chat_views = self._ensure_indexed(window)
+        previous_id = self._current.get(window_id)
+
+        if previous_id == view.id():
+            return
+
+        if previous_id in chat_views and chat_views[previous_id].is_valid():
+            chat_views[previous_id].settings().set('claudette_is_current_chat', False)
+
+        self._current[window_id] = view.id()
+        view.settings().set('claudette_is_current_chat', True)
+
+    def activate(self, view):
+        """Make the view the current chat view of its window if it is a chat view."""
+        window = view.window()
+        if not window:
+            return
+
+        if view.id() not in self._ensure_indexed(window):
+            if self._view_windows.get(view.id()) is None:
+                return
+            # The chat view was moved to another window
+            self.unregister(view)
+            self.register(view, make_current=False)
+
+        self.set_current(view)
+
+    def get_current_chat_view(self, window):
+        """Return the current chat view of the window, or None."""
+        if not window:
+            return None
+
+        chat_views = self._ensure_indexed(window)
+        view = chat_views.get(self._current.get(window.id()))
+        if view and view.is_valid():
+            return view
+        return None
+
+    def get_chat_views(self, window):
+        if not window:
+            return []
+        return [view for view in self._ensure_indexed(window).values() if view.is_valid()]
+
+    def unregister(self, view):
+        """
+        Remove a closing chat view from the index.
+
+        If it was the current chat view, the most recently registered remaining
+        chat view of the window becomes the current one.
+
+        Returns:
+            bool: Whether the view was a registered chat view
+        """
+        window_id = self._view_windows.pop(view.id(), None)
+        if window_id is None:
+            return False
+
+        chat_views = self._chat_views.get(window_id, {})
+        chat_views.pop(view.id(), None)
+
+        if self._current.get(window_id) == view.id():
+            del self._current[window_id]
+            remaining = [v for v in chat_views.values() if v.is_valid()]
+            if remaining:
+                self._current[window_id] = remaining[-1].id()
+                remaining[-1].settings().set('claudette_is_current_chat', True)
+
+        return True
+
+    def forget_window(self, window):
+        window_id = window.id()
+        for view_id in self._chat_views.pop(window_id, {}):
+            self._view_windows.pop(view_id, None)
+        self._current.pop(window_id, None)
+
+
+registry = ChatViewRegistry()
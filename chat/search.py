@@ -0,0 +1,306 @@
+import sublime
+import sublime_plugin
+import bisect
+import json
+import os
+import re
+import threading
+import uuid
+from ..constants import PLUGIN_NAME
+from ..dispatcher import dispatcher
+from ..settings.snapshot import get_settings
+from .registry import registry
+
+TOKEN_PATTERN = re.compile(r'\w{2,40}')
+PREVIEW_LENGTH = 120
+MAX_RESULTS = 100
+
+def tokenize(text):
+    return set(TOKEN_PATTERN.findall(text.lower()))
+
+def get_preview(text):
+    preview = ' '.join(text.split())
+    if len(preview) > PREVIEW_LENGTH:
+        preview = preview[:PREVIEW_LENGTH - 1] + '…'
+    return preview
+
+def get_search_dir(*parts):
+    """Get a directory for the search index in the Sublime Text cache directory."""
+    search_dir = os.path.join(sublime.cache_path(), PLUGIN_NAME, 'search', *parts)
+    if not os.path.exists(search_dir):
+        os.makedirs(search_dir)
+    return search_dir
+
+
+class SearchIndex:
+    """
+    Persistent full-text index over the messages of all chats.
+
+    Every message added to a chat is appended to a log of that chat and to
+    the index log, so an update only writes the new message. The index log
+    holds the words and a short preview of each message, and is read into
+    an inverted index on the first search. Each chat is stored in a file of
+    its own, so opening a search result only reads that chat.
+
+    The log is read without holding the lock, so adding a message on the
+    main thread never waits for it. Messages added meanwhile are kept
+    aside and added once the log has been read.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._pending = None  # Entries added while the log is read
+        self.loaded = False
+        self.postings = {}  # word -> ascending list of document ids
+        self.documents = []  # document id -> (chat id, message index, role, preview)
+        self.chats = {}  # chat id -> {'title': first question, 'path': export path}
+
+    def get_index_path(self):
+        return os.path.join(get_search_dir(), 'index.jsonl')
+
+    def get_chat_path(self, chat_id):
+        return os.path.join(get_search_dir('chats'), chat_id + '.jsonl')
+
+    def add_message(self, view, role, content):
+        """Add a message of a chat view to its chat log and the index. Call from the main thread."""
+        if not get_settings().search_index:
+            return
+
+        settings = view.settings()
+        chat_id = settings.get('claudette_chat_id')
+        if not chat_id:
+            chat_id = uuid.uuid4().hex
+            settings.set('claudette_chat_id', chat_id)
+        message_index = settings.get('claudette_chat_length', 0)
+        settings.set('claudette_chat_length', message_index + 1)
+
+        entry = {
+            'c': chat_id,
+            'm': message_index,
+            'r': role,
+            'p': get_preview(content),
+            't': sorted(tokenize(content))
+        }
+
+        try:
+            with self._lock:
+                with open(self.get_chat_path(chat_id), 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({'role': role, 'content': content}) + '\n')
+                with open(self.get_index_path(), 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry) + '\n')
+                self.index_entry(entry)
+        except OSError as e:
+            print(f"{PLUGIN_NAME} Error updating the search index: {str(e)}")
+
+    def set_export_path(self, view, path):
+        """Remember where the chat of a view was exported to."""
+        chat_id = view.settings().get('claudette_chat_id')
+        if not chat_id or not get_settings().search_index:
+            return
+
+        entry = {'c': chat_id, 'path': path}
+        try:
+            with self._lock:
+                with open(self.get_index_path(), 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry) + '\n')
+                self.index_entry(entry)
+        except OSError as e:
+            print(f"{PLUGIN_NAME} Error updating the search index: {str(e)}")
+
+    @staticmethod
+    def forget_view(view):
+        """Start a new chat in the view, e.g. after its history was cleared."""
+        view.settings().erase('claudette_chat_id')
+        view.settings().erase('claudette_chat_length')
+
+    def index_entry(self, entry):
+        """Add a new index log entry to the in-memory index, or keep it until the log has been read. Call with the lock held."""
+        if self.loaded:
+            self.add_entry(entry)
+        elif self._pending is not None:
+            self._pending.append(entry)
+
+    def add_entry(self, entry):
+        """Add an index log entry to the in-memory index. Call with the lock held, or on an index of its own."""
+        chat = self.chats.setdefault(entry['c'], {'title': None, 'path': None})
+        if 'path' in entry:
+            chat['path'] = entry['path']
+            return
+
+        if chat['title'] is None and entry['r'] == 'user':
+            chat['title'] = entry['p']
+
+        document = len(self.documents)
+        self.documents.append((entry['c'], entry['m'], entry['r'], entry['p']))
+        for word in entry['t']:
+            postings = self.postings.get(word)
+            if postings is None:
+                self.postings[word] = [document]
+            else:
+                postings.append(document)
+
+    def load(self):
+        """Read the index log into memory, once. Blocks, so call it from a worker thread."""
+        with self._load_lock:
+            with self._lock:
+                if self.loaded:
+                    return
+                # Entries are appended under the lock, so the log up to here is complete
+                path = self.get_index_path()
+                size = os.path.getsize(path) if os.path.exists(path) else 0
+                self._pending = []
+
+            try:
+                index = SearchIndex()
+                if size:
+                    with open(path, 'rb') as f:
+                        position = 0
+                        for line in f:
+                            position += len(line)
+                            if position > size:
+                                break
+                            try:
+                                index.add_entry(json.loads(line.decode('utf-8')))
+                            except (ValueError, KeyError):
+                                continue # Skip a line that was cut off by a crash
+
+                with self._lock:
+                    self.postings = index.postings
+                    self.documents = index.documents
+                    self.chats = index.chats
+                    for entry in self._pending:
+                        self.add_entry(entry)
+                    self.loaded = True
+            finally:
+                with self._lock:
+                    self._pending = None
+
+    def search(self, query, limit=MAX_RESULTS):
+        """
+        Find the messages that contain all words of the query, newest first.
+
+        Returns:
+            list: (chat id, message index, role, preview) tuples
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+
+        with self._lock:
+            lists = [self.postings.get(word, []) for word in words]
+            lists.sort(key=len)
+            rarest, others = lists[0], lists[1:]
+
+            results = []
+            for document in reversed(rarest):
+                if all(self.contains(postings, document) for postings in others):
+                    results.append(self.documents[document])
+                    if len(results) >= limit:
+                        break
+
+            return results
+
+    @staticmethod
+    def contains(postings, document):
+        index = bisect.bisect_left(postings, document)
+        return index < len(postings) and postings[index] == document
+
+    def get_chat(self, chat_id):
+        return self.chats.get(chat_id, {'title': None, 'path': None})
+
+    def read_chat(self, chat_id):
+        """Read the messages of a single chat."""
+        messages = []
+        with open(self.get_chat_path(chat_id), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    messages.append(json.loads(line))
+                except ValueError:
+                    continue
+        return messages
+
+
+search_index = SearchIndex()
+
+
+class ClaudetteSearchChatsCommand(sublime_plugin.WindowCommand):
+    """Search the messages of all chats and open the chat of a result."""
+
+    def run(self, query=None):
+        if query:
+            self.search(query)
+            return
+
+        self.window.show_input_panel("Search chats:", "", self.search, None, None)
+
+    def search(self, query):
+        if not query.strip():
+            return
+
+        def run_search():
+            try:
+                search_index.load()
+                results = search_index.search(query)
+            except OSError as e:
+                print(f"{PLUGIN_NAME} Error reading the search index: {str(e)}")
+                dispatcher.dispatch(sublime.error_message, f"{PLUGIN_NAME} Error: Could not read the search index")
+                return
+            dispatcher.dispatch(self.show_results, query, results)
+
+        threading.Thread(target=run_search).start()
+
+    def show_results(self, query, results):
+        if not results:
+            sublime.status_message("No chats found for: {0}".format(query))
+            return
+
+        items = []
+        for chat_id, _, role, preview in results:
+            chat = search_index.get_chat(chat_id)
+            details = "{0}: {1}".format('Claude' if role == 'assistant' else 'You', preview)
+            if chat['path']:
+                details += " · " + os.path.basename(chat['path'])
+            items.append([chat['title'] or "Untitled chat", details])
+
+        self.window.show_quick_panel(
+            items,
+            lambda index: self.open_result(results[index]) if index != -1 else None
+        )
+
+    def find_chat_view(self, chat_id):
+        for window in sublime.windows():
+            for view in registry.get_chat_views(window):
+                if view.settings().get('claudette_chat_id') == chat_id:
+                    return view
+        return None
+
+    def open_result(self, result):
+        chat_id, message_index, _, _ = result
+
+        view = self.find_chat_view(chat_id)
+        if view:
+            view.window().focus_view(view)
+            return
+
+        try:
+            messages = search_index.read_chat(chat_id)
+        except OSError as e:
+            print(f"{PLUGIN_NAME} Error reading chat: {str(e)}")
+            sublime.error_message(f"{PLUGIN_NAME} Error: Could not open the chat")
+            return
+
+        from .chat_history import open_chat
+
+        view, positions = open_chat(self.window, messages, index=False)
+        if not view:
+            return
+
+        # Continue the same chat log when the conversation goes on
+        view.settings().set('claudette_chat_id', chat_id)
+        view.settings().set('claudette_chat_length', len(messages))
+
+        if message_index < len(positions):
+            view.sel().clear()
+            view.sel().add(sublime.Region(positions[message_index]))
+            view.show_at_center(positions[message_index])
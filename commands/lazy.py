@@ -0,0 +1,53 @@
+import importlib
+import sublime_plugin
+
+PACKAGE = __package__.rpartition('.')[0]
+
+def load_class(module, name):
+    """Import a class from a module relative to the package root."""
+    return getattr(importlib.import_module(module, PACKAGE), name)
+
+
+class LazyTextCommand(sublime_plugin.TextCommand):
+    """
+    Text command that imports its implementation on first use.
+
+    Subclasses set `implementation` to a (module, class name) tuple. The
+    implementation class is instantiated once per view, like the command
+    itself, and receives all run() arguments.
+
+    Only subclass this via the module attribute, e.g. `lazy.LazyTextCommand`,
+    so Sublime Text does not register the base class as a command.
+    """
+
+    implementation = None
+
+    def __init__(self, view):
+        super().__init__(view)
+        self._implementation = None
+
+    def get_implementation(self):
+        if self._implementation is None:
+            self._implementation = load_class(*self.implementation)(self.view)
+        return self._implementation
+
+    def run(self, edit, **kwargs):
+        return self.get_implementation().run(edit, **kwargs)
+
+
+class LazyWindowCommand(sublime_plugin.WindowCommand):
+    """Window command that imports its implementation on first use, see LazyTextCommand."""
+
+    implementation = None
+
+    def __init__(self, window):
+        super().__init__(window)
+        self._implementation = None
+
+    def get_implementation(self):
+        if self._implementation is None:
+            self._implementation = load_class(*self.implementation)(self.window)
+        return self._implementation
+
+    def run(self, **kwargs):
+        return self.get_implementation().run(**kwargs)
@@ -1,5 +1,8 @@
 ANTHROPIC_VERSION = "2023-06-01";
+BASE_URL = "https://api.anthropic.com/v1/"
 DEFAULT_MODEL = "claude-3-opus-20240229"
 MAX_TOKENS = 4000
 PLUGIN_NAME = "Claudette"
 SETTINGS_FILE = "Claudette.sublime-settings"
+CHAT_SYNTAX = "Packages/Markdown/Markdown.sublime-syntax"
+STREAMING_SYNTAX = "Packages/{0}/Claudette Streaming.sublime-syntax".format(__package__)
@@ -0,0 +1,327 @@
+import asyncio
+import http.client
+import ssl
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+READ_SIZE = 16 * 1024
+MAX_LINE = 1024 * 1024
+MAX_HEADERS = 100
+
+class AsyncConnection:
+    """An open asyncio stream to a host."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.released_at = None
+
+    def is_usable(self, now, max_idle):
+        return (now - self.released_at < max_idle and
+                not self.reader.at_eof() and
+                not self.writer.is_closing())
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncResponse:
+    """
+    An HTTP/1.1 response read from an asyncio stream.
+
+    The body is read in pieces of at most READ_SIZE bytes and lines are cut
+    from those, so a response never holds more than one line and one piece
+    in memory however long it streams. Lines over MAX_LINE bytes are an
+    error.
+    """
+
+    def __init__(self, transport, key, connection, method, status, reason, headers):
+        self.transport = transport
+        self.key = key
+        self.connection = connection
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.buffer = bytearray()
+        self.chunked = (headers.get('transfer-encoding') or '').lower() == 'chunked'
+        self.chunk_left = 0
+        self.length = None
+        self.eof = False
+        self.closed = False
+
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            self.length = 0
+        elif not self.chunked and headers.get('content-length') is not None:
+            self.length = int(headers.get('content-length'))
+
+        # Without a length the body ends when the server closes the connection
+        self.will_close = ((headers.get('connection') or '').lower() == 'close' or
+                           (not self.chunked and self.length is None))
+
+    async def read_piece(self):
+        """Read the next piece of the body, or b'' at its end."""
+        if self.eof:
+            return b''
+
+        reader = self.connection.reader
+        if self.chunked:
+            if not self.chunk_left:
+                size_line = await reader.readline()
+                try:
+                    size = int(size_line.split(b';', 1)[0].strip(), 16)
+                except ValueError:
+                    raise http.client.IncompleteRead(b'')
+                if size == 0:
+                    # Skip the trailers
+                    while (await reader.readline()).strip():
+                        pass
+                    self.eof = True
+                    return b''
+                self.chunk_left = size
+
+            piece = await reader.read(min(self.chunk_left, READ_SIZE))
+            if not piece:
+                raise http.client.IncompleteRead(b'', self.chunk_left)
+            self.chunk_left -= len(piece)
+            if not self.chunk_left:
+                try:
+                    await reader.readexactly(2)  # The CRLF after the chunk
+                except asyncio.IncompleteReadError:
+                    raise http.client.IncompleteRead(b'')
+            return piece
+
+        if self.length is not None:
+            if not self.length:
+                self.eof = True
+                return b''
+            piece = await reader.read(min(self.length, READ_SIZE))
+            if not piece:
+                raise http.client.IncompleteRead(b'', self.length)
+            self.length -= len(piece)
+            return piece
+
+        piece = await reader.read(READ_SIZE)
+        if not piece:
+            self.eof = True
+        return piece
+
+    async def readline(self):
+        """Read the next line of the body, or b'' at its end."""
+        while True:
+            index = self.buffer.find(b'\n')
+            if index >= 0:
+                line = bytes(self.buffer[:index + 1])
+                del self.buffer[:index + 1]
+                return line
+
+            if len(self.buffer) > MAX_LINE:
+                raise http.client.LineTooLong('body line')
+
+            piece = await self.read_piece()
+            if not piece:
+                line = bytes(self.buffer)
+                self.buffer.clear()
+                return line
+            self.buffer += piece
+
+    async def read(self):
+        """Read the rest of the body."""
+        pieces = [bytes(self.buffer)]
+        self.buffer.clear()
+        while True:
+            piece = await self.read_piece()
+            if not piece:
+                return b''.join(pieces)
+            pieces.append(piece)
+
+    def close(self):
+        """Return the connection to the pool if the body was read completely, or close it."""
+        if self.closed:
+            return
+        self.closed = True
+
+        if self.eof and not self.buffer and not self.will_close:
+            self.transport.release(self.key, self.connection)
+        else:
+            self.connection.close()
+
+
+class AsyncTransport:
+    """
+    Sends HTTP requests from a single asyncio event loop.
+
+    The loop runs on one background thread and multiplexes all requests
+    over non-blocking sockets, so any number of concurrent streams costs no
+    extra threads. Work is handed to the loop with submit(), or with run()
+    from a worker thread that waits for the result. Connections are kept
+    for reuse as in the ConnectionPool of the threaded transport.
+    """
+
+    MAX_IDLE = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._ssl_context = None
+        self._idle = {}  # (scheme, host, port) -> [AsyncConnection], only used on the loop
+        self._running = set()
+
+    def get_loop(self):
+        """Return the event loop, starting its thread on first use."""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='Claudette asyncio', daemon=True).start()
+            return self._loop
+
+    def submit(self, coroutine):
+        """
+        Run a coroutine on the event loop without waiting for it.
+
+        Returns:
+            concurrent.futures.Future: The result of the coroutine
+        """
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.get_loop())
+        # The loop only holds weak references to its tasks, and the stream
+        # readers a task waits on are weakly referenced too, so without this
+        # a stream nobody waits for can be garbage collected halfway through
+        with self._lock:
+            self._running.add(future)
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future):
+        with self._lock:
+            self._running.discard(future)
+
+    def run(self, coroutine):
+        """Run a coroutine on the event loop and return its result. Blocks, so call it from a worker thread."""
+        return self.submit(coroutine).result()
+
+    @staticmethod
+    async def sleep(seconds):
+        await asyncio.sleep(seconds)
+
+    @staticmethod
+    async def run_blocking(function, *args):
+        """Run a function that blocks, e.g. on file I/O, on a worker thread so the event loop keeps going."""
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    @staticmethod
+    def get_key(url):
+        parts = urllib.parse.urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        return (parts.scheme, parts.hostname, port)
+
+    @staticmethod
+    def supports(url):
+        """Whether a request can be sent directly. Requests through a proxy need the threaded transport."""
+        scheme, host, _ = AsyncTransport.get_key(url)
+        return not (urllib.request.getproxies().get(scheme) and not urllib.request.proxy_bypass(host))
+
+    def get_ssl_context(self):
+        if self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context()
+        return self._ssl_context
+
+    async def connect(self, key):
+        """Return an idle connection to the host, or open a new one."""
+        now = time.time()
+        idle = self._idle.get(key, [])
+        while idle:
+            connection = idle.pop()
+            if connection.is_usable(now, self.MAX_IDLE):
+                return connection, True
+            connection.close()
+
+        scheme, host, port = key
+        reader, writer = await asyncio.open_connection(
+            host, port,
+            ssl=self.get_ssl_context() if scheme == 'https' else None,
+            limit=READ_SIZE * 4
+        )
+        return AsyncConnection(reader, writer), False
+
+    def release(self, key, connection):
+        connection.released_at = time.time()
+        self._idle.setdefault(key, []).append(connection)
+
+    def warm(self, url):
+        """Open a connection to the host of the URL in the background, unless an idle one is ready."""
+        key = self.get_key(url)
+
+        async def connect():
+            now = time.time()
+            if any(c.is_usable(now, self.MAX_IDLE) for c in self._idle.get(key, [])):
+                return
+            try:
+                connection, _ = await self.connect(key)
+            except OSError as e:
+                print("Claude API: Could not open connection: {0}".format(str(e)))
+                return
+            self.release(key, connection)
+
+        self.submit(connect())
+
+    async def request(self, method, url, headers, body=None):
+        """
+        Send a request and read the response headers.
+
+        Args:
+            method (str): The HTTP method
+            url (str): The request URL
+            headers (dict): The request headers
+            body (bytes, optional): The request body
+
+        Returns:
+            AsyncResponse: The response, to be closed once it has been read
+        """
+        key = self.get_key(url)
+        parts = urllib.parse.urlsplit(url)
+        path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+
+        lines = ['{0} {1} HTTP/1.1'.format(method, path), 'Host: {0}'.format(parts.netloc)]
+        lines += ['{0}: {1}'.format(name, value) for name, value in headers.items()]
+        if body is not None or method in ('POST', 'PUT'):
+            lines.append('Content-Length: {0}'.format(len(body or b'')))
+        head = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+        while True:
+            connection, reused = await self.connect(key)
+            try:
+                connection.writer.write(head + bytes(body or b''))
+                await connection.writer.drain()
+                status_line = await connection.reader.readline()
+                if not status_line:
+                    raise http.client.RemoteDisconnected('Remote end closed connection without response')
+                break
+            except ConnectionError:
+                connection.close()
+                # An idle connection may have been closed by the server, retry with the next one
+                if not reused:
+                    raise
+
+        try:
+            _, status, reason = (status_line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+            status = int(status)
+        except ValueError:
+            connection.close()
+            raise http.client.BadStatusLine(status_line)
+
+        response_headers = http.client.HTTPMessage()
+        for _ in range(MAX_HEADERS):
+            line = await connection.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip()] = value.strip()
+        else:
+            connection.close()
+            raise http.client.HTTPException('Got more than {0} headers'.format(MAX_HEADERS))
+
+        return AsyncResponse(self, key, connection, method, status, reason, response_headers)
+
+
+async_transport = AsyncTransport()
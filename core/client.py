@@ -0,0 +1,491 @@
+import http.client
+import io
+import json
+import time
+import urllib.error
+import urllib.parse
+from ..constants import ANTHROPIC_VERSION, BASE_URL, MAX_TOKENS
+from .request_state import RequestCancelled, RequestState
+from .stream import DONE, find_overlap, get_usage, parse_event
+from .tokens import estimate_body_tokens
+
+WARM_UP_QUESTION = 'Reply with OK.'
+RATE_LIMIT_RETRIES = 2
+OVERLAP_WINDOW = 200
+
+def ignore(*args):
+    pass
+
+
+class StreamCallbacks:
+    """
+    Receives the events of a stream. All callbacks are optional.
+
+    The callbacks run on the thread the stream runs on: a worker thread of
+    the threaded transport, or the event loop of the asyncio one, so they
+    must not block. Only done runs through run_blocking() of the transport
+    and may do I/O.
+
+    Args:
+        text (callable): Called with each text chunk of the answer
+        thinking (callable): Called with each chunk of extended thinking
+        status (callable): Called with a message about the progress of the stream
+        error (callable): Called with the message of an error that ended the stream
+        failure (callable): Called with an unexpected exception that ended the stream
+        done (callable): Called with the request stats once the stream has ended
+    """
+
+    def __init__(self, text=None, thinking=None, status=None, error=None, failure=None, done=None):
+        self.text = text or ignore
+        self.thinking = thinking or ignore
+        self.status = status or ignore
+        self.error = error or ignore
+        self.failure = failure or ignore
+        self.done = done or ignore
+
+
+class MessagesClient:
+    """
+    A client of the Claude Messages API, without any editor code.
+
+    Requests are coroutines that take the transport to send them on, so the
+    same client runs on a worker thread of the ConnectionPool or on the
+    event loop of the AsyncTransport. A stream waits for the rate limiter,
+    retries rate limit errors, and resumes an answer that broke off with
+    the text received so far. Its events are passed to StreamCallbacks.
+
+    A client runs one stream at a time, its stats are those of the last one.
+    """
+
+    def __init__(self, api_key, model, base_url=BASE_URL, max_tokens=MAX_TOKENS, temperature=1.0,
+                 system=(), thinking_budget=0, prompt_cache=False, resume_attempts=0, rate_limiter=None):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.system = system
+        self.thinking_budget = thinking_budget
+        self.prompt_cache = prompt_cache
+        self.resume_attempts = resume_attempts
+        self.rate_limiter = rate_limiter
+        self.stats = {}
+        self.state = RequestState()
+
+    def get_url(self, path):
+        return path if path.startswith('http') else urllib.parse.urljoin(self.base_url, path)
+
+    def get_headers(self):
+        return {
+            'x-api-key': self.api_key,
+            'anthropic-version': ANTHROPIC_VERSION,
+            'content-type': 'application/json',
+        }
+
+    def build_request_data(self, messages, stream=True):
+        """Build the Messages API request body for the given messages."""
+        # Filter out empty messages
+        filtered_messages = [
+            msg for msg in messages
+            if msg.get('content', '').strip()
+        ]
+
+        data = {
+            'messages': filtered_messages,
+            'max_tokens': self.max_tokens,
+            'model': self.model,
+            'stream': stream,
+            'system': list(self.system),
+            'temperature': self.temperature
+        }
+
+        if self.thinking_budget:
+            # Thinking counts towards max_tokens and only works with the default temperature
+            data['thinking'] = {'type': 'enabled', 'budget_tokens': self.thinking_budget}
+            data['max_tokens'] = self.thinking_budget + self.max_tokens
+            del data['temperature']
+
+        return data
+
+    def build_request_body(self, conversation, stream=True, max_tokens=None):
+        """
+        Build the encoded request body for a conversation.
+
+        Only the request parameters are encoded here, the messages are
+        spliced in from the cached fragments of the conversation. With prompt
+        caching enabled, the last two messages are cache breakpoints, so the
+        history up to the new question is read from the cache.
+        """
+        data = self.build_request_data([], stream)
+        del data['messages']
+        if max_tokens:
+            data['max_tokens'] = max_tokens
+
+        cache_breakpoints = (-2, -1) if self.prompt_cache else ()
+
+        body = bytearray(json.dumps(data).encode('utf-8')[:-1])
+        body += b', "messages": '
+        conversation.write_request_messages(body, cache_breakpoints)
+        body += b'}'
+        return body
+
+    def reset_stats(self):
+        self.stats = {
+            'model': self.model,
+            'start_time': time.time(),
+            'first_thinking_time': None,
+            'first_token_time': None,
+            'end_time': None,
+            'input_tokens': 0,
+            'output_tokens': 0,
+            'resumes': 0,
+        }
+        self.received = []
+        self.message_stopped = False
+        self.pending_overlap = None
+        self.base_usage = (0, 0)
+
+    def update_stats(self, data):
+        """Record token usage from message_start and message_delta events."""
+        input_tokens, output_tokens = get_usage(data)
+        if input_tokens is not None:
+            self.stats['input_tokens'] = self.base_usage[0] + input_tokens
+        if output_tokens is not None:
+            self.stats['output_tokens'] = self.base_usage[1] + output_tokens
+
+    def record_phase_times(self):
+        """Record the time spent thinking and answering, once the stream has ended."""
+        thinking_start = self.stats['first_thinking_time']
+        answer_start = self.stats['first_token_time']
+        end = self.stats['end_time']
+
+        self.stats['thinking_time'] = (answer_start or end) - thinking_start if thinking_start else 0.0
+        self.stats['answer_time'] = end - answer_start if answer_start else 0.0
+
+    async def acquire(self, transport, input_tokens, output_tokens):
+        """Wait until the request fits in the rate limits. Returns False if the request was cancelled meanwhile."""
+        if self.rate_limiter is None:
+            return True
+        return await self.rate_limiter.acquire(input_tokens, output_tokens, transport.sleep, self.state.is_cancelled)
+
+    async def request(self, transport, method, url, body=None):
+        """Send a request and return the response, to be closed once it has been read."""
+        response = await transport.request(method, url, self.get_headers(), body)
+        if self.rate_limiter is not None:
+            self.rate_limiter.update(response.headers)
+        return response
+
+    async def open_stream(self, transport, url, body, output_tokens=1):
+        """
+        Send a POST request for a stream.
+
+        The request waits for the rate limiter first, and is sent again after
+        the retry-after time when the API answers with a rate limit error.
+
+        Args:
+            transport: The ConnectionPool or AsyncTransport to send the request on
+            url (str): The endpoint URL
+            body (bytes): The encoded request body
+            output_tokens (int, optional): The max_tokens of the request
+
+        Returns:
+            The response of the transport, to be closed once it has been read
+
+        Raises:
+            RequestCancelled: If the request was cancelled while waiting for the rate limiter
+        """
+        input_tokens = estimate_body_tokens(body)
+
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            if not await self.acquire(transport, input_tokens, output_tokens):
+                raise RequestCancelled()
+
+            response = await self.request(transport, 'POST', url, body)
+            if response.status != 429 or attempt == RATE_LIMIT_RETRIES:
+                return response
+
+            print("Claude API: Rate limited, retrying")
+            await response.read()
+            response.close()
+            if self.rate_limiter is None:
+                # Without a rate limiter nothing waits for the retry-after time
+                await transport.sleep(float(response.headers.get('retry-after') or 1))
+
+    async def write_prompt_cache(self, transport, conversation):
+        """
+        Write a conversation to the prompt cache with a request for a single token.
+
+        Args:
+            transport: The ConnectionPool or AsyncTransport to send the request on
+            conversation (Conversation): A copy of the conversation, the warm-up question is added to it
+        """
+        # The cache breakpoint is on the last message of the conversation, as in the request that follows
+        conversation.append('user', WARM_UP_QUESTION)
+
+        try:
+            response = await self.open_stream(transport, self.get_url('messages'), self.build_request_body(conversation, stream=False, max_tokens=1))
+            try:
+                data = json.loads((await response.read()).decode('utf-8'))
+                if response.status >= 400:
+                    print("Claude API: Prompt cache warm-up failed: {0}".format(data.get('error', {}).get('message')))
+            finally:
+                response.close()
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            print("Claude API: Prompt cache warm-up failed: {0}".format(str(e)))
+
+    def handle_stream_line(self, line, callbacks):
+        """
+        Handle a line of the server-sent events of a stream.
+
+        Returns:
+            bool: False once the stream has ended
+        """
+        data = parse_event(line)
+        if data is None:
+            return True # Skip invalid chunks without error messages
+        if data is DONE:
+            self.message_stopped = True
+            return False
+
+        self.update_stats(data)
+        if data.get('type') == 'message_stop':
+            self.message_stopped = True
+
+        delta = data.get('delta', {})
+        if 'thinking' in delta:
+            if self.stats['first_thinking_time'] is None:
+                self.stats['first_thinking_time'] = time.time()
+            callbacks.thinking(delta['thinking'])
+        elif 'text' in delta:
+            if self.stats['first_token_time'] is None:
+                self.stats['first_token_time'] = time.time()
+            self.emit_text(callbacks, delta['text'])
+        return True
+
+    def emit_text(self, callbacks, text):
+        """Pass a text chunk on, without what a resumed answer repeats of the text received before."""
+        if self.pending_overlap is not None:
+            # Hold back the start of a resumed answer until its overlap is known
+            self.pending_overlap += text
+            if len(self.pending_overlap) < OVERLAP_WINDOW:
+                return
+            text = self.strip_overlap()
+
+        if text:
+            # Only kept to resume the answer from
+            if self.resume_attempts:
+                self.received.append(text)
+            callbacks.text(text)
+
+    def strip_overlap(self):
+        text, self.pending_overlap = self.pending_overlap, None
+        return text[find_overlap(''.join(self.received), text):]
+
+    def check_stream_end(self):
+        """Raise ConnectionError if the stream ended before the message was complete, e.g. when the connection dropped."""
+        if not self.message_stopped and not self.state.is_cancelled():
+            raise ConnectionError("The connection closed before the answer was complete")
+
+    def flush_overlap(self, callbacks):
+        """Pass on the held back start of a resumed answer that ended within OVERLAP_WINDOW."""
+        if self.pending_overlap is not None:
+            self.emit_text(callbacks, self.strip_overlap())
+
+    def get_resume_request(self, conversation, attempt, error, callbacks):
+        """
+        Build the request that continues a stream that broke off, or None if it cannot be resumed.
+
+        The text received so far is sent as the start of the answer, so the
+        model continues where the stream stopped instead of starting over, and
+        the text callback gets the rest of the same answer.
+
+        Args:
+            conversation (Conversation): The conversation of the stream
+            attempt (int): The number of resumes so far
+            error (Exception): The error that ended the stream
+            callbacks (StreamCallbacks): The callbacks of the stream
+
+        Returns:
+            Conversation: The conversation with the received text as the last message
+        """
+        received = ''.join(self.received).rstrip()  # The API rejects a prefill ending in whitespace
+        if (attempt >= self.resume_attempts or not received or
+                self.state.status != RequestState.STREAMING or self.state.is_cancelled()):
+            return None
+
+        print("Claude API: Stream interrupted, resuming: {0}".format(str(error)))
+        callbacks.status("Connection lost, resuming the answer")
+
+        self.stats['resumes'] += 1
+        self.base_usage = (self.stats['input_tokens'], self.stats['output_tokens'])
+        self.pending_overlap = ''
+        # Extended thinking does not allow a prefilled answer
+        self.thinking_budget = 0
+
+        request = conversation.copy()
+        request.append('assistant', received)
+        return request
+
+    def handle_stream_error(self, callbacks, error_msg):
+        self.state.set_status(RequestState.ERROR)
+        callbacks.error(error_msg)
+
+    def end_stream(self):
+        """Record the final stats of a stream."""
+        if self.state.status == RequestState.STREAMING:
+            self.state.set_status(RequestState.DONE)
+
+        self.stats['end_time'] = time.time()
+        self.record_phase_times()
+        self.received = []
+
+    async def stream(self, transport, conversation, callbacks):
+        """
+        Stream the answer to a conversation.
+
+        Args:
+            transport: The ConnectionPool or AsyncTransport to send the request on
+            conversation (Conversation): The conversation to send
+            callbacks (StreamCallbacks): Receive the answer and the events of the stream
+
+        Returns:
+            dict: The request stats, also passed to the done callback
+        """
+        self.reset_stats()
+        url = self.get_url('messages')
+
+        try:
+            request = conversation
+            attempt = 0
+            while request is not None:
+                try:
+                    response = await self.open_stream(
+                        transport,
+                        url,
+                        self.build_request_body(request),
+                        self.max_tokens + self.thinking_budget
+                    )
+                    try:
+                        if response.status >= 400:
+                            error_content = (await response.read()).decode('utf-8')
+                            print("Claude API Error Content:", error_content)
+                            self.handle_stream_error(callbacks, "[Error] HTTP Error {0}: {1}".format(response.status, response.reason))
+                        else:
+                            self.state.set_status(RequestState.STREAMING)
+                            while not self.state.is_cancelled():
+                                line = await response.readline()
+                                if not line or not self.handle_stream_line(line, callbacks):
+                                    break
+                            self.check_stream_end()
+                            self.flush_overlap(callbacks)
+                    finally:
+                        response.close()
+                    request = None
+
+                except (OSError, http.client.HTTPException) as e:
+                    request = self.get_resume_request(conversation, attempt, e, callbacks)
+                    attempt += 1
+                    if request is None:
+                        self.handle_stream_error(callbacks, "[Error] {0}".format(str(e)))
+
+        except RequestCancelled:
+            pass
+        except Exception as e:
+            self.state.set_status(RequestState.ERROR)
+            callbacks.failure(e)
+
+        self.end_stream()
+        stats = dict(self.stats)
+        await transport.run_blocking(callbacks.done, stats)
+        return stats
+
+    async def send(self, transport, url, body=None, method='GET'):
+        """
+        Send a request that is not streamed.
+
+        Raises urllib.error.HTTPError for error responses, as urllib does.
+
+        Returns:
+            The response of the transport, to be closed once it has been read
+        """
+        response = await self.request(transport, method, url, body)
+        if response.status >= 400:
+            try:
+                content = await response.read()
+            finally:
+                response.close()
+            raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, io.BytesIO(content))
+        return response
+
+    async def request_json(self, transport, path, data=None, method='GET'):
+        """Send a request that is not streamed and return the decoded JSON response."""
+        body = json.dumps(data).encode('utf-8') if data is not None else None
+        response = await self.send(transport, self.get_url(path), body, method)
+        try:
+            return json.loads((await response.read()).decode('utf-8'))
+        finally:
+            response.close()
+
+    async def complete(self, transport, messages, system=None, max_tokens=MAX_TOKENS):
+        """
+        Send a request that is not streamed and return the text of the answer.
+
+        Args:
+            transport: The ConnectionPool or AsyncTransport to send the request on
+            messages (list): The conversation messages
+            system (str, optional): A system prompt replacing the configured ones
+            max_tokens (int, optional): The maximum number of tokens to generate
+        """
+        data = {
+            'messages': messages,
+            'max_tokens': max_tokens,
+            'model': self.model,
+        }
+        if system:
+            data['system'] = system
+
+        body = json.dumps(data).encode('utf-8')
+        self.reset_stats()
+        await self.acquire(transport, estimate_body_tokens(body), max_tokens)
+        response = await self.send(transport, self.get_url('messages'), body, 'POST')
+        try:
+            message = json.loads((await response.read()).decode('utf-8'))
+        finally:
+            response.close()
+
+        self.update_stats({'type': 'message_start', 'message': message})
+        self.stats['end_time'] = time.time()
+
+        return ''.join(
+            block.get('text', '') for block in message.get('content', [])
+            if block.get('type') == 'text'
+        )
+
+    async def fetch_batch_results(self, transport, results_url):
+        """
+        Fetch the results of an ended message batch.
+
+        Returns:
+            dict: Result objects keyed by their custom_id
+        """
+        response = await self.send(transport, results_url)
+        results = {}
+        try:
+            while True:
+                line = await response.readline()
+                if not line:
+                    return results
+                add_batch_result(results, line)
+        finally:
+            response.close()
+
+
+def add_batch_result(results, line):
+    """Add a line of the batch results file to the results, skipping invalid lines."""
+    if not line or line.isspace():
+        return
+    try:
+        item = json.loads(line.decode('utf-8'))
+        results[item['custom_id']] = item.get('result', {})
+    except (ValueError, KeyError):
+        pass
@@ -0,0 +1,50 @@
+import re
+from dataclasses import dataclass
+from typing import List
+from ..profiling.profiler import profiled
+
+CODE_BLOCK_PATTERN = re.compile(r"```([\w+]*)\n(.*?)\n```", re.DOTALL)
+
+@dataclass
+class CodeBlock:
+    """Represents a code block found in the chat content."""
+    content: str
+    raw_content: str  # Unstripped, keeps the indentation of the first line
+    start_pos: int
+    end_pos: int
+    language: str
+
+@profiled('find_code_blocks')
+def find_code_blocks(content: str) -> List[CodeBlock]:
+    """Find all code blocks in the content."""
+    blocks = []
+
+    for match in CODE_BLOCK_PATTERN.finditer(content):
+        blocks.append(CodeBlock(
+            content=match.group(2).strip(),
+            raw_content=match.group(2).strip('\n'),
+            start_pos=match.start(),
+            end_pos=match.end(),
+            language=match.group(1).strip()
+        ))
+    return blocks
+
+def find_unclosed_code_blocks(content: str) -> List[str]:
+    """
+    Find the code blocks that are opened but never closed.
+
+    Returns:
+        list: The language of each unclosed code block, innermost last
+    """
+    stack = []
+
+    for line in content.split('\n'):
+        stripped = line.strip()
+
+        if stripped.startswith('```'):
+            if len(stripped) > 3:  # Opening block with language
+                stack.append(stripped[3:].strip())
+            elif stack:  # Proper closing
+                stack.pop()
+
+    return stack
@@ -0,0 +1,179 @@
+import http.client
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+class PooledResponse:
+    """
+    A response of the threaded transport, with the interface of AsyncResponse.
+
+    Its coroutines block instead of suspending, see ConnectionPool.run().
+    """
+
+    def __init__(self, pool, url, connection, response):
+        self.pool = pool
+        self.url = url
+        self.connection = connection
+        self.response = response
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        self.closed = False
+
+    async def readline(self):
+        """Read the next line of the body, or b'' at its end."""
+        return self.response.readline()
+
+    async def read(self):
+        """Read the rest of the body."""
+        return self.response.read()
+
+    def close(self):
+        """Return the connection to the pool if the body was read completely, or close it."""
+        if self.closed:
+            return
+        self.closed = True
+
+        if self.response.isclosed() and not self.response.will_close:
+            self.pool.release(self.url, self.connection)
+        else:
+            self.connection.close()
+
+
+class ConnectionPool:
+    """
+    Keeps opened HTTP connections to the API for reuse.
+
+    A connection can be opened ahead of time with warm(), which resolves the
+    host name and completes the TCP and TLS handshakes on a worker thread.
+    Connections are handed out by acquire() and given back with release()
+    once their response has been read completely, so the next request skips
+    the handshakes. Connections idle for longer than MAX_IDLE seconds are
+    discarded, as the server may have closed them.
+
+    The pool is also the threaded transport, with the interface of the
+    AsyncTransport, so requests are written once as coroutines that run on
+    either. Its coroutines block instead of suspending: run() runs them to
+    completion on the calling thread, and submit() on a new worker thread.
+    """
+
+    MAX_IDLE = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = {}  # (scheme, host, port) -> [(connection, released at)]
+
+    @staticmethod
+    def get_key(url):
+        parts = urllib.parse.urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        return (parts.scheme, parts.hostname, port)
+
+    @staticmethod
+    def create(key):
+        scheme, host, port = key
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+
+        # urllib honours the proxy environment variables, so keep doing that
+        proxy = urllib.request.getproxies().get(scheme)
+        if proxy and not urllib.request.proxy_bypass(host):
+            proxy_parts = urllib.parse.urlsplit(proxy)
+            connection = connection_class(proxy_parts.hostname, proxy_parts.port or 8080)
+            connection.set_tunnel(host, port)
+            return connection
+
+        return connection_class(host, port)
+
+    def acquire(self, url):
+        """Return an idle connection to the host of the URL, or a new unopened one."""
+        key = self.get_key(url)
+        now = time.time()
+
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                connection, released_at = idle.pop()
+                if now - released_at < self.MAX_IDLE:
+                    return connection
+                connection.close()
+
+        return self.create(key)
+
+    def release(self, url, connection):
+        """Give a connection back once its response has been read completely."""
+        with self._lock:
+            self._idle.setdefault(self.get_key(url), []).append((connection, time.time()))
+
+    def warm(self, url):
+        """Open a connection to the host of the URL in the background, unless an idle one is ready."""
+        key = self.get_key(url)
+        now = time.time()
+
+        with self._lock:
+            if any(now - released_at < self.MAX_IDLE for _, released_at in self._idle.get(key, [])):
+                return
+
+        def connect():
+            connection = self.create(key)
+            try:
+                connection.connect()
+            except OSError as e:
+                print("Claude API: Could not open connection: {0}".format(str(e)))
+                return
+            self.release(url, connection)
+
+        threading.Thread(target=connect).start()
+
+    def submit(self, coroutine):
+        """Run a coroutine on a new worker thread without waiting for it."""
+        threading.Thread(target=self.run, args=(coroutine,)).start()
+
+    @staticmethod
+    def run(coroutine):
+        """Run a coroutine to completion and return its result. Blocks, so call it from a worker thread."""
+        try:
+            coroutine.send(None)
+        except StopIteration as e:
+            return e.value
+        coroutine.close()
+        raise RuntimeError("A coroutine of the threaded transport was suspended")
+
+    @staticmethod
+    def supports(url):
+        """Whether a request can be sent. The threaded transport also handles proxies."""
+        return True
+
+    async def request(self, method, url, headers, body=None):
+        """
+        Send a request, on an idle connection if there is one, and read the response headers.
+
+        Returns:
+            PooledResponse: The response, to be closed once it has been read
+        """
+        parts = urllib.parse.urlsplit(url)
+        path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+
+        while True:
+            connection = self.acquire(url)
+            reused = connection.sock is not None
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                return PooledResponse(self, url, connection, connection.getresponse())
+            except ConnectionError:
+                connection.close()
+                # An idle connection may have been closed by the server, retry with the next one
+                if not reused:
+                    raise
+
+    @staticmethod
+    async def sleep(seconds):
+        time.sleep(seconds)
+
+    @staticmethod
+    async def run_blocking(function, *args):
+        """Run a function that blocks, which on this transport is just calling it."""
+        return function(*args)
+
+
+connection_pool = ConnectionPool()
@@ -0,0 +1,111 @@
+import json
+from ..constants import PLUGIN_NAME
+from ..profiling.profiler import profiled
+
+class Conversation:
+    """
+    Conversation history that caches the JSON encoding of its messages.
+
+    Every message is encoded once, when it is added, and appended to two
+    buffers: one with all messages for storage, and one with the non-empty
+    messages for requests. A new turn therefore only encodes the new message,
+    and a request body is assembled by copying the cached buffer.
+    """
+
+    def __init__(self, messages=None):
+        self.messages = []
+        self._stored = bytearray()
+        self._request = bytearray()
+        self._request_messages = []
+        self._request_starts = []  # offset of each request message in _request
+        for message in messages or []:
+            self.append(message['role'], message['content'])
+
+    @classmethod
+    @profiled('Conversation.from_json')
+    def from_json(cls, conversation_json):
+        """Create a conversation from its stored JSON encoding."""
+        try:
+            messages = json.loads(conversation_json)
+        except (TypeError, ValueError):
+            print(f"{PLUGIN_NAME} Error: Could not decode conversation history")
+            messages = []
+
+        return cls([
+            msg for msg in messages
+            if isinstance(msg, dict) and 'role' in msg and isinstance(msg.get('content'), str)
+        ])
+
+    def __len__(self):
+        return len(self.messages)
+
+    def append(self, role, content):
+        message = {"role": role, "content": content}
+        self.messages.append(message)
+
+        # Plain ASCII thanks to ensure_ascii, so the buffers can be joined as bytes
+        fragment = json.dumps(message).encode('ascii')
+
+        if self._stored:
+            self._stored += b','
+        self._stored += fragment
+
+        if content.strip():
+            if self._request:
+                self._request += b','
+            self._request_messages.append(message)
+            self._request_starts.append(len(self._request))
+            self._request += fragment
+
+    def copy(self):
+        """Return a copy that can be extended without changing this conversation."""
+        other = Conversation()
+        other.messages = list(self.messages)
+        other._stored = bytearray(self._stored)
+        other._request = bytearray(self._request)
+        other._request_messages = list(self._request_messages)
+        other._request_starts = list(self._request_starts)
+        return other
+
+    def has_content(self):
+        return bool(self._request)
+
+    @profiled('Conversation.to_json')
+    def to_json(self):
+        """Return the JSON encoding of all messages, for storage."""
+        return '[' + self._stored.decode('ascii') + ']'
+
+    @profiled('Conversation.write_request_messages')
+    def write_request_messages(self, out, cache_breakpoints=()):
+        """
+        Append the JSON encoded messages array for a request, without empty messages, to a bytearray.
+
+        Args:
+            out (bytearray): The request body
+            cache_breakpoints (tuple, optional): Indexes of request messages, negative ones count
+                from the end, that are marked as prompt cache breakpoints
+        """
+        count = len(self._request_messages)
+        indexes = sorted({index % count for index in cache_breakpoints if -count <= index < count})
+
+        request = memoryview(self._request)
+        position = 0
+
+        out += b'['
+        for index in indexes:
+            message = self._request_messages[index]
+            end = self._request_starts[index + 1] - 1 if index + 1 < count else len(self._request)
+
+            out += request[position:self._request_starts[index]]
+            out += json.dumps({
+                "role": message['role'],
+                "content": [{
+                    "type": "text",
+                    "text": message['content'],
+                    "cache_control": {"type": "ephemeral"}
+                }]
+            }).encode('ascii')
+            position = end
+
+        out += request[position:]
+        out += b']'
@@ -0,0 +1,23 @@
+def validate_and_sanitize_message(message):
+    """Validate a single message object and remove disallowed items"""
+    if not isinstance(message, dict):
+        return False
+
+    if 'role' not in message or 'content' not in message:
+        return False
+
+    if message['role'] not in {'system', 'user', 'assistant'}:
+        return False
+
+    if not isinstance(message['content'], str):
+        return False
+
+    cleaned_message = {
+        'role': message['role'],
+        'content': message['content']
+    }
+
+    message.clear()
+    message.update(cleaned_message)
+
+    return True
@@ -0,0 +1,193 @@
+import math
+import threading
+import time
+from datetime import datetime
+
+BUCKETS = ('requests', 'input-tokens', 'output-tokens')
+MAX_WAIT_STEP = 0.5
+
+def parse_reset(value):
+    """Parse an RFC 3339 reset time into a timestamp, or None."""
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+
+class Bucket:
+    """
+    Client-side estimate of one rate limit.
+
+    The API replenishes its token buckets continuously, so the available
+    capacity is estimated from the last reported remaining capacity plus
+    the refill since then, at the limit per minute.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+        self.updated_at = None
+
+    def update(self, limit, remaining, reset, now):
+        self.limit = limit
+        self.remaining = remaining
+        self.reset = reset
+        self.updated_at = now
+
+    def available(self, now):
+        if self.limit is None:
+            return math.inf
+        refill = (now - self.updated_at) * self.limit / 60.0
+        return min(self.limit, self.remaining + refill)
+
+    def get_wait(self, amount, now):
+        """Return the seconds until the amount is available. Amounts above the limit wait for a full bucket."""
+        if self.limit is None or self.limit <= 0:
+            return 0.0
+        missing = min(amount, self.limit) - self.available(now)
+        return max(0.0, missing * 60.0 / self.limit)
+
+    def take(self, amount, now):
+        if self.limit is not None:
+            self.remaining = self.available(now) - amount
+            self.updated_at = now
+
+
+class RateLimiter:
+    """
+    Paces requests to stay within the rate limits reported by the API.
+
+    Every response updates the buckets from its anthropic-ratelimit-*
+    headers. Before a request is sent, acquire() waits until the estimated
+    capacity covers it and then reserves that capacity, so concurrent
+    requests are spread out instead of running into 429 errors. A
+    retry-after header blocks all requests until then.
+
+    Args:
+        on_waiting (callable, optional): Called with the number of waiting requests when it changes
+    """
+
+    def __init__(self, on_waiting=None):
+        self._lock = threading.Lock()
+        self.buckets = {name: Bucket(name) for name in BUCKETS}
+        self.blocked_until = 0.0
+        self.waiting = 0
+        self.on_waiting = on_waiting
+
+    def update(self, headers):
+        """Update the buckets from the headers of a response."""
+        if headers is None:
+            return
+
+        now = time.time()
+        with self._lock:
+            for name, bucket in self.buckets.items():
+                prefix = 'anthropic-ratelimit-{0}-'.format(name)
+                try:
+                    limit = int(headers.get(prefix + 'limit'))
+                    remaining = int(headers.get(prefix + 'remaining'))
+                except (TypeError, ValueError):
+                    continue
+                bucket.update(limit, remaining, parse_reset(headers.get(prefix + 'reset')), now)
+
+            try:
+                retry_after = float(headers.get('retry-after'))
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+            except (TypeError, ValueError):
+                pass
+
+    def get_wait(self, input_tokens, output_tokens, now):
+        """Return the seconds until a request of this size fits. Call with the lock held."""
+        return max(
+            self.blocked_until - now,
+            self.buckets['requests'].get_wait(1, now),
+            self.buckets['input-tokens'].get_wait(input_tokens, now),
+            self.buckets['output-tokens'].get_wait(output_tokens, now)
+        )
+
+    def reserve(self, input_tokens, output_tokens):
+        """
+        Reserve the capacity of a request if it fits in the rate limits.
+
+        Returns:
+            float: 0 if the capacity was reserved, otherwise the seconds to wait
+        """
+        with self._lock:
+            now = time.time()
+            wait = self.get_wait(input_tokens, output_tokens, now)
+            if wait > 0:
+                return wait
+
+            self.buckets['requests'].take(1, now)
+            self.buckets['input-tokens'].take(input_tokens, now)
+            self.buckets['output-tokens'].take(output_tokens, now)
+            return 0
+
+    def set_waiting(self, change):
+        """Count a request in or out of the queue of waiting requests."""
+        with self._lock:
+            self.waiting += change
+            if self.on_waiting:
+                self.on_waiting(self.waiting)
+
+    async def acquire(self, input_tokens, output_tokens, sleep, is_cancelled=None):
+        """
+        Wait until a request fits in the rate limits, and reserve its capacity.
+
+        Args:
+            input_tokens (int): Estimated input tokens of the request
+            output_tokens (int): The max_tokens of the request
+            sleep (coroutine function): The sleep of the transport the request is sent on,
+                which blocks on the threaded transport and suspends on the asyncio one
+            is_cancelled (callable, optional): Stop waiting when it returns True
+
+        Returns:
+            bool: False if the request was cancelled while waiting
+        """
+        queued = False
+        try:
+            while True:
+                wait = self.reserve(input_tokens, output_tokens)
+                if wait <= 0:
+                    return True
+
+                if not queued:
+                    queued = True
+                    self.set_waiting(1)
+
+                if is_cancelled and is_cancelled():
+                    return False
+                await sleep(min(wait, MAX_WAIT_STEP))
+        finally:
+            if queued:
+                self.set_waiting(-1)
+
+    def get_headroom(self):
+        """
+        Describe the estimated capacity of each limit.
+
+        Returns:
+            list: One line per limit
+        """
+        now = time.time()
+        lines = []
+        with self._lock:
+            for name, bucket in self.buckets.items():
+                label = name.replace('-', ' ').capitalize()
+                if bucket.limit is None:
+                    lines.append("{0:<15} unknown until the next response".format(label))
+                    continue
+
+                line = "{0:<15} {1:>10.0f} of {2:<10} available".format(label, bucket.available(now), bucket.limit)
+                if bucket.reset:
+                    line += " · full at {0}".format(time.strftime('%H:%M:%S', time.localtime(bucket.reset)))
+                lines.append(line)
+
+            if self.blocked_until > now:
+                lines.append("Blocked for {0:.0f}s after a rate limit error".format(self.blocked_until - now))
+            if self.waiting:
+                lines.append("{0} requests waiting".format(self.waiting))
+
+        return lines
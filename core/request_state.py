@@ -0,0 +1,45 @@
+import threading
+
+class RequestCancelled(Exception):
+    """Raised when a request is cancelled before it was sent."""
+
+
+class RequestState:
+    """Thread-safe lifecycle state of a single API request."""
+
+    PENDING = 'pending'
+    STREAMING = 'streaming'
+    DONE = 'done'
+    ERROR = 'error'
+    CANCELLED = 'cancelled'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._status = self.PENDING
+
+    @property
+    def status(self):
+        with self._lock:
+            return self._status
+
+    def set_status(self, status):
+        """
+        Move to a new status. Once cancelled, a request stays cancelled.
+
+        Returns:
+            bool: Whether the status was changed
+        """
+        with self._lock:
+            if self._status == self.CANCELLED:
+                return False
+            self._status = status
+            return True
+
+    def cancel(self):
+        self.set_status(self.CANCELLED)
+
+    def is_cancelled(self):
+        return self.status == self.CANCELLED
+
+    def is_active(self):
+        return self.status in (self.PENDING, self.STREAMING)
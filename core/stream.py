@@ -0,0 +1,90 @@
+import json
+
+DONE = 'done'
+MIN_OVERLAP = 8
+
+def parse_event(line):
+    """
+    Parse a line of a server-sent event stream of the Messages API.
+
+    Args:
+        line (bytes): A line of the response body
+
+    Returns:
+        The decoded event data as a dict, DONE for the end of the stream, or
+        None for lines without (valid) data
+    """
+    if not line.startswith(b'data: '):
+        return None
+
+    chunk = line[6:].strip() # Remove 'data: ' prefix
+    if chunk == b'[DONE]':
+        return DONE
+
+    try:
+        data = json.loads(chunk.decode('utf-8'))
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+def get_usage(data):
+    """
+    Get the token usage reported by a message_start or message_delta event.
+
+    Returns:
+        tuple: The input and output tokens, each None if the event does not report it
+    """
+    if data.get('type') == 'message_start':
+        usage = data.get('message', {}).get('usage', {})
+        return usage.get('input_tokens', 0), usage.get('output_tokens', 0)
+    if data.get('type') == 'message_delta':
+        return None, data.get('usage', {}).get('output_tokens')
+    return None, None
+
+def find_overlap(received, continuation):
+    """
+    Find how much of the start of a resumed answer repeats the end of the text received before.
+
+    Whitespace is always matched, as it is cut from the prefill and the model
+    usually writes it again. Other overlaps need MIN_OVERLAP characters, so
+    the resumed answer is not cut where it just happens to match.
+
+    Returns:
+        int: The number of characters to drop from the continuation
+    """
+    for length in range(min(len(received), len(continuation)), 0, -1):
+        start = continuation[:length]
+        if (length >= MIN_OVERLAP or not start.strip()) and received.endswith(start):
+            return length
+    return 0
+
+
+class ResponseBuffer:
+    """
+    Collects the chunks of a streamed response.
+
+    The chunks are joined once when the stream has ended, and only the first
+    call to finish() returns the response, so it is recorded exactly once.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+
+    def append(self, chunk):
+        self.chunks.append(chunk)
+
+    def finish(self):
+        """
+        Join the collected chunks.
+
+        Returns:
+            str: The response, or None if it was already finished
+        """
+        if self.finished:
+            return None
+        self.finished = True
+
+        response = ''.join(self.chunks)
+        self.chunks = []
+        return response
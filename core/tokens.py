@@ -0,0 +1,19 @@
+def estimate_tokens(messages):
+    """Roughly estimate the number of tokens in a list of messages."""
+    return sum(len(msg.get('content', '')) for msg in messages) // 4
+
+def estimate_body_tokens(body):
+    """Roughly estimate the input tokens of an encoded request body, at four bytes of JSON per token."""
+    return len(body) // 4
+
+def find_compaction_index(messages, keep_recent):
+    """
+    Find the index of the first message to keep.
+
+    The kept messages always start with a user message, so the conversation
+    keeps alternating after the summary pair is prepended.
+    """
+    index = max(len(messages) - keep_recent, 0)
+    while index < len(messages) and messages[index].get('role') != 'user':
+        index += 1
+    return index
@@ -0,0 +1,152 @@
+import json
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+def get_day(timestamp):
+    """Return the local date of a timestamp, e.g. '2024-05-31'."""
+    return date.fromtimestamp(timestamp).isoformat()
+
+
+class DayUsage:
+    """The usage of a single day, per model and per project."""
+
+    def __init__(self):
+        self.models = {}  # model -> [requests, input tokens, output tokens, seconds]
+        self.projects = {}  # project -> tokens
+
+    def add(self, model, input_tokens, output_tokens, duration, project=None):
+        totals = self.models.setdefault(model, [0, 0, 0, 0.0])
+        totals[0] += 1
+        totals[1] += input_tokens
+        totals[2] += output_tokens
+        totals[3] += duration
+        if project:
+            self.projects[project] = self.projects.get(project, 0) + input_tokens + output_tokens
+
+    def get_totals(self):
+        """
+        Returns:
+            list: The requests, input tokens, output tokens and seconds over all models
+        """
+        totals = [0, 0, 0, 0.0]
+        for model_totals in self.models.values():
+            for index, value in enumerate(model_totals):
+                totals[index] += value
+        return totals
+
+    def get_tokens(self, project=None):
+        """Return the input and output tokens of the day, over all projects or of one project."""
+        if project:
+            return self.projects.get(project, 0)
+        _, input_tokens, output_tokens, _ = self.get_totals()
+        return input_tokens + output_tokens
+
+
+class UsageLedger:
+    """
+    Append-only ledger of the tokens used by each request.
+
+    Every request appends one line to a JSON lines file. The file is read
+    once, on first use, into running totals per day, per project and per
+    chat, which every new entry updates. Checking a budget or building a
+    report therefore never reads the file again.
+
+    Args:
+        path (str): The path of the ledger file
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self.path = path
+        self.loaded = False
+        self.days = {}  # day -> DayUsage
+        self.chats = {}  # chat id -> tokens
+
+    def record(self, model, input_tokens, output_tokens, duration=0.0, chat=None, project=None, timestamp=None):
+        """
+        Add a request to the ledger.
+
+        Args:
+            model (str): The model that answered
+            input_tokens (int): The input tokens of the request
+            output_tokens (int): The output tokens of the response
+            duration (float, optional): The seconds from sending the request to the end of the response
+            chat (str, optional): The id of the chat the request was made in
+            project (str, optional): The name of the project the request was made in
+            timestamp (float, optional): When the request was made, defaults to now
+        """
+        entry = {
+            't': round(timestamp or time.time(), 3),
+            'm': model,
+            'i': input_tokens,
+            'o': output_tokens,
+            'd': round(duration, 3)
+        }
+        if chat:
+            entry['c'] = chat
+        if project:
+            entry['p'] = project
+
+        self.load()
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+            self.add_entry(entry)
+
+    def add_entry(self, entry):
+        """Add a ledger entry to the totals. Call with the lock held."""
+        day = self.days.get(get_day(entry['t']))
+        if day is None:
+            day = self.days[get_day(entry['t'])] = DayUsage()
+        day.add(entry['m'], entry['i'], entry['o'], entry.get('d', 0.0), entry.get('p'))
+
+        chat = entry.get('c')
+        if chat:
+            self.chats[chat] = self.chats.get(chat, 0) + entry['i'] + entry['o']
+
+    def load(self):
+        """Read the ledger into the totals, once."""
+        with self._lock:
+            if self.loaded:
+                return
+
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            self.add_entry(json.loads(line))
+                        except (ValueError, KeyError):
+                            continue # Skip a line that was cut off by a crash
+
+            self.loaded = True
+
+    def get_tokens(self, day, project=None):
+        """Return the input and output tokens used on a day, over all projects or in one project."""
+        self.load()
+        with self._lock:
+            usage = self.days.get(day)
+            return usage.get_tokens(project) if usage else 0
+
+    def get_chat_tokens(self, chat):
+        """Return the input and output tokens used in a chat."""
+        self.load()
+        with self._lock:
+            return self.chats.get(chat, 0)
+
+    def get_recent_days(self, count, now=None):
+        """
+        Return the usage of the most recent days, newest first.
+
+        Returns:
+            list: (day, DayUsage) tuples, with an empty DayUsage for days without requests
+        """
+        self.load()
+        today = date.fromtimestamp(now or time.time())
+        with self._lock:
+            days = []
+            for offset in range(count):
+                day = (today - timedelta(days=offset)).isoformat()
+                days.append((day, self.days.get(day) or DayUsage()))
+            return days
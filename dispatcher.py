@@ -0,0 +1,83 @@
+import sublime
+import threading
+import traceback
+from .constants import PLUGIN_NAME
+
+class UiDispatcher:
+    """
+    Marshals callbacks from worker threads to the main thread.
+
+    Callbacks are queued and run in order in a single main thread tick, so a
+    burst of stream chunks costs one set_timeout instead of one per chunk.
+    Consecutive text chunks for the same callback are joined into one call.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = []
+        self._scheduled = False
+        self.main_thread_id = threading.main_thread().ident
+        self.debug = False # Kept in sync with the debug_threading setting by the settings snapshot
+
+    def dispatch(self, callback, *args):
+        """Run the callback with the given arguments on the main thread."""
+        with self._lock:
+            self._queue.append((callback, args, None))
+            schedule = self._claim_schedule()
+
+        if schedule:
+            sublime.set_timeout(self._drain, 0)
+
+    def dispatch_text(self, callback, text):
+        """Run the callback with the given text on the main thread, joined with any pending text for it."""
+        with self._lock:
+            if self._queue:
+                last_callback, _, chunks = self._queue[-1]
+                if chunks is not None and last_callback == callback:
+                    chunks.append(text)
+                    return
+
+            self._queue.append((callback, (), [text]))
+            schedule = self._claim_schedule()
+
+        if schedule:
+            sublime.set_timeout(self._drain, 0)
+
+    def _claim_schedule(self):
+        """Return whether the caller should schedule a drain. Call with the lock held."""
+        if self._scheduled:
+            return False
+        self._scheduled = True
+        return True
+
+    def _drain(self):
+        with self._lock:
+            queue = self._queue
+            self._queue = []
+            self._scheduled = False
+
+        for callback, args, chunks in queue:
+            try:
+                if chunks is not None:
+                    callback(''.join(chunks))
+                else:
+                    callback(*args)
+            except Exception as e:
+                print(f"{PLUGIN_NAME} Error in main thread callback: {str(e)}")
+                traceback.print_exc()
+
+    def is_main_thread(self):
+        return threading.current_thread().ident == self.main_thread_id
+
+    def assert_main_thread(self, name):
+        """In debug mode, report UI calls that are made from a worker thread."""
+        if self.debug and not self.is_main_thread():
+            print(f"{PLUGIN_NAME} Warning: {name} called from worker thread {threading.current_thread().name}")
+            traceback.print_stack()
+
+
+dispatcher = UiDispatcher()
+
+def configure_dispatcher():
+    """Record the main thread. Call from plugin_loaded."""
+    dispatcher.main_thread_id = threading.current_thread().ident
@@ -0,0 +1,82 @@
+import cProfile
+import functools
+import threading
+import time
+
+class Profiler:
+    """
+    Low-overhead timers for the hot paths of the plugin.
+
+    Functions decorated with profiled() are timed while profiling is
+    enabled, and cost a single attribute check otherwise. Optionally a
+    cProfile profile of the main thread is captured at the same time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.enabled = False
+        self.started_at = None
+        self.timers = {}  # name -> [count, total seconds, max seconds]
+        self.profile = None
+
+    def start(self, use_cprofile=False):
+        with self._lock:
+            self.timers = {}
+        self.started_at = time.time()
+
+        if use_cprofile:
+            # Only profiles the calling thread, call from the main thread
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+        self.enabled = True
+
+    def stop(self):
+        """
+        Stop profiling.
+
+        Returns:
+            tuple: The timers and the cProfile profile, or None if it was not captured
+        """
+        self.enabled = False
+
+        profile = self.profile
+        self.profile = None
+        if profile:
+            profile.disable()
+
+        with self._lock:
+            timers = self.timers
+            self.timers = {}
+
+        return timers, profile
+
+    def record(self, name, elapsed):
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                self.timers[name] = [1, elapsed, elapsed]
+            else:
+                timer[0] += 1
+                timer[1] += elapsed
+                if elapsed > timer[2]:
+                    timer[2] = elapsed
+
+
+profiler = Profiler()
+
+def profiled(name):
+    """Decorator that times the function while profiling is enabled."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
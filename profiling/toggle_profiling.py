@@ -0,0 +1,95 @@
+import sublime
+import sublime_plugin
+import io
+import json
+import os
+import pstats
+import time
+from ..constants import PLUGIN_NAME
+from .profiler import profiler
+
+TOP_FUNCTIONS = 25
+
+def get_profile_path(extension):
+    """Get the path of a new profile file in the Sublime Text cache directory."""
+    profile_dir = os.path.join(sublime.cache_path(), PLUGIN_NAME, 'profiles')
+    if not os.path.exists(profile_dir):
+        os.makedirs(profile_dir)
+    filename = "profile-{0}.{1}".format(time.strftime('%Y%m%d-%H%M%S'), extension)
+    return os.path.join(profile_dir, filename)
+
+def format_timers(timers):
+    lines = ["{0:<45} {1:>8} {2:>12} {3:>10} {4:>10}".format("Hot path", "Calls", "Total ms", "Mean ms", "Max ms")]
+    for name, (count, total, longest) in sorted(timers.items(), key=lambda item: -item[1][1]):
+        lines.append("{0:<45} {1:>8} {2:>12.1f} {3:>10.2f} {4:>10.2f}".format(
+            name,
+            count,
+            total * 1000,
+            total * 1000 / count,
+            longest * 1000
+        ))
+    return '\n'.join(lines)
+
+
+class ClaudetteToggleProfilingCommand(sublime_plugin.WindowCommand):
+    """
+    Start or stop profiling the hot paths of the plugin.
+
+    When stopped, the timers are written as JSON, and the cProfile capture
+    as pstats, to the Sublime Text cache directory, and a summary opens in
+    a new view.
+    """
+
+    def run(self, cprofile=False):
+        if not profiler.enabled:
+            profiler.start(use_cprofile=cprofile)
+            sublime.status_message("Claudette profiling started")
+            return
+
+        duration = time.time() - profiler.started_at
+        timers, profile = profiler.stop()
+
+        try:
+            json_path = get_profile_path('json')
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'duration': duration,
+                    'timers': {
+                        name: {'calls': count, 'total': total, 'max': longest}
+                        for name, (count, total, longest) in timers.items()
+                    }
+                }, f, indent=2)
+
+            summary = [
+                "# Claudette profile",
+                "",
+                "Duration: {0:.1f}s".format(duration),
+                "Timers: {0}".format(json_path),
+                "",
+                format_timers(timers) if timers else "No hot paths were called.",
+            ]
+
+            if profile:
+                pstats_path = get_profile_path('pstats')
+                profile.dump_stats(pstats_path)
+
+                stream = io.StringIO()
+                pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+                summary += [
+                    "",
+                    "cProfile: {0}".format(pstats_path),
+                    "",
+                    "## Top {0} functions by cumulative time".format(TOP_FUNCTIONS),
+                    stream.getvalue(),
+                ]
+
+        except OSError as e:
+            print(f"{PLUGIN_NAME} Error writing profile: {str(e)}")
+            sublime.error_message(f"{PLUGIN_NAME} Error: Could not write profile")
+            return
+
+        view = self.window.new_file()
+        view.set_scratch(True)
+        view.set_name("Claudette Profile")
+        view.run_command('append', {'characters': '\n'.join(summary) + '\n'})
+        view.set_read_only(True)
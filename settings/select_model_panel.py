@@ -1,7 +1,10 @@
 import sublime
 import sublime_plugin
+import threading
 from ..api.api import ClaudeAPI
 from ..constants import SETTINGS_FILE
+from ..dispatcher import dispatcher
+from .snapshot import get_settings
 
 class ClaudetteSelectModelPanelCommand(sublime_plugin.WindowCommand):
     """
@@ -15,10 +18,16 @@ class ClaudetteSelectModelPanelCommand(sublime_plugin.WindowCommand):
         return True
 
     def run(self):
-        api = ClaudeAPI()
-        settings = sublime.load_settings(SETTINGS_FILE)
-        current_model = settings.get('model')
-        models = api.fetch_models()
+        # Fetching the models blocks, keep it off the main thread
+        thread = threading.Thread(target=self.fetch_models)
+        thread.start()
+
+    def fetch_models(self):
+        models = ClaudeAPI().fetch_models()
+        dispatcher.dispatch(self.show_models, models)
+
+    def show_models(self, models):
+        current_model = get_settings().model
 
         if current_model in models:
             selected_index = models.index(current_model)
@@ -29,7 +38,7 @@ class ClaudetteSelectModelPanelCommand(sublime_plugin.WindowCommand):
         def on_select(index):
             if index != -1:
                 selected_model = models[index]
-                settings.set('model', selected_model)
+                sublime.load_settings(SETTINGS_FILE).set('model', selected_model)
                 sublime.status_message("Claude model switched to {0}".format(str(selected_model)))
 
         self.window.show_quick_panel(models, on_select, 0, selected_index)
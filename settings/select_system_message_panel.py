@@ -1,6 +1,7 @@
 import sublime
 import sublime_plugin
 from ..constants import SETTINGS_FILE
+from .snapshot import get_settings
 
 class ClaudetteSelectSystemMessagePanelCommand(sublime_plugin.WindowCommand):
     """
@@ -14,9 +15,9 @@ class ClaudetteSelectSystemMessagePanelCommand(sublime_plugin.WindowCommand):
         return True
 
     def run(self):
-        settings = sublime.load_settings(SETTINGS_FILE)
-        system_messages = settings.get('system_messages', [])
-        current_index = settings.get('default_system_message_index', 0)
+        snapshot = get_settings()
+        system_messages = snapshot.system_messages
+        current_index = snapshot.default_system_message_index
 
         panel_items = []
         for msg in system_messages:
@@ -36,7 +37,7 @@ class ClaudetteSelectSystemMessagePanelCommand(sublime_plugin.WindowCommand):
                         "default": "{\n\t$0\n}\n"
                     })
                 else:
-                    settings.set('default_system_message_index', index)
+                    sublime.load_settings(SETTINGS_FILE).set('default_system_message_index', index)
                     sublime.save_settings(SETTINGS_FILE)
                     sublime.status_message("System message switched")
 
@@ -0,0 +1,220 @@
+import sublime
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+from ..constants import BASE_URL, DEFAULT_MODEL, MAX_TOKENS, SETTINGS_FILE
+from ..dispatcher import dispatcher
+
+MIN_THINKING_BUDGET = 1024
+DEFAULT_THINKING_TIERS = {'fast': 0, 'normal': 4000, 'deep': 16000}
+CODE_BLOCK_INSTRUCTION = 'Please wrap all code examples in a markdown code block and ensure each code block is complete and self-contained.'
+
+def get_valid_temperature(temp):
+    try:
+        temp = float(temp)
+        if 0.0 <= temp <= 1.0:
+            return temp
+        return 1.0
+    except (TypeError, ValueError):
+        return 1.0
+
+def get_effective_max_tokens(value):
+    """The max_tokens sent with a request, which is never more than MAX_TOKENS."""
+    try:
+        value = int(value)
+        if value > 0:
+            return min(value, MAX_TOKENS)
+        return MAX_TOKENS
+    except (TypeError, ValueError):
+        return MAX_TOKENS
+
+def get_system_blocks(system_messages, default_index):
+    """Assemble the system prompt blocks from the selected system message."""
+    blocks = [{"type": "text", "text": CODE_BLOCK_INSTRUCTION}]
+
+    if (system_messages and
+        isinstance(system_messages, list) and
+        isinstance(default_index, int) and
+        0 <= default_index < len(system_messages)):
+
+        selected_message = system_messages[default_index]
+        if selected_message and selected_message.strip():
+            blocks.append({
+                "type": "text",
+                "text": selected_message.strip()
+            })
+
+    return tuple(blocks)
+
+def get_thinking_tiers(tiers):
+    """Validate the thinking budget per tier. A budget of 0 turns extended thinking off."""
+    valid = {}
+    if not isinstance(tiers, dict):
+        return MappingProxyType(valid)
+
+    for name, budget in tiers.items():
+        try:
+            budget = int(budget)
+        except (TypeError, ValueError):
+            continue
+        # The API requires a budget of at least 1024 tokens
+        valid[name] = max(budget, MIN_THINKING_BUDGET) if budget > 0 else 0
+
+    return MappingProxyType(valid)
+
+def get_poll_interval(value):
+    """The seconds between checks of a batch, at least one."""
+    try:
+        return max(1.0, float(value))
+    except (TypeError, ValueError):
+        return 30.0
+
+def get_compaction_threshold(value):
+    """The estimated tokens after which a chat is compacted, more than 0."""
+    try:
+        value = int(value)
+        return value if value > 0 else 20000
+    except (TypeError, ValueError):
+        return 20000
+
+def get_keep_recent(value):
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 4
+
+def get_resume_attempts(value):
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 2
+
+def get_budget(value):
+    """A token budget, 0 for no budget."""
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 0
+
+def get_downgrade_threshold(value):
+    """The fraction of a budget after which questions are downgraded, between 0 and 1."""
+    try:
+        return min(max(float(value), 0.0), 1.0)
+    except (TypeError, ValueError):
+        return 1.0
+
+
+@dataclass(frozen=True)
+class SettingsSnapshot:
+    """
+    Immutable, validated view of the package settings.
+
+    Built once and rebuilt only when the settings change, so request code can
+    read settings and derived values without any settings I/O or validation.
+    """
+    api_key: Optional[str]
+    model: str
+    base_url: str
+    max_tokens: int
+    temperature: float
+    system: Tuple[dict, ...]
+    system_messages: Tuple[str, ...]
+    default_system_message_index: int
+    chat_line_numbers: bool
+    chat_rulers: object
+    chat_set_scratch: bool
+    chat_streaming_syntax: bool
+    chat_log_render_stats: bool
+    batch_poll_interval: float
+    batch_write_back: bool
+    compare_models: Tuple[str, ...]
+    compare_split_layout: bool
+    compaction_auto: bool
+    compaction_threshold_tokens: int
+    compaction_keep_recent: int
+    compaction_model: str
+    thinking_default_tier: str
+    thinking_tiers: Mapping[str, int]
+    warm_up_connection: bool
+    warm_up_prompt_cache: bool
+    transport: str
+    resume_attempts: int
+    usage_ledger: bool
+    usage_daily_budget: int
+    usage_project_daily_budget: int
+    usage_downgrade_model: str
+    usage_downgrade_at: float
+    search_index: bool
+    debug_threading: bool
+
+    @classmethod
+    def from_settings(cls, settings):
+        system_messages = settings.get('system_messages', [])
+        default_index = settings.get('default_system_message_index', 0)
+        chat = settings.get('chat', {})
+        batch = settings.get('batch', {})
+        compare = settings.get('compare', {})
+        compaction = settings.get('compaction', {})
+        thinking = settings.get('thinking', {})
+        warm_up = settings.get('warm_up', {})
+        usage = settings.get('usage', {})
+        search = settings.get('search', {})
+
+        return cls(
+            api_key=settings.get('api_key'),
+            model=settings.get('model', DEFAULT_MODEL),
+            base_url=settings.get('base_url') or BASE_URL,
+            max_tokens=get_effective_max_tokens(settings.get('max_tokens', MAX_TOKENS)),
+            temperature=get_valid_temperature(settings.get('temperature', '1.0')),
+            system=get_system_blocks(system_messages, default_index),
+            system_messages=tuple(system_messages) if isinstance(system_messages, list) else (),
+            default_system_message_index=default_index if isinstance(default_index, int) else 0,
+            chat_line_numbers=chat.get('line_numbers', False),
+            chat_rulers=chat.get('rulers', False),
+            chat_set_scratch=chat.get('set_scratch', True),
+            chat_streaming_syntax=chat.get('streaming_syntax', False),
+            chat_log_render_stats=chat.get('log_render_stats', False),
+            batch_poll_interval=get_poll_interval(batch.get('poll_interval', 30)),
+            batch_write_back=batch.get('write_back', False),
+            compare_models=tuple(compare.get('models', [])),
+            compare_split_layout=compare.get('split_layout', False),
+            compaction_auto=compaction.get('auto', False),
+            compaction_threshold_tokens=get_compaction_threshold(compaction.get('threshold_tokens', 20000)),
+            compaction_keep_recent=get_keep_recent(compaction.get('keep_recent', 4)),
+            compaction_model=compaction.get('model', 'claude-3-5-haiku-latest'),
+            thinking_default_tier=thinking.get('default_tier', 'fast'),
+            thinking_tiers=get_thinking_tiers(thinking.get('tiers', DEFAULT_THINKING_TIERS)),
+            warm_up_connection=warm_up.get('connection', False),
+            warm_up_prompt_cache=warm_up.get('prompt_cache', False),
+            transport='asyncio' if settings.get('transport') == 'asyncio' else 'threads',
+            resume_attempts=get_resume_attempts(settings.get('resume_attempts', 2)),
+            usage_ledger=usage.get('ledger', True),
+            usage_daily_budget=get_budget(usage.get('daily_budget', 0)),
+            usage_project_daily_budget=get_budget(usage.get('project_daily_budget', 0)),
+            usage_downgrade_model=usage.get('downgrade_model') or '',
+            usage_downgrade_at=get_downgrade_threshold(usage.get('downgrade_at', 1.0)),
+            search_index=search.get('index', True),
+            debug_threading=bool(settings.get('debug_threading', False)),
+        )
+
+    def get_thinking_budget(self, tier=None):
+        """Return the thinking budget of the tier, or of the default tier. 0 means no extended thinking."""
+        return self.thinking_tiers.get(tier or self.thinking_default_tier, 0)
+
+
+_snapshot = None
+
+def get_settings():
+    """Return the current settings snapshot."""
+    global _snapshot
+    if _snapshot is None:
+        settings = sublime.load_settings(SETTINGS_FILE)
+        settings.clear_on_change('claudette_snapshot')
+        settings.add_on_change('claudette_snapshot', _rebuild)
+        _rebuild()
+    return _snapshot
+
+def _rebuild():
+    global _snapshot
+    _snapshot = SettingsSnapshot.from_settings(sublime.load_settings(SETTINGS_FILE))
+    dispatcher.debug = _snapshot.debug_threading
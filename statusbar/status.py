@@ -0,0 +1,136 @@
+import sublime
+import itertools
+import threading
+import time
+
+class StatusBar:
+    """
+    Shared status bar indicator for all requests in flight.
+
+    Requests register themselves with begin() and end(). A single timer on the
+    main thread renders one compact status for all of them, e.g.
+    "Claude ... 2 requests · 85 tok/s · 1 queued", and stops rescheduling itself
+    as soon as nothing is running, so an idle plugin causes no wakeups.
+    """
+
+    KEY = 'claudette'
+    INTERVAL = 250
+    FRAMES = [".  ", ".. ", "...", "   "]
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._tasks = {}
+        self._queued = 0
+        self._running = False
+        self._frame = 0
+        self._views = {}
+
+    def begin(self, label):
+        """
+        Register a new task. Safe to call from any thread.
+
+        Returns:
+            int: The task id to pass to update() and end()
+        """
+        with self._lock:
+            task_id = next(self._ids)
+            self._tasks[task_id] = {
+                'label': label,
+                'start_time': time.time(),
+                'first_output_time': None,
+                'chars': 0
+            }
+            start = self._claim_timer()
+
+        if start:
+            sublime.set_timeout(self._tick, 0)
+        return task_id
+
+    def add_output(self, task_id, text):
+        """Count generated text towards the throughput of a task."""
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task:
+                if task['first_output_time'] is None:
+                    task['first_output_time'] = time.time()
+                task['chars'] += len(text)
+
+    def end(self, task_id):
+        with self._lock:
+            self._tasks.pop(task_id, None)
+
+    def set_queued(self, count):
+        """Set the number of requests that are waiting to be sent."""
+        with self._lock:
+            self._queued = count
+            start = self._claim_timer() if count else False
+
+        if start:
+            sublime.set_timeout(self._tick, 0)
+
+    def _claim_timer(self):
+        """Return whether the caller should start the timer. Call with the lock held."""
+        if self._running:
+            return False
+        self._running = True
+        return True
+
+    def _get_status(self):
+        """Build the status text, or return None when idle. Call with the lock held."""
+        if not self._tasks and not self._queued:
+            return None
+
+        now = time.time()
+        tokens_per_second = 0.0
+        for task in self._tasks.values():
+            if task['first_output_time'] is not None and now > task['first_output_time']:
+                # Roughly four characters per token
+                tokens_per_second += task['chars'] / 4 / (now - task['first_output_time'])
+
+        if len(self._tasks) == 1:
+            parts = [next(iter(self._tasks.values()))['label']]
+        else:
+            parts = ["{0} requests".format(len(self._tasks))]
+
+        if tokens_per_second:
+            parts.append("{0:.0f} tok/s".format(tokens_per_second))
+        if self._queued:
+            parts.append("{0} queued".format(self._queued))
+
+        return "Claude{0} {1}".format(self.FRAMES[self._frame], ' · '.join(parts))
+
+    def _tick(self):
+        with self._lock:
+            status = self._get_status()
+            if status is None:
+                self._running = False
+            self._frame = (self._frame + 1) % len(self.FRAMES)
+
+        if status is None:
+            self._clear()
+            return
+
+        window = sublime.active_window()
+        view = window.active_view() if window else None
+
+        for view_id, other in list(self._views.items()):
+            if not view or view_id != view.id():
+                if other.is_valid():
+                    other.erase_status(self.KEY)
+                del self._views[view_id]
+
+        if view:
+            view.set_status(self.KEY, status)
+            self._views[view.id()] = view
+
+        sublime.set_timeout(self._tick, self.INTERVAL)
+
+    def _clear(self):
+        for view in self._views.values():
+            if view.is_valid():
+                view.erase_status(self.KEY)
+        self._views = {}
+
+
+status_bar = StatusBar()
@@ -0,0 +1,83 @@
+"""
+Benchmark the threaded and asyncio transports with concurrent streams.
+
+Starts the mock API of mock_api.py in its own process, then streams 1, 10
+and 50 answers at the same time on each transport, each run in a fresh
+process, and prints the wall time, the peak thread count, the number of
+complete answers, the peak memory and the CPU time of the plugin process.
+
+    python tests/benchmark_transport.py [STREAMS ...]
+"""
+import os
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+import stub_env
+from mock_api import EVENTS, get_answer
+
+STREAMS = (1, 10, 50)
+TRANSPORTS = ('threads', 'asyncio')
+
+def run_streams(base_url, transport, count):
+    stub_env.install()
+    import sublime
+    sublime.load_settings(stub_env.import_module('constants').SETTINGS_FILE).update({
+        'api_key': 'benchmark',
+        'base_url': base_url,
+        'transport': transport,
+    })
+    ClaudeAPI = stub_env.import_module('api.api').ClaudeAPI
+    Conversation = stub_env.import_module('core.conversation').Conversation
+
+    answers = []
+    done = []
+    peak_threads = threading.active_count()
+    start = time.perf_counter()
+
+    for index in range(count):
+        conversation = Conversation()
+        conversation.append('user', 'Question {0}'.format(index))
+        answer = []
+        answers.append(answer)
+        ClaudeAPI().start_stream(answer.append, conversation, done.append)
+
+    while len(done) < count:
+        sublime.run_timeouts()
+        peak_threads = max(peak_threads, threading.active_count())
+        time.sleep(0.002)
+
+    elapsed = time.perf_counter() - start
+    complete = sum(1 for answer in answers if ''.join(answer) == get_answer(EVENTS))
+    print("{0:<8} {1:>3} streams  {2:6.2f} s  {3:>3} threads  {4}/{1} complete  {5:>4} MB  {6:5.2f} s CPU".format(
+        transport, count, elapsed, peak_threads, complete,
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024, time.process_time()
+    ))
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def main(counts):
+    here = os.path.dirname(os.path.abspath(__file__))
+    port = get_free_port()
+    server = subprocess.Popen([sys.executable, os.path.join(here, 'mock_api.py'), str(port)])
+    try:
+        time.sleep(0.5)
+        base_url = 'http://127.0.0.1:{0}/v1/'.format(port)
+        for count in counts:
+            for transport in TRANSPORTS:
+                subprocess.run([sys.executable, __file__, '--run', base_url, transport, str(count)], check=True)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--run']:
+        run_streams(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+    else:
+        main([int(count) for count in sys.argv[1:]] or STREAMS)
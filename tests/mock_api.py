@@ -0,0 +1,205 @@
+"""
+A local mock of the Claude Messages API, for tests and benchmarks.
+
+Streams are sent as chunked server-sent events, like the real API. The
+model of a request picks its behaviour:
+
+- 'error': answers with a 400 error
+- 'ratelimit': the first request is rate limited with a 429 and a retry-after header
+- 'drop': the first request drops the connection halfway through the answer,
+  a resumed request continues the answer
+- anything else: streams the answer
+
+Message Batches are created with POST /messages/batches. A batch is in
+progress when it is first checked and has ended from then on. Each item
+answers with a code block holding its code in upper case, or errors if its
+model is 'error'. Results of unknown batches are three succeeded items.
+
+Run it on its own with `python tests/mock_api.py PORT [EVENTS] [DELAY]`.
+"""
+import json
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EVENTS = 50
+DELAY = 0.02  # seconds between events
+
+def get_answer(events):
+    return ''.join('w{0} '.format(i) for i in range(events))
+
+def get_batch_answer(params):
+    """Return the answer to a batch item: the code of its question in upper case."""
+    question = get_text(params['messages'][-1]['content'])
+    return '```\n{0}\n```'.format(question.split('Code:\n', 1)[-1].upper())
+
+def get_text(content):
+    """Return the text of message content, a string or a list of content blocks."""
+    if isinstance(content, str):
+        return content
+    return ''.join(block.get('text', '') for block in content)
+
+
+class MockAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data, headers=()):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('content-type', 'application/json')
+        self.send_header('content-length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunk(self, data):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def send_event(self, event):
+        self.send_chunk('event: {0}\ndata: {1}\n\n'.format(event['type'], json.dumps(event)).encode('utf-8'))
+
+    def do_GET(self):
+        self.server.requests.append(('GET', self.path, None))
+        if self.path.endswith('/models'):
+            self.send_json(200, {'data': [{'id': 'claude-a'}, {'id': 'claude-b'}]})
+        elif self.path.endswith('/results'):
+            batch = self.server.batches.get(self.path.split('/')[-2])
+            if batch is None:
+                results = [{'custom_id': 'item-{0}'.format(index), 'result': {'type': 'succeeded'}} for index in range(3)]
+            else:
+                results = [self.get_batch_result(request) for request in batch['requests']]
+            self.send_response(200)
+            self.send_header('transfer-encoding', 'chunked')
+            self.end_headers()
+            for result in results:
+                self.send_chunk(json.dumps(result).encode('utf-8') + b'\n')
+            self.wfile.write(b'0\r\n\r\n')
+        elif self.path.split('/')[-1] in self.server.batches:
+            batch = self.server.batches[self.path.split('/')[-1]]
+            batch['checks'] += 1
+            self.send_json(200, self.get_batch(batch))
+        else:
+            self.send_json(404, {'error': {'message': 'Not found'}})
+
+    def get_batch(self, batch):
+        ended = batch['checks'] > 1
+        count = len(batch['requests'])
+        return {
+            'id': batch['id'],
+            'processing_status': 'ended' if ended else 'in_progress',
+            'request_counts': {'processing': 0 if ended else count, 'succeeded': count if ended else 0, 'errored': 0},
+            'results_url': self.server.base_url + 'messages/batches/{0}/results'.format(batch['id']) if ended else None
+        }
+
+    @staticmethod
+    def get_batch_result(request):
+        if request['params'].get('model') == 'error':
+            result = {'type': 'errored', 'error': {'type': 'invalid_request_error'}}
+        else:
+            result = {'type': 'succeeded', 'message': {'content': [{'type': 'text', 'text': get_batch_answer(request['params'])}]}}
+        return {'custom_id': request['custom_id'], 'result': result}
+
+    def do_POST(self):
+        data = json.loads(self.rfile.read(int(self.headers['content-length'])))
+        self.server.requests.append(('POST', self.path, data))
+        if self.path.endswith('/messages/batches'):
+            batch = self.server.add_batch(data['requests'])
+            return self.send_json(200, self.get_batch(batch))
+
+        model = data.get('model')
+
+        if model == 'error':
+            return self.send_json(400, {'error': {'message': 'Invalid request'}})
+        if model == 'ratelimit' and self.server.first_request(model):
+            return self.send_json(429, {'error': {'message': 'Rate limited'}}, [('retry-after', '0.1')])
+        if not data.get('stream'):
+            return self.send_json(200, {
+                'content': [{'type': 'text', 'text': 'OK'}],
+                'usage': {'input_tokens': 5, 'output_tokens': 1}
+            })
+
+        self.send_response(200)
+        self.send_header('content-type', 'text/event-stream')
+        self.send_header('transfer-encoding', 'chunked')
+        self.end_headers()
+
+        answer = get_answer(self.server.events).split(' ')[:-1]
+        start = 0
+        last = data['messages'][-1]
+        if last['role'] == 'assistant':
+            # Continue a resumed answer, repeating the last words received like the model may do
+            start = max(len(get_text(last['content']).split(' ')) - 3, 0)
+
+        self.send_event({'type': 'message_start', 'message': {'usage': {'input_tokens': 5, 'output_tokens': 1}}})
+        for index in range(start, len(answer)):
+            if model == 'drop' and index == len(answer) // 2 and self.server.first_request(model):
+                self.close_connection = True
+                self.connection.shutdown(socket.SHUT_RDWR)
+                return
+            self.send_event({'type': 'content_block_delta', 'delta': {'type': 'text_delta', 'text': answer[index] + ' '}})
+            if self.server.delay:
+                time.sleep(self.server.delay)
+        self.send_event({'type': 'message_delta', 'usage': {'output_tokens': len(answer) - start}})
+        self.send_event({'type': 'message_stop'})
+        self.wfile.write(b'0\r\n\r\n')
+
+
+class MockAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, port=0, events=EVENTS, delay=DELAY):
+        super().__init__(('127.0.0.1', port), MockAPIHandler)
+        self.events = events
+        self.delay = delay
+        self.requests = []
+        self.batches = {}
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return 'http://127.0.0.1:{0}/v1/'.format(self.server_address[1])
+
+    def add_batch(self, requests):
+        with self._lock:
+            batch_id = 'msgbatch_{0}'.format(len(self.batches) + 1)
+            self.batches[batch_id] = {'id': batch_id, 'requests': requests, 'checks': 0}
+            return self.batches[batch_id]
+
+    def first_request(self, model):
+        """Return True for the first request for the model only."""
+        with self._lock:
+            if model in self._seen:
+                return False
+            self._seen.add(model)
+            return True
+
+    def handle_error(self, request, client_address):
+        # Clients closing their idle connections are not an error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def start(self):
+        """Serve on a background thread."""
+        threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == '__main__':
+    MockAPIServer(
+        int(sys.argv[1]),
+        int(sys.argv[2]) if len(sys.argv) > 2 else EVENTS,
+        float(sys.argv[3]) if len(sys.argv) > 3 else DELAY
+    ).serve_forever()
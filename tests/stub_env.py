@@ -0,0 +1,20 @@
+"""Set up the import path so the plugin can be imported under the stub Sublime Text API."""
+import importlib
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUBS = os.path.join(ROOT, 'tests', 'stubs')
+
+# Sublime Text imports the plugin as a package named after its directory
+PACKAGE = os.path.basename(ROOT)
+
+def install():
+    for path in (STUBS, os.path.dirname(ROOT)):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+def import_module(name):
+    """Import a module of the plugin, e.g. 'core.conversation'."""
+    install()
+    return importlib.import_module('{0}.{1}'.format(PACKAGE, name))
@@ -0,0 +1,87 @@
+"""A minimal stand-in for the Sublime Text API, enough to import and drive the plugin outside the editor."""
+import os
+import tempfile
+import time
+
+HIDDEN = 128
+DRAW_NO_FILL = 32
+LAYOUT_BLOCK = 2
+
+_settings = {}
+_timeouts = []
+_cache_path = os.path.join(tempfile.gettempdir(), 'claudette-tests')
+
+
+class Settings(dict):
+    def set(self, key, value):
+        self[key] = value
+
+    def erase(self, key):
+        self.pop(key, None)
+
+    def add_on_change(self, tag, callback):
+        pass
+
+    def clear_on_change(self, tag):
+        pass
+
+
+class Region:
+    def __init__(self, a, b=None):
+        self.a = a
+        self.b = a if b is None else b
+
+    def begin(self):
+        return min(self.a, self.b)
+
+    def end(self):
+        return max(self.a, self.b)
+
+    def empty(self):
+        return self.a == self.b
+
+
+class View:
+    pass
+
+
+class Window:
+    pass
+
+
+def load_settings(name):
+    return _settings.setdefault(name, Settings())
+
+def save_settings(name):
+    pass
+
+def set_timeout(callback, delay=0):
+    _timeouts.append((time.time() + delay / 1000.0, callback))
+
+def set_timeout_async(callback, delay=0):
+    set_timeout(callback, delay)
+
+def run_timeouts():
+    """Run the callbacks that are due, like the editor's event loop would."""
+    while True:
+        now = time.time()
+        due = [timeout for timeout in _timeouts if timeout[0] <= now]
+        if not due:
+            return
+        _timeouts.remove(due[0])
+        due[0][1]()
+
+def status_message(message):
+    pass
+
+def error_message(message):
+    pass
+
+def cache_path():
+    return _cache_path
+
+def active_window():
+    return None
+
+def windows():
+    return []
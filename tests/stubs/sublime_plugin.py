@@ -0,0 +1,28 @@
+"""A minimal stand-in for the Sublime Text plugin API."""
+
+
+class Command:
+    pass
+
+
+class TextCommand(Command):
+    def __init__(self, view):
+        self.view = view
+
+
+class WindowCommand(Command):
+    def __init__(self, window):
+        self.window = window
+
+
+class ApplicationCommand(Command):
+    pass
+
+
+class EventListener:
+    pass
+
+
+class ViewEventListener:
+    def __init__(self, view):
+        self.view = view
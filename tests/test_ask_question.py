@@ -0,0 +1,147 @@
+"""Tests for asking questions in a chat view: the streamed conversation, the Apply targets and the model."""
+import unittest
+from unittest import mock
+import stub_env
+
+stub_env.install()
+import sublime
+
+ask_question = stub_env.import_module('chat.ask_question')
+ClaudetteChatView = stub_env.import_module('chat.chat_view').ClaudetteChatView
+snapshot = stub_env.import_module('settings.snapshot')
+SETTINGS_FILE = stub_env.import_module('constants').SETTINGS_FILE
+
+
+class FakeView:
+    """A text view that keeps its content and regions in memory."""
+
+    def __init__(self, view_id, content=''):
+        self.view_id = view_id
+        self.content = content
+        self.selection = []
+        self.regions = {}
+        self._settings = sublime.Settings()
+
+    def id(self):
+        return self.view_id
+
+    def size(self):
+        return len(self.content)
+
+    def substr(self, region):
+        return self.content[region.begin():region.end()]
+
+    def sel(self):
+        return self.selection
+
+    def settings(self):
+        return self._settings
+
+    def window(self):
+        return None
+
+    def file_name(self):
+        return None
+
+    def set_read_only(self, read_only):
+        pass
+
+    def assign_syntax(self, syntax):
+        pass
+
+    def run_command(self, command, args=None):
+        if command == 'append':
+            self.content += args['characters']
+
+    def add_regions(self, key, regions, *args):
+        self.regions[key] = list(regions)
+
+    def get_regions(self, key):
+        return self.regions.get(key, [])
+
+
+class FakeClaudeAPI:
+    streamed = []
+    created = []
+
+    def __init__(self, model=None, thinking_budget=0):
+        self.created.append((model, thinking_budget))
+        self.chat_id = None
+        self.project = None
+
+    def start_stream(self, chunk_callback, conversation, on_done=None, thinking_callback=None):
+        self.streamed.append(conversation)
+
+
+class AskQuestionTest(unittest.TestCase):
+    def setUp(self):
+        sublime.load_settings(SETTINGS_FILE).clear()
+        snapshot._snapshot = None
+        self.source = FakeView(1, 'first = 1\nsecond = 2\n')
+        self.chat = FakeView(2)
+
+        self.command = ask_question.ClaudetteAskQuestionCommand(self.source)
+        self.command.load_settings()
+        self.command.chat_view = ClaudetteChatView(None, self.command.settings)
+        self.command.chat_view.view = self.chat
+
+    def tearDown(self):
+        ClaudetteChatView.release_view(self.chat.id())
+        snapshot._snapshot = None
+
+    def ask(self, region, question, answer):
+        self.source.selection = [region]
+        with mock.patch.object(ask_question, 'ClaudeAPI', FakeClaudeAPI):
+            self.command.send_to_claude(self.source.substr(region), question)
+        response_start = self.chat.size()
+        self.command.chat_view.append_text(answer)
+        return response_start
+
+    def get_target_region(self, position):
+        target = self.command.chat_view.get_apply_target(position)
+        if target is None:
+            return None
+        view, region_key = target
+        region = view.get_regions(region_key)[0]
+        return (region.begin(), region.end())
+
+    def test_each_response_applies_to_its_own_selection(self):
+        first = sublime.Region(0, 9)
+        second = sublime.Region(10, 20)
+
+        first_response = self.ask(first, "Rename it", "```\none = 1\n```\n")
+        question_start = self.chat.size()
+        second_response = self.ask(second, "Rename this", "```\ntwo = 2\n```\n")
+
+        self.assertEqual(self.get_target_region(first_response), (0, 9))
+        self.assertEqual(self.get_target_region(second_response), (10, 20))
+
+        # The selected code echoed in the second question is not applied to the first selection
+        echoed = self.chat.content.index('second = 2', question_start)
+        self.assertIsNone(self.get_target_region(echoed))
+
+    def test_the_stream_gets_a_copy_of_the_conversation(self):
+        FakeClaudeAPI.streamed.clear()
+        self.ask(sublime.Region(0, 9), "Rename it", "")
+        streamed = FakeClaudeAPI.streamed[0]
+        self.assertIsNot(streamed, ClaudetteChatView.get_view_conversation(self.chat))
+
+        # The chat goes on while the answer streams
+        self.command.chat_view.handle_response("An answer")
+        self.assertEqual(len(streamed.messages), 1)
+
+    def test_questions_that_think_are_not_downgraded(self):
+        FakeClaudeAPI.created.clear()
+        with mock.patch.object(ask_question, 'get_routine_model', return_value='haiku'):
+            self.ask(sublime.Region(0, 9), "Rename it", "")
+
+            sublime.load_settings(SETTINGS_FILE)['thinking'] = {'default_tier': 'normal'}
+            snapshot._snapshot = None
+            self.command.load_settings()
+            self.ask(sublime.Region(0, 9), "Rename it again", "")
+
+        self.assertEqual(FakeClaudeAPI.created, [('haiku', 0), (None, 4000)])
+
+
+if __name__ == '__main__':
+    unittest.main()
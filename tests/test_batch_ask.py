@@ -0,0 +1,114 @@
+"""Tests for asking a question in a Message Batch, run headless against the mock API."""
+import unittest
+import stub_env
+from mock_api import MockAPIServer
+
+stub_env.install()
+import sublime
+
+batch_ask = stub_env.import_module('chat.batch_ask')
+snapshot = stub_env.import_module('settings.snapshot')
+SETTINGS_FILE = stub_env.import_module('constants').SETTINGS_FILE
+
+
+class FakeView:
+    """A text view that keeps its content and regions in memory."""
+
+    def __init__(self, content=''):
+        self.content = content
+        self.regions = {}
+
+    def is_valid(self):
+        return True
+
+    def set_read_only(self, read_only):
+        pass
+
+    def substr(self, region):
+        return self.content[region.begin():region.end()]
+
+    def add_regions(self, key, regions, *args):
+        self.regions[key] = list(regions)
+
+    def get_regions(self, key):
+        return self.regions.get(key, [])
+
+    def erase_regions(self, key):
+        self.regions.pop(key, None)
+
+    def run_command(self, command, args=None):
+        if command == 'append':
+            self.content += args['characters']
+        elif command == 'claudette_replace_region':
+            self.content = self.content[:args['begin']] + args['text'] + self.content[args['end']:]
+
+
+class BatchAskTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MockAPIServer(delay=0).start()
+        settings = sublime.load_settings(SETTINGS_FILE)
+        settings.clear()
+        settings.update({'api_key': 'key', 'base_url': self.server.base_url})
+        snapshot._snapshot = None
+
+    def tearDown(self):
+        self.server.stop()
+        snapshot._snapshot = None
+
+    def create_item(self, index, view, region):
+        key = 'claudette_batch_test_{0}'.format(index)
+        view.add_regions(key, [region])
+        return {
+            'custom_id': 'item-{0}'.format(index),
+            'view': view,
+            'region_key': key,
+            'label': 'item {0}'.format(index),
+            'code': view.substr(region)
+        }
+
+    def test_submits_polls_and_writes_back_the_results(self):
+        source = FakeView('first = 1\nsecond = 2\n')
+        results_view = FakeView()
+        items = [
+            self.create_item(0, source, sublime.Region(0, 9)),
+            self.create_item(1, source, sublime.Region(10, 20))
+        ]
+
+        batch = batch_ask.ClaudetteBatch("Shout it", items, results_view, write_back=True)
+        batch.poll_interval = 0
+        batch.run()
+        sublime.run_timeouts()
+
+        methods = [(method, path.split('/v1/')[-1]) for method, path, _ in self.server.requests]
+        self.assertEqual(methods, [
+            ('POST', 'messages/batches'),
+            ('GET', 'messages/batches/msgbatch_1'),
+            ('GET', 'messages/batches/msgbatch_1'),
+            ('GET', 'messages/batches/msgbatch_1/results')
+        ])
+        self.assertIn("Batch `msgbatch_1` submitted", results_view.content)
+        self.assertIn("## item 0\n\n```\nFIRST = 1\n```", results_view.content)
+        self.assertIn("## item 1\n\n```\nSECOND = 2\n```", results_view.content)
+
+        # Written back into the selections, whose tracked regions are then erased
+        self.assertEqual(source.content, 'FIRST = 1\nSECOND = 2\n')
+        self.assertEqual(source.regions, {})
+
+    def test_reports_the_items_that_errored(self):
+        source = FakeView('first = 1\n')
+        results_view = FakeView()
+        items = [self.create_item(0, source, sublime.Region(0, 9))]
+
+        batch = batch_ask.ClaudetteBatch("Shout it", items, results_view, write_back=True)
+        batch.api.build_request_data = lambda messages, stream: {'model': 'error', 'messages': messages}
+        batch.poll_interval = 0
+        batch.run()
+        sublime.run_timeouts()
+
+        self.assertIn("## item 0\n\n[Error] errored", results_view.content)
+        self.assertEqual(source.content, 'first = 1\n')
+        self.assertEqual(source.regions, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+"""
+Tests for the Messages API client of the core package, run headless against the mock API.
+
+Every test runs on both the threaded and the asyncio transport.
+"""
+import os
+import subprocess
+import sys
+import unittest
+import urllib.error
+import stub_env
+from mock_api import MockAPIServer, get_answer
+
+client = stub_env.import_module('core.client')
+Conversation = stub_env.import_module('core.conversation').Conversation
+ConnectionPool = stub_env.import_module('core.connection').ConnectionPool
+AsyncTransport = stub_env.import_module('core.async_transport').AsyncTransport
+RateLimiter = stub_env.import_module('core.rate_limit').RateLimiter
+RequestState = stub_env.import_module('core.request_state').RequestState
+
+EVENTS = 20
+
+
+class ClientTest:
+    create_transport = None
+
+    def setUp(self):
+        self.server = MockAPIServer(events=EVENTS, delay=0).start()
+        self.transport = self.create_transport()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def create_client(self, model='claude-a', **options):
+        return client.MessagesClient('key', model, base_url=self.server.base_url, **options)
+
+    def stream(self, messages_client):
+        conversation = Conversation()
+        conversation.append('user', 'Question')
+
+        events = {'text': [], 'status': [], 'error': [], 'done': []}
+        callbacks = client.StreamCallbacks(
+            text=events['text'].append,
+            status=events['status'].append,
+            error=events['error'].append,
+            done=events['done'].append
+        )
+        stats = self.transport.run(messages_client.stream(self.transport, conversation, callbacks))
+        return stats, events
+
+    def test_streams_the_answer(self):
+        messages_client = self.create_client()
+        stats, events = self.stream(messages_client)
+
+        self.assertEqual(''.join(events['text']), get_answer(EVENTS))
+        self.assertEqual(messages_client.state.status, RequestState.DONE)
+        self.assertEqual(events['done'], [stats])
+        self.assertEqual((stats['input_tokens'], stats['output_tokens']), (5, EVENTS))
+
+    def test_keeps_the_answer_only_to_resume_it(self):
+        callbacks = client.StreamCallbacks(text=lambda text: None)
+        for attempts, received in ((0, []), (1, ['Some text'])):
+            messages_client = self.create_client(resume_attempts=attempts)
+            messages_client.reset_stats()
+            messages_client.emit_text(callbacks, 'Some text')
+            self.assertEqual(messages_client.received, received)
+
+    def test_retries_a_rate_limited_request(self):
+        messages_client = self.create_client('ratelimit', rate_limiter=RateLimiter())
+        _, events = self.stream(messages_client)
+
+        self.assertEqual(''.join(events['text']), get_answer(EVENTS))
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_resumes_a_dropped_stream(self):
+        messages_client = self.create_client('drop', resume_attempts=1)
+        stats, events = self.stream(messages_client)
+
+        self.assertEqual(''.join(events['text']), get_answer(EVENTS))
+        self.assertEqual(stats['resumes'], 1)
+        self.assertEqual(len(events['status']), 1)
+        # The resumed request continues the answer received so far
+        resumed = self.server.requests[1][2]['messages'][-1]
+        self.assertEqual(resumed['role'], 'assistant')
+        # The answer kept to resume from does not outlive the stream
+        self.assertEqual(messages_client.received, [])
+
+    def test_reports_a_dropped_stream_without_resume_attempts(self):
+        messages_client = self.create_client('drop')
+        _, events = self.stream(messages_client)
+
+        self.assertEqual(messages_client.state.status, RequestState.ERROR)
+        self.assertEqual(len(events['error']), 1)
+        self.assertTrue(get_answer(EVENTS).startswith(''.join(events['text'])))
+
+    def test_reports_an_error_response(self):
+        messages_client = self.create_client('error')
+        _, events = self.stream(messages_client)
+
+        self.assertEqual(events['text'], [])
+        self.assertEqual(events['error'], ['[Error] HTTP Error 400: Bad Request'])
+        self.assertEqual(messages_client.state.status, RequestState.ERROR)
+
+    def test_requests_that_are_not_streamed(self):
+        messages_client = self.create_client()
+
+        models = self.transport.run(messages_client.request_json(self.transport, 'models'))
+        self.assertEqual([model['id'] for model in models['data']], ['claude-a', 'claude-b'])
+
+        text = self.transport.run(messages_client.complete(self.transport, [{'role': 'user', 'content': 'Question'}]))
+        self.assertEqual(text, 'OK')
+        self.assertEqual(messages_client.stats['input_tokens'], 5)
+
+        results = self.transport.run(messages_client.fetch_batch_results(self.transport, self.server.base_url + 'messages/batches/1/results'))
+        self.assertEqual(sorted(results), ['item-0', 'item-1', 'item-2'])
+
+        with self.assertRaises(urllib.error.HTTPError) as raised:
+            self.transport.run(messages_client.request_json(self.transport, 'unknown'))
+        self.assertEqual(raised.exception.code, 404)
+
+
+class ThreadedClientTest(ClientTest, unittest.TestCase):
+    create_transport = ConnectionPool
+
+
+class AsyncClientTest(ClientTest, unittest.TestCase):
+    create_transport = AsyncTransport
+
+
+class HeadlessImportTest(unittest.TestCase):
+    def test_client_does_not_import_sublime(self):
+        script = 'import sys; sys.path.insert(0, {0!r}); __import__({1!r}); print("sublime" in sys.modules)'.format(
+            os.path.dirname(stub_env.ROOT), stub_env.PACKAGE + '.core.client'
+        )
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), 'False')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""Tests for compacting a chat whose later questions refer to code attached earlier."""
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import stub_env
+
+stub_env.install()
+import sublime
+
+compaction = stub_env.import_module('chat.compaction')
+attachments = stub_env.import_module('chat.attachments')
+snapshot = stub_env.import_module('settings.snapshot')
+ClaudetteChatView = stub_env.import_module('chat.chat_view').ClaudetteChatView
+Conversation = stub_env.import_module('core.conversation').Conversation
+SETTINGS_FILE = stub_env.import_module('constants').SETTINGS_FILE
+
+CODE = ''.join('line_{0} = {0}\n'.format(number) for number in range(40))
+CHANGED = CODE.replace('line_20 = 20', 'line_20 = 21')
+
+
+class FakeView:
+    def __init__(self):
+        self._settings = sublime.Settings()
+
+    def id(self):
+        return 10
+
+    def is_valid(self):
+        return True
+
+    def settings(self):
+        return self._settings
+
+
+class CompactionTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        sublime._cache_path = self.directory
+        sublime.load_settings(SETTINGS_FILE).clear()
+        sublime.load_settings(SETTINGS_FILE)['compaction'] = {'keep_recent': 2}
+        snapshot._snapshot = None
+        self.view = FakeView()
+
+    def tearDown(self):
+        ClaudetteChatView.release_view(self.view.id())
+        shutil.rmtree(self.directory)
+        snapshot._snapshot = None
+
+    def ask(self, messages, question, code):
+        content = attachments.CodeAttachments(self.view).build_message(question, code, 'main.py', messages)
+        return messages + [
+            {'role': 'user', 'content': content},
+            {'role': 'assistant', 'content': 'Answer to: ' + question}
+        ]
+
+    def test_code_of_one_file_is_carried_over_into_the_summary(self):
+        # Iterating on one file: every question refers back to the first one
+        messages = self.ask([], "Review this", CODE)
+        messages = self.ask(messages, "And again", CODE)
+        messages = self.ask(messages, "Now this", CHANGED)
+        messages = self.ask(messages, "Once more", CHANGED)
+        conversation = Conversation(messages)
+        ClaudetteChatView.store_conversation(self.view, conversation.to_json(), conversation)
+
+        compactor = compaction.ConversationCompactor(self.view)
+        with mock.patch.object(compaction.ConversationCompactor, 'summarize') as summarize:
+            self.assertTrue(compactor.compact())
+        old_messages = summarize.call_args[0][0]
+        self.assertEqual(len(old_messages), 6)
+
+        compactor.apply(old_messages, "We reviewed main.py", None)
+
+        compacted = ClaudetteChatView.get_view_conversation(self.view).messages
+        self.assertEqual(len(compacted), 4)
+        summary = compacted[0]['content']
+        self.assertIn(CODE, summary)
+        self.assertIn("with the following diff applied", summary)
+        self.assertIn("identical to the code of ref", compacted[2]['content'])
+
+        # The carried over code is found again, to refer to and to diff against
+        code = attachments.CodeAttachments(self.view)
+        self.assertEqual(code.get_code(attachments.code_hash(CODE), compacted), CODE)
+        self.assertIn("identical to", code.build_message("Again", CHANGED, 'main.py', compacted))
+        newer = CODE.replace('line_30 = 30', 'line_30 = 31')
+        self.assertIn("with the following diff applied", code.build_message("Next", newer, 'main.py', compacted))
+
+    def test_changed_code_is_kept_instead(self):
+        messages = self.ask([], "Review this", CODE)
+        messages = self.ask(messages, "And again", CODE)
+        messages = self.ask(messages, "Once more", CODE)
+        # The message the code was inlined in no longer holds it
+        messages[0] = {'role': 'user', 'content': "Review this"}
+
+        index = attachments.CodeAttachments(self.view).get_safe_compaction_index(4, messages)
+        self.assertEqual(index, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+Benchmark of the cached message encoding of a conversation.
+
+A turn encodes only the new message and copies the cached request buffer,
+so its cost must stay flat as the history grows, unlike encoding the whole
+history again. Reading the conversation of a chat view must not fetch the
+stored history while it is unchanged.
+"""
+import json
+import time
+import unittest
+import stub_env
+
+Conversation = stub_env.import_module('core.conversation').Conversation
+ClaudetteChatView = stub_env.import_module('chat.chat_view').ClaudetteChatView
+
+MESSAGE = 'x' * 20000
+SIZES = (10, 100, 1000)
+RUNS = 5
+
+def best_time(function):
+    best = None
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def build_history(count):
+    return [
+        {'role': 'user' if index % 2 == 0 else 'assistant', 'content': MESSAGE + str(index)}
+        for index in range(count)
+    ]
+
+
+class ConversationBenchmarkTest(unittest.TestCase):
+    def test_turn_encoding_stays_flat(self):
+        times = []
+        for count in SIZES:
+            conversation = Conversation(build_history(count))
+            times.append(best_time(lambda: conversation.append('user', MESSAGE)))
+
+        # 100 times the history, about the same cost per message
+        self.assertLess(times[-1], times[0] * 4, times)
+
+    def test_request_messages_match_a_full_encoding(self):
+        history = build_history(SIZES[-1]) + [{'role': 'user', 'content': ' '}]
+        conversation = Conversation(history)
+
+        body = bytearray()
+        elapsed = best_time(lambda: conversation.write_request_messages(bytearray()))
+        conversation.write_request_messages(body)
+
+        expected = [message for message in history if message['content'].strip()]
+        self.assertEqual(json.loads(body.decode('ascii')), expected)
+        self.assertLess(elapsed, best_time(lambda: json.dumps(expected)))
+
+
+class FakeSettings(dict):
+    def __init__(self):
+        super().__init__()
+        self.reads = []
+
+    def get(self, key, default=None):
+        self.reads.append(key)
+        return super().get(key, default)
+
+    def set(self, key, value):
+        self[key] = value
+
+
+class FakeView:
+    def __init__(self, view_id):
+        self.view_id = view_id
+        self._settings = FakeSettings()
+
+    def id(self):
+        return self.view_id
+
+    def settings(self):
+        return self._settings
+
+
+class ChatViewConversationTest(unittest.TestCase):
+    def test_unchanged_history_is_not_fetched(self):
+        view = FakeView(1)
+        conversation = Conversation(build_history(SIZES[-1]))
+        ClaudetteChatView.store_conversation(view, conversation.to_json(), conversation)
+
+        view.settings().reads.clear()
+        for _ in range(3):
+            self.assertIs(ClaudetteChatView.get_view_conversation(view), conversation)
+        self.assertNotIn('claudette_conversation_json', view.settings().reads)
+
+    def test_replaced_history_is_decoded(self):
+        view = FakeView(2)
+        ClaudetteChatView.store_conversation(view, '[]', Conversation())
+        ClaudetteChatView.store_conversation(view, json.dumps(build_history(2)))
+
+        self.assertEqual(ClaudetteChatView.get_view_conversation(view).messages, build_history(2))
+
+    def tearDown(self):
+        ClaudetteChatView.release_view(1)
+        ClaudetteChatView.release_view(2)
+
+
+if __name__ == '__main__':
+    unittest.main()
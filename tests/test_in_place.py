@@ -0,0 +1,67 @@
+"""Tests for in-place edit sessions whose view is closed while the answer streams."""
+import unittest
+import stub_env
+
+stub_env.install()
+import sublime
+
+in_place = stub_env.import_module('chat.in_place')
+RequestState = stub_env.import_module('core.request_state').RequestState
+
+
+class FakeView:
+    def __init__(self, content):
+        self.content = content
+        self.valid = True
+        self.regions = {}
+
+    def id(self):
+        return 20
+
+    def is_valid(self):
+        return self.valid
+
+    def substr(self, region):
+        return self.content[region.begin():region.end()]
+
+    def add_regions(self, key, regions, *args):
+        self.regions[key] = list(regions)
+
+    def get_regions(self, key):
+        return self.regions.get(key, [])
+
+    def erase_regions(self, key):
+        self.regions.pop(key, None)
+
+
+class FakeClaudeAPI:
+    def __init__(self):
+        self.state = RequestState()
+
+
+class InPlaceSessionTest(unittest.TestCase):
+    def start_session(self):
+        view = FakeView('value = 1\n')
+        session = in_place.InPlaceSession(view, sublime.Region(0, 9), "Change it")
+        session.api = FakeClaudeAPI()
+        in_place.InPlaceSession._sessions[view.id()] = session
+        return view, session
+
+    def test_a_closed_view_ends_the_session_while_streaming(self):
+        view, session = self.start_session()
+        view.valid = False
+
+        session.on_text("value = 2")
+        self.assertIsNone(in_place.InPlaceSession.get(view))
+        self.assertTrue(session.api.state.is_cancelled())
+
+    def test_a_closed_view_ends_the_session_when_done(self):
+        view, session = self.start_session()
+        view.valid = False
+
+        session.on_done({})
+        self.assertIsNone(in_place.InPlaceSession.get(view))
+
+
+if __name__ == '__main__':
+    unittest.main()
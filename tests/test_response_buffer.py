@@ -0,0 +1,45 @@
+"""
+Memory benchmark of collecting a 100k-token streamed response.
+
+The chunks are collected in a list and joined once, so after finish() only
+the joined response is alive, and finish() hands it out a single time.
+"""
+import tracemalloc
+import unittest
+import stub_env
+
+ResponseBuffer = stub_env.import_module('core.stream').ResponseBuffer
+
+CHUNKS = 100000  # About one token of four characters each
+
+
+class ResponseBufferTest(unittest.TestCase):
+    def test_one_copy_of_the_response_after_finish(self):
+        tracemalloc.start()
+        try:
+            buffer = ResponseBuffer()
+            for index in range(CHUNKS):
+                buffer.append('{0:04d}'.format(index % 10000))
+
+            response = buffer.finish()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        size = len(response)
+        self.assertEqual(size, CHUNKS * 4)
+        # No duplicate copy of the response, and none of the chunks, is left
+        self.assertLess(current, size * 1.5, "{0} bytes alive for a response of {1}".format(current, size))
+        self.assertEqual(buffer.chunks, [])
+
+    def test_finish_returns_the_response_once(self):
+        buffer = ResponseBuffer()
+        buffer.append('Hello')
+        buffer.append(' world')
+
+        self.assertEqual(buffer.finish(), 'Hello world')
+        self.assertIsNone(buffer.finish())
+
+
+if __name__ == '__main__':
+    unittest.main()
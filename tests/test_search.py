@@ -0,0 +1,83 @@
+"""Tests for the chat search index: reading the log does not block new messages, and indexing can be turned off."""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import stub_env
+
+stub_env.install()
+import sublime
+
+search = stub_env.import_module('chat.search')
+snapshot = stub_env.import_module('settings.snapshot')
+SETTINGS_FILE = stub_env.import_module('constants').SETTINGS_FILE
+
+
+class FakeView:
+    def __init__(self):
+        self._settings = sublime.Settings()
+
+    def settings(self):
+        return self._settings
+
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        sublime._cache_path = self.directory
+        sublime.load_settings(SETTINGS_FILE).clear()
+        snapshot._snapshot = None
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        snapshot._snapshot = None
+
+    def test_messages_added_while_loading_are_not_blocked_or_lost(self):
+        view = FakeView()
+        search.SearchIndex().add_message(view, 'user', 'How do I parse json')
+        index = search.SearchIndex()
+
+        reading = threading.Event()
+        release = threading.Event()
+        add_entry = search.SearchIndex.add_entry
+
+        def slow_add_entry(self, entry):
+            # Only the index the log is read into waits, as if the log were long
+            if self is not index:
+                reading.set()
+                release.wait(5)
+            add_entry(self, entry)
+
+        with mock.patch.object(search.SearchIndex, 'add_entry', slow_add_entry):
+            loader = threading.Thread(target=index.load)
+            loader.start()
+            self.assertTrue(reading.wait(5))
+
+            adder = threading.Thread(target=index.add_message, args=(view, 'assistant', 'Use the json module'))
+            adder.start()
+            adder.join(1)
+            blocked = adder.is_alive()
+
+            release.set()
+            loader.join(5)
+            adder.join(5)
+
+        self.assertFalse(blocked)
+        self.assertEqual([result[1] for result in index.search('json')], [1, 0])
+
+        # Read again from the log, the new message is in it once
+        reloaded = search.SearchIndex()
+        reloaded.load()
+        self.assertEqual([result[1] for result in reloaded.search('json')], [1, 0])
+
+    def test_indexing_can_be_turned_off(self):
+        sublime.load_settings(SETTINGS_FILE)['search'] = {'index': False}
+        search.SearchIndex().add_message(FakeView(), 'user', 'Private code')
+
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'Claudette', 'search')))
+
+
+if __name__ == '__main__':
+    unittest.main()
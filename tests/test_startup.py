@@ -0,0 +1,67 @@
+"""
+Startup benchmark: importing the plugin must stay cheap.
+
+Sublime Text imports every plugin at startup, so Claudette.py only defines
+thin command shells that import their implementation on first use. These
+tests import the plugin in a fresh interpreter under the stub Sublime Text
+API and check how many of its modules, and which heavy standard library
+modules, get loaded, and how long the import takes. The same goes for
+plugin_loaded(), with the default settings.
+"""
+import json
+import os
+import subprocess
+import sys
+import unittest
+from stub_env import PACKAGE, ROOT, STUBS
+
+# Claudette, constants, dispatcher, commands, commands.lazy, chat, chat.registry
+MAX_PACKAGE_MODULES = 7
+IMPORT_TIME_BUDGET = 0.05  # seconds, the best of a few runs
+RUNS = 3
+
+# Modules the command implementations need, which must not be loaded before a command is used
+HEAVY_MODULES = {'asyncio', 'dataclasses', 'difflib', 'hashlib', 'http.client', 'json', 'socket', 'ssl', 'typing', 'urllib.request'}
+
+SCRIPT = '''
+import json, sys, time
+sys.path[:0] = [{stubs!r}, {parent!r}]
+import sublime, sublime_plugin
+before = set(sys.modules)
+start = time.perf_counter()
+plugin = __import__({package!r} + '.Claudette', fromlist=['plugin_loaded'])
+elapsed = time.perf_counter() - start
+modules = sorted(set(sys.modules) - before)
+plugin.plugin_loaded()
+sublime.run_timeouts()
+loaded_modules = sorted(set(sys.modules) - before)
+print(json.dumps({{'elapsed': elapsed, 'modules': modules, 'loaded_modules': loaded_modules}}))
+'''
+
+
+def measure_import():
+    """Import and load the plugin in a new interpreter, return the import time and the modules loaded."""
+    script = SCRIPT.format(stubs=STUBS, parent=os.path.dirname(ROOT), package=PACKAGE)
+    output = subprocess.check_output([sys.executable, '-c', script], cwd=STUBS)
+    return json.loads(output.decode('utf-8'))
+
+
+class StartupTest(unittest.TestCase):
+    def test_import_loads_only_the_command_shells(self):
+        modules = measure_import()['modules']
+
+        package_modules = [name for name in modules if name.startswith(PACKAGE + '.')]
+        self.assertLessEqual(len(package_modules), MAX_PACKAGE_MODULES, package_modules)
+        self.assertEqual(HEAVY_MODULES & set(modules), set())
+
+    def test_plugin_loaded_imports_nothing_without_budgets(self):
+        result = measure_import()
+        self.assertEqual(result['loaded_modules'], result['modules'])
+
+    def test_import_time(self):
+        elapsed = min(measure_import()['elapsed'] for _ in range(RUNS))
+        self.assertLess(elapsed, IMPORT_TIME_BUDGET, "Importing the plugin took {0:.1f} ms".format(elapsed * 1000))
+
+
+if __name__ == '__main__':
+    unittest.main()
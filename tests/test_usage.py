@@ -0,0 +1,79 @@
+"""Tests for the usage ledger and the budget downgrade of routine questions."""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import stub_env
+
+stub_env.install()
+import sublime
+
+core_usage = stub_env.import_module('core.usage')
+usage = stub_env.import_module('api.usage')
+snapshot = stub_env.import_module('settings.snapshot')
+SETTINGS_FILE = stub_env.import_module('constants').SETTINGS_FILE
+
+
+class UsageLedgerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'usage.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_totals_survive_reloading(self):
+        ledger = core_usage.UsageLedger(self.path)
+        ledger.record('opus', 100, 50, 2.0, chat='a', project='p')
+        ledger.record('haiku', 10, 5, 1.0, chat='b')
+
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('{"t": 1, "m"')  # A line cut off by a crash
+
+        reloaded = core_usage.UsageLedger(self.path)
+        today = core_usage.get_day(time.time())
+        self.assertEqual(reloaded.get_tokens(today), 165)
+        self.assertEqual(reloaded.get_tokens(today, 'p'), 150)
+        self.assertEqual(reloaded.get_chat_tokens('a'), 150)
+        self.assertEqual(reloaded.get_recent_days(1)[0][1].get_totals(), [2, 110, 55, 3.0])
+
+
+class RoutineModelTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        sublime._cache_path = self.directory
+        settings = sublime.load_settings(SETTINGS_FILE)
+        settings.clear()
+        settings.update({
+            'model': 'opus',
+            'usage': {'daily_budget': 100, 'downgrade_model': 'haiku'}
+        })
+        snapshot._snapshot = None
+        usage._ledger = None
+
+        usage.get_usage_ledger().record('opus', 80, 40)
+        usage._ledger = None  # Read it again, like after a restart
+
+    def tearDown(self):
+        sublime._timeouts.clear()
+        shutil.rmtree(self.directory)
+
+    def test_downgrades_once_the_ledger_is_loaded(self):
+        # The ledger is read in the background, the question does not wait for it
+        self.assertEqual(usage.get_routine_model(), 'opus')
+        self.assertFalse(usage.get_usage_ledger().loaded)
+
+        sublime.run_timeouts()
+        self.assertEqual(usage.get_routine_model(), 'haiku')
+
+    def test_no_downgrade_without_a_budget(self):
+        sublime.load_settings(SETTINGS_FILE)['usage'] = {'downgrade_model': 'haiku'}
+        snapshot._snapshot = None
+
+        self.assertEqual(usage.get_routine_model(), 'opus')
+        self.assertEqual(sublime._timeouts, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
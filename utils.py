@@ -1,3 +1,6 @@
+from .chat.registry import registry
+from .dispatcher import dispatcher
+
 def claudette_chat_status_message(window, message: str, prefix: str = "ℹ️") -> None:
     """
     Display a status message in the active chat view.
@@ -7,16 +10,11 @@ def claudette_chat_status_message(window, message: str, prefix: str = "ℹ️")
         message (str): The status message to display
         prefix (str, optional): Icon or text prefix for the message. Defaults to "ℹ️"
     """
+    dispatcher.assert_main_thread('claudette_chat_status_message')
     if not window:
         return
 
-    # Find the active chat view
-    current_chat_view = None
-    for view in window.views():
-        if (view.settings().get('claudette_is_chat_view', False) and
-            view.settings().get('claudette_is_current_chat', False)):
-            current_chat_view = view
-            break
+    current_chat_view = registry.get_current_chat_view(window)
 
     if not current_chat_view:
         return